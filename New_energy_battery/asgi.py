@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+电量实时推送（battery/usage/stream/）是长连接，需要用 ASGI 服务器部署本入口，例如
+    uvicorn New_energy_battery.asgi:application
+所有连接共享同一个进程内的广播任务（battery.live），WSGI 部署时页面自动退回长轮询。
 """
 
 import os
@@ -1,40 +1,60 @@
 from django.contrib import admin
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from .fleet import get_snapshot, refresh_snapshot
+from .exports import export_actions, USAGE_COLUMNS, USAGE_RELATED, ORDER_COLUMNS, ORDER_RELATED
 from .models import (
     BatteryCategory, BatteryType, Battery, BatteryUsage, 
-    RentalOrder, BatteryReview, ReviewReply
+    RentalOrder, BatteryReview, ReviewReply, DischargeProfile
 )
 
 
 @admin.register(BatteryCategory)
 class BatteryCategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'description', 'icon', 'created_at']
+    list_display = ['name', 'description', 'icon', 'available_count', 'rented_count', 'maintenance_count', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name', 'description']
     ordering = ['name']
+    readonly_fields = ['available_count', 'rented_count', 'maintenance_count', 'retired_count']
+
+
+class DischargeProfileInline(admin.StackedInline):
+    model = DischargeProfile
+    can_delete = True
+    extra = 0
+    max_num = 1
+    fields = ['model', 'base_rate', 'power_factor', 'segments', 'rated_hours', 'rated_power', 'peukert_exponent']
 
 
 @admin.register(BatteryType)
 class BatteryTypeAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'description', 'created_at']
+    list_display = ['name', 'category', 'description', 'available_count', 'rented_count', 'maintenance_count', 'created_at']
     list_filter = ['category', 'created_at']
     search_fields = ['name', 'description']
     ordering = ['category', 'name']
+    readonly_fields = ['available_count', 'rented_count', 'maintenance_count', 'retired_count']
+    inlines = [DischargeProfileInline]
 
 
 @admin.register(Battery)
 class BatteryAdmin(admin.ModelAdmin):
     list_display = [
         'name', 'serial_number', 'battery_type', 'status', 
-        'capacity', 'voltage', 'daily_rental_price', 'location', 'created_at'
+        'capacity', 'voltage', 'daily_rental_price', 'location',
+        'rental_count', 'lifetime_usage_hours', 'cycle_count', 'avg_end_charge', 'created_at'
     ]
     list_filter = ['status', 'battery_type__category', 'battery_type', 'created_at']
     search_fields = ['name', 'serial_number', 'location']
     ordering = ['-created_at']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'created_at', 'updated_at',
+        'rental_count', 'lifetime_usage_hours', 'cycle_count', 'avg_end_charge',
+    ]
     
     fieldsets = (
         ('基本信息', {
@@ -49,6 +69,10 @@ class BatteryAdmin(admin.ModelAdmin):
         ('位置信息', {
             'fields': ('location', 'latitude', 'longitude')
         }),
+        ('使用统计', {
+            'fields': ('rental_count', 'lifetime_usage_hours', 'cycle_count', 'avg_end_charge'),
+            'description': '由 update_battery_health 命令按使用记录增量汇总',
+        }),
         ('时间信息', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -69,25 +93,46 @@ class BatteryUsageAdmin(admin.ModelAdmin):
     search_fields = ['battery__name', 'user__username']
     ordering = ['-start_time']
     readonly_fields = ['created_at']
+    actions = export_actions(USAGE_COLUMNS, 'battery-usage', USAGE_RELATED)
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('battery', 'user')
+    
+    def get_urls(self):
+        urls = [
+            path('fleet/', self.admin_site.admin_view(self.fleet_dashboard), name='battery_batteryusage_fleet'),
+        ]
+        return urls + super().get_urls()
+    
+    def fleet_dashboard(self, request):
+        """车队电量分布看板，读取缓存的快照；POST 时立即重新计算"""
+        if request.method == 'POST':
+            refresh_snapshot()
+            return redirect('admin:battery_batteryusage_fleet')
+        context = {
+            **self.admin_site.each_context(request),
+            'title': '车队电量分布',
+            'opts': self.model._meta,
+            'snapshot': get_snapshot(),
+        }
+        return TemplateResponse(request, 'admin/battery/fleet_dashboard.html', context)
 
 
 @admin.register(RentalOrder)
 class RentalOrderAdmin(admin.ModelAdmin):
     list_display = [
         'order_number', 'user', 'battery', 'start_date', 
-        'end_date', 'rental_days', 'total_amount', 'status', 'created_at'
+        'end_date', 'rental_days', 'total_amount', 'status', 'is_overdue', 'created_at'
     ]
-    list_filter = ['status', 'start_date', 'created_at']
+    list_filter = ['status', 'is_overdue', 'start_date', 'created_at']
     search_fields = ['order_number', 'user__username', 'battery__name']
     ordering = ['-created_at']
     readonly_fields = ['order_number', 'created_at', 'updated_at']
+    actions = export_actions(ORDER_COLUMNS, 'orders', ORDER_RELATED)
     
     fieldsets = (
         ('订单信息', {
-            'fields': ('order_number', 'user', 'battery', 'status')
+            'fields': ('order_number', 'user', 'battery', 'status', 'is_overdue')
         }),
         ('租赁详情', {
             'fields': ('start_date', 'end_date', 'rental_days')
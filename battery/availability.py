@@ -0,0 +1,108 @@
+"""
+电池预订时段索引
+
+每块电池的已预订时段（待确认 / 已确认 / 使用中订单的 [start_date, end_date)）合并成不重叠的区间，
+按开始时间排序存成两个有序数组，用二分查找回答：
+  is_free(start, end)      该时段是否空闲
+  next_free(start, length) 不早于 start、长度为 length 的最早空闲时段
+  booked(start, end)       与某时段相交的已预订区间（可租日历）
+索引按电池缓存，订单创建、状态转换或修改后删除对应电池的缓存。
+默认的 LocMemCache 是进程内缓存，删除只对当前进程生效，因此缓存时间很短（与 order_summary 相同）：
+其他进程修改的订单最迟 CACHE_TIMEOUT 秒后反映到可租日历中。
+下单时先锁住电池（bulk.lock_rows），再从数据库重新加载索引检查，不依赖可能过期的缓存。
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RentalOrder
+
+BOOKED_STATUSES = ('pending', 'confirmed', 'active')
+CACHE_TIMEOUT = 30
+
+
+def _ts(value):
+    return value.timestamp()
+
+
+def _dt(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.get_current_timezone())
+
+
+class AvailabilityIndex:
+    """一块电池的已预订区间（时间戳），starts / ends 均升序且区间互不重叠"""
+
+    def __init__(self, starts, ends):
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def from_windows(cls, windows):
+        """由 (开始, 结束) 时间戳列表构建，重叠或相接的区间合并"""
+        starts, ends = [], []
+        for start, end in sorted(windows):
+            if end <= start:
+                continue
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        return cls(starts, ends)
+
+    def _first_after(self, ts):
+        """第一个结束时间晚于 ts 的区间下标"""
+        return bisect_right(self.ends, ts)
+
+    def is_free(self, start, end):
+        index = self._first_after(_ts(start))
+        return index == len(self.starts) or self.starts[index] >= _ts(end)
+
+    def next_free(self, start, length):
+        """不早于 start、持续 length（timedelta）的最早空闲时段的开始时间"""
+        begin = _ts(start)
+        seconds = length.total_seconds()
+        index = self._first_after(begin)
+        while index < len(self.starts) and self.starts[index] < begin + seconds:
+            begin = max(begin, self.ends[index])
+            index += 1
+        return _dt(begin)
+
+    def booked(self, start, end):
+        """与 [start, end) 相交的已预订区间 [(开始, 结束)]"""
+        low = self._first_after(_ts(start))
+        high = bisect_left(self.starts, _ts(end))
+        return [(_dt(s), _dt(e)) for s, e in zip(self.starts[low:high], self.ends[low:high])]
+
+
+def _cache_key(battery_id):
+    return f'battery:availability:{battery_id}'
+
+
+def load_index(battery_id):
+    """从数据库构建索引并写入缓存"""
+    windows = (
+        RentalOrder.objects.filter(battery_id=battery_id, status__in=BOOKED_STATUSES)
+        .order_by()
+        .values_list('start_date', 'end_date')
+    )
+    index = AvailabilityIndex.from_windows([(_ts(start), _ts(end)) for start, end in windows])
+    cache.set(_cache_key(battery_id), (index.starts, index.ends), CACHE_TIMEOUT)
+    return index
+
+
+def get_index(battery_id):
+    cached = cache.get(_cache_key(battery_id))
+    if cached is None:
+        return load_index(battery_id)
+    return AvailabilityIndex(*cached)
+
+
+def invalidate(battery_ids):
+    """订单变更后删除这些电池的索引缓存（事务提交后执行）"""
+    keys = [_cache_key(battery_id) for battery_id in set(battery_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,88 @@
+"""
+批量写入
+
+Django 的 bulk_update 为每行生成 CASE WHEN 表达式，bulk_create 为每行每个字段构造占位与转换，
+上万行时 Python 端就要数秒；这里对每行执行同一条参数化语句（executemany），
+值按字段类型转换为数据库格式，相同的值只转换一次（同一批数据常共用时间戳、状态等）。
+两者都不触发 signals，也不会自动填充 auto_now / auto_now_add 字段。
+"""
+from django.db import connections
+from django.db.models import F
+
+
+def _preparers(model_fields, connection):
+    def prepare(field):
+        cache = {}
+
+        def convert(value):
+            try:
+                return cache[value]
+            except KeyError:
+                result = cache[value] = field.get_db_prep_save(value, connection)
+                return result
+            except TypeError:
+                # 不可哈希的值不缓存
+                return field.get_db_prep_save(value, connection)
+        return convert
+    return [prepare(field) for field in model_fields]
+
+
+def _execute(connection, sql, rows, batch_size):
+    count = 0
+    batch = []
+    with connection.cursor() as cursor:
+        for values in rows:
+            batch.append(values)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+    return count
+
+
+def update_rows(model, fields, rows, using='default', batch_size=2000):
+    """rows 为 [(主键, 字段1的值, 字段2的值, ...)]，按 fields 顺序，返回提交的行数"""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    model_fields = [model._meta.get_field(name) for name in fields]
+    pk = model._meta.pk
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(model._meta.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in model_fields),
+        quote(pk.column),
+    )
+    preparers = _preparers(model_fields, connection)
+    values = (
+        [prepare(value) for prepare, value in zip(preparers, row[1:])] + [pk.get_db_prep_value(row[0], connection)]
+        for row in rows
+    )
+    return _execute(connection, sql, values, batch_size)
+
+
+def insert_rows(model, fields, rows, using='default', batch_size=2000):
+    """rows 为 [(字段1的值, 字段2的值, ...)]，按 fields 顺序插入，返回插入的行数"""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    model_fields = [model._meta.get_field(name) for name in fields]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in model_fields),
+        ', '.join(['%s'] * len(model_fields)),
+    )
+    preparers = _preparers(model_fields, connection)
+    values = ([prepare(value) for prepare, value in zip(preparers, row)] for row in rows)
+    return _execute(connection, sql, values, batch_size)
+
+
+def lock_rows(queryset):
+    """
+    在当前事务中锁住 queryset 的行：执行一条不修改数据的 UPDATE（主键 = 主键），返回命中的行数。
+    PostgreSQL / MySQL 上取得行锁；SQLite 不支持 select_for_update，写语句会取得数据库写锁，
+    作为事务的第一条语句执行时，之后的先读后写不会与其他事务交错，也不会在读锁升级为写锁时报 database is locked。
+    锁只在调用它的事务中持有，其他事务照常使用默认的 DEFERRED 模式。
+    """
+    pk = queryset.model._meta.pk.name
+    return queryset.order_by().update(**{pk: F(pk)})
@@ -0,0 +1,123 @@
+"""
+分类 / 类型电池数量统计
+
+BatteryCategory 与 BatteryType 上的 <status>_count 是 Battery 按状态的冗余计数，
+电池新增、删除、状态或类型变更时用 F() 表达式原子地增量更新。
+保存或删除已有电池时，在同一事务内先锁定该行并读取数据库中的原状态，写入后再按原状态增量更新，
+并发保存同一电池（各自加载的是同一旧状态）时后一次读到的是前一次写入的状态，每次状态切换只计一次。
+分类页直接读取计数，不再联表 Count。
+数据不一致时（如 queryset.update / bulk_create 绕过了 signals）运行 rebuild_battery_counters 命令全量重建。
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .bulk import lock_rows
+from .models import Battery, BatteryCategory, BatteryType
+
+STATUSES = tuple(status for status, _ in Battery.STATUS_CHOICES)
+COUNTER_FIELDS = tuple(f'{status}_count' for status in STATUSES)
+
+
+def battery_state(battery):
+    """电池计入的 (类型 id, 状态)；字段被 defer 时对应位置为 None"""
+    return battery.__dict__.get('battery_type_id'), battery.__dict__.get('status')
+
+
+def locked_battery_state(battery_id):
+    """在当前事务内锁定电池行，读取数据库中的 (类型 id, 状态)；电池不存在时返回 None"""
+    rows = Battery.objects.filter(pk=battery_id)
+    lock_rows(rows)
+    return rows.values_list('battery_type_id', 'status').first()
+
+
+def _shift(type_id, status, delta):
+    field = f'{status}_count'
+    change = {field: F(field) + delta}
+    BatteryType.objects.filter(pk=type_id).update(**change)
+    BatteryCategory.objects.filter(batterytype=type_id).update(**change)
+
+
+def apply_battery_change(old_state=None, new_state=None):
+    """
+    增量更新计数
+    新增电池：old_state=None；删除电池：new_state=None；状态或类型变更：两者都传
+    """
+    if old_state == new_state:
+        return
+    with transaction.atomic():
+        if old_state is not None:
+            _shift(*old_state, -1)
+        if new_state is not None:
+            _shift(*new_state, 1)
+
+
+def apply_bulk_changes(changes):
+    """
+    批量增量更新计数，changes 为 [(old_state, new_state)]，
+    用于 queryset.update 等绕过 signals 的批量状态变更
+    """
+    deltas = {}
+    for old_state, new_state in changes:
+        if old_state == new_state:
+            continue
+        if old_state is not None:
+            deltas.setdefault(old_state[0], {}).setdefault(old_state[1], 0)
+            deltas[old_state[0]][old_state[1]] -= 1
+        if new_state is not None:
+            deltas.setdefault(new_state[0], {}).setdefault(new_state[1], 0)
+            deltas[new_state[0]][new_state[1]] += 1
+    with transaction.atomic():
+        for type_id, by_status in deltas.items():
+            change = {f'{status}_count': F(f'{status}_count') + delta for status, delta in by_status.items() if delta}
+            if change:
+                BatteryType.objects.filter(pk=type_id).update(**change)
+                BatteryCategory.objects.filter(batterytype=type_id).update(**change)
+
+
+def move_battery_type(type_id, old_category_id, new_category_id):
+    """类型改挂到其他分类时，把该类型的计数整体转移"""
+    if old_category_id == new_category_id:
+        return
+    counts = BatteryType.objects.filter(pk=type_id).values(*COUNTER_FIELDS).first()
+    if not counts:
+        return
+    with transaction.atomic():
+        BatteryCategory.objects.filter(pk=old_category_id).update(
+            **{field: F(field) - counts[field] for field in COUNTER_FIELDS}
+        )
+        BatteryCategory.objects.filter(pk=new_category_id).update(
+            **{field: F(field) + counts[field] for field in COUNTER_FIELDS}
+        )
+
+
+def _rebuild(model, group_field, rows):
+    stats = {}
+    for row in rows:
+        if row['status'] in STATUSES:
+            stats.setdefault(row[group_field], {})[f"{row['status']}_count"] = row['count']
+
+    objects = list(model.objects.only('id', *COUNTER_FIELDS))
+    for obj in objects:
+        counts = stats.get(obj.id, {})
+        for field in COUNTER_FIELDS:
+            setattr(obj, field, counts.get(field, 0))
+    model.objects.bulk_update(objects, COUNTER_FIELDS, batch_size=500)
+    return len(objects)
+
+
+def rebuild_battery_counters():
+    """根据 Battery 全量重建分类、类型计数，返回 (分类数, 类型数)"""
+    by_type = (
+        Battery.objects.order_by()
+        .values('battery_type_id', 'status')
+        .annotate(count=Count('id'))
+    )
+    by_category = (
+        Battery.objects.order_by()
+        .values('battery_type__category_id', 'status')
+        .annotate(count=Count('id'))
+    )
+    with transaction.atomic():
+        types = _rebuild(BatteryType, 'battery_type_id', by_type)
+        categories = _rebuild(BatteryCategory, 'battery_type__category_id', by_category)
+    return categories, types
@@ -0,0 +1,146 @@
+"""
+放电曲线
+
+每个电池类型的放电模型（DischargeProfile）编译为一张查表：
+  在电量网格 0-100% 上累计“参考功率下从 0% 放电到该电量所需的小时数” T(电量)，
+  功率的影响单独作为倍率（线性 / 分段线性：1 + 功率/1000 × 功率系数；Peukert：(功率/额定功率)^指数）。
+推算时 剩余时长 = T(基线电量) - 已放电小时 × 倍率，再反查 T 得到当前电量；
+耗尽时刻 = T(基线电量) / 倍率。两者都是 np.interp，可以对一批使用记录整体计算。
+单个使用记录（BatteryUsage.calculate_current_charge）、放电模拟和耗尽调度使用同一组查表。
+
+放电曲线保存或删除后递增版本号，下次查询时重新编译。
+"""
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'battery:curves:version'
+# 兜底：定期重新编译，覆盖绕过 signals 的修改
+RELOAD_INTERVAL = 60 * 10
+
+# 未配置放电曲线的类型：每小时 10%，功率每 1000W 额外增加 0.1 倍
+DEFAULT_BASE_RATE = 10.0
+DEFAULT_POWER_FACTOR = 0.1
+
+# 电量网格，步长 0.25%
+GRID = np.linspace(0, 100, 401)
+
+
+class Curve:
+    """编译后的放电曲线"""
+
+    def __init__(self, rates, power_factor=None, rated_power=None, exponent=None):
+        # rates 为网格上各点参考功率下的消耗率(%/小时)，按梯形法累计放电时长
+        inverse = 1 / rates
+        steps = np.diff(GRID) * (inverse[1:] + inverse[:-1]) / 2
+        self.hours = np.concatenate([[0.0], np.cumsum(steps)])
+        self.power_factor = power_factor
+        self.rated_power = rated_power
+        self.exponent = exponent
+
+    def multiplier(self, powers):
+        if self.exponent is not None:
+            return (np.maximum(powers, 1) / self.rated_power) ** self.exponent
+        return 1 + powers / 1000 * self.power_factor
+
+    def charges(self, baselines, hours, powers):
+        """放电 hours 小时后的电量（浮点数）"""
+        remaining = np.interp(baselines, GRID, self.hours) - np.maximum(hours, 0) * self.multiplier(powers)
+        return np.interp(np.maximum(remaining, 0), self.hours, GRID)
+
+    def hours_until_empty(self, baselines, powers):
+        return np.interp(baselines, GRID, self.hours) / self.multiplier(powers)
+
+
+def linear_curve(base_rate=DEFAULT_BASE_RATE, power_factor=DEFAULT_POWER_FACTOR):
+    return Curve(np.full(GRID.shape, float(base_rate)), power_factor=float(power_factor))
+
+
+def compile_profile(profile):
+    """DischargeProfile -> Curve"""
+    if profile.model == 'piecewise' and len(profile.segments) >= 2:
+        points = sorted((float(charge), float(rate)) for charge, rate in profile.segments)
+        rates = np.interp(GRID, [p[0] for p in points], [p[1] for p in points])
+        return Curve(rates, power_factor=float(profile.power_factor))
+    if profile.model == 'peukert':
+        return Curve(
+            np.full(GRID.shape, 100 / float(profile.rated_hours)),
+            rated_power=float(profile.rated_power), exponent=float(profile.peukert_exponent),
+        )
+    return linear_curve(profile.base_rate, profile.power_factor)
+
+
+DEFAULT_CURVE = linear_curve()
+
+
+class Registry:
+    def __init__(self, curves, version):
+        self.curves = curves
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def get(self, type_id):
+        return self.curves.get(type_id, DEFAULT_CURVE)
+
+
+_registry = None
+_lock = threading.Lock()
+
+
+def _bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
+
+
+def mark_changed():
+    """放电曲线变更：提交后递增版本号，下次查询重新编译"""
+    transaction.on_commit(_bump)
+
+
+def reset():
+    """丢弃本进程已编译的查表，下次查询重新编译"""
+    global _registry
+    _registry = None
+
+
+def get_registry():
+    global _registry
+    version = cache.get(VERSION_KEY)
+    registry = _registry
+    if registry is not None and registry.version == version and time.monotonic() - registry.loaded_at < RELOAD_INTERVAL:
+        return registry
+    from .models import DischargeProfile
+
+    with _lock:
+        curves = {profile.battery_type_id: compile_profile(profile) for profile in DischargeProfile.objects.all()}
+        _registry = Registry(curves, version)
+    return _registry
+
+
+def _by_type(type_ids, compute, *columns):
+    """按类型分组，每组用对应曲线整体计算"""
+    registry = get_registry()
+    type_ids = np.asarray(type_ids)
+    columns = [np.asarray(column, dtype=np.float64) for column in columns]
+    result = np.empty(type_ids.shape, dtype=np.float64)
+    for type_id in np.unique(type_ids):
+        mask = type_ids == type_id
+        result[mask] = compute(registry.get(int(type_id)), *(column[mask] for column in columns))
+    return result
+
+
+def project_charges(type_ids, baselines, hours, powers):
+    """一批使用记录放电 hours 小时后的电量（整数，向下取整，最低 0）"""
+    charges = _by_type(type_ids, Curve.charges, baselines, hours, powers)
+    # 消除查表的浮点误差，避免整数电量被多扣 1
+    return np.floor(charges + 1e-9).astype(np.int64)
+
+
+def hours_until_empty(type_ids, baselines, powers):
+    """一批使用记录从基线电量放电到 0% 所需的小时数"""
+    return _by_type(type_ids, Curve.hours_until_empty, baselines, powers)
@@ -0,0 +1,209 @@
+"""
+电量耗尽调度
+
+放电中的使用记录可以由 基线电量、start_time、电池功率和类型的放电曲线推算出电量降到 0% 的时刻，
+调度器把这些时刻放进最小堆，只在堆顶时刻到达时醒来，结束耗尽的使用记录并完成订单、释放电池，
+不再定时全表扫描。
+
+变化检测（不依赖缓存，独立进程中的调度器即 run_depletion_scheduler 命令同样适用）：
+  使用记录的每次修改（含批量 UPDATE）都会刷新 updated_at，调度器每次醒来按 updated_at 索引
+  读取上次检查以来（多回看 CHANGE_OVERLAP，覆盖提交晚于写入时间的事务）修改过的记录，重新推算后入堆；
+  放电曲线按 DischargeProfile 的 (最大 updated_at, 行数) 判断是否变化，变化时重新编译并重建整个堆。
+  同进程内 usage_changed 直接 O(log n) 入堆（旧条目按时刻惰性丢弃），不必等到下次检查。
+到期时重新读取这些记录再次推算，已暂停、已结束或基线被修改过的记录不会被误结束。
+"""
+import heapq
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import curves
+from .curves import hours_until_empty
+from .discharge import close_depleted
+from .live import notify as notify_live
+from .models import BatteryUsage, DischargeProfile
+
+# 没有到期记录时检查数据库变化的间隔（秒）
+POLL_INTERVAL = 5
+# 增量检查时回看的时间
+CHANGE_OVERLAP = timedelta(seconds=60)
+_NOT_BUILT = object()
+
+
+def _profile_version():
+    """放电曲线的版本：(最大 updated_at, 行数)，删除也能识别"""
+    stats = DischargeProfile.objects.aggregate(updated=Max('updated_at'), count=Count('id'))
+    return stats['updated'], stats['count']
+
+
+def _predict(rows):
+    """rows 为 [(id, start_time, baseline_charge, power, 类型 id)]，返回 {id: 耗尽时刻的时间戳}"""
+    if not rows:
+        return {}
+    ids = [r[0] for r in rows]
+    starts = np.fromiter((r[1].timestamp() for r in rows), dtype=np.float64, count=len(rows))
+    baselines = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+    powers = np.fromiter((float(r[3]) for r in rows), dtype=np.float64, count=len(rows))
+    type_ids = np.fromiter((r[4] for r in rows), dtype=np.int64, count=len(rows))
+    due = starts + hours_until_empty(type_ids, baselines, powers) * 3600
+    return dict(zip(ids, due.tolist()))
+
+
+def _load(ids=None, changed_since=None):
+    usages = BatteryUsage.objects.filter(is_active=True, is_discharging=True)
+    if ids is not None:
+        usages = usages.filter(id__in=ids)
+    if changed_since is not None:
+        usages = usages.filter(updated_at__gte=changed_since)
+    return _predict(list(
+        usages.order_by().values_list('id', 'start_time', 'baseline_charge', 'battery__power', 'battery__battery_type_id').iterator(chunk_size=10000)
+    ))
+
+
+class DepletionScheduler:
+    """按预计耗尽时刻排序的最小堆，条目为 (时刻, 使用记录 id)"""
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.version = _NOT_BUILT
+        self.checked_at = None
+
+    def __len__(self):
+        return len(self._due)
+
+    def rebuild(self):
+        """从数据库重建整个堆：一次查询 + heapify，O(n)"""
+        version = _profile_version()
+        checked_at = timezone.now()
+        due = _load()
+        with self._lock:
+            self._due = due
+            self._heap = [(ts, usage_id) for usage_id, ts in due.items()]
+            heapq.heapify(self._heap)
+            self.version = version
+            self.checked_at = checked_at
+        self._wakeup.set()
+        return len(due)
+
+    def refresh(self):
+        """
+        检查数据库中的变化：放电曲线变化（或尚未构建）时重建整个堆，返回 None；
+        否则重新推算上次检查以来修改过的放电中记录，预计时刻变化的入堆，返回入堆数量
+        """
+        version = _profile_version()
+        if version != self.version:
+            if self.version is not _NOT_BUILT:
+                curves.reset()
+            self.rebuild()
+            return None
+        checked_at = timezone.now()
+        due = _load(changed_since=self.checked_at - CHANGE_OVERLAP)
+        with self._lock:
+            changed = {usage_id: ts for usage_id, ts in due.items() if self._due.get(usage_id) != ts}
+            self.checked_at = checked_at
+        for usage_id, ts in changed.items():
+            self.schedule(usage_id, ts)
+        return len(changed)
+
+    def schedule(self, usage_id, due_ts):
+        with self._lock:
+            self._due[usage_id] = due_ts
+            heapq.heappush(self._heap, (due_ts, usage_id))
+        self._wakeup.set()
+
+    def cancel(self, usage_id):
+        # 堆中的旧条目在弹出时与 _due 对不上而被丢弃
+        with self._lock:
+            self._due.pop(usage_id, None)
+
+    def next_due(self):
+        """堆顶的预计耗尽时刻（时间戳），堆为空时返回 None"""
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now_ts):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now_ts:
+                ts, usage_id = heapq.heappop(self._heap)
+                if self._due.get(usage_id) == ts:
+                    del self._due[usage_id]
+                    due.append(usage_id)
+        return due
+
+    def run_due(self, now=None):
+        """结束所有已到期的使用记录，返回 (结束的记录数, 完成的订单数)"""
+        now = now or timezone.now()
+        ids = self._pop_due(now.timestamp())
+        if not ids:
+            return 0, 0
+        # 再次推算：其他进程可能已暂停或重置了基线
+        current = _load(ids)
+        expired = {usage_id: ts for usage_id, ts in current.items() if ts <= now.timestamp()}
+        for usage_id, ts in current.items():
+            if usage_id not in expired:
+                self.schedule(usage_id, ts)
+        if not expired:
+            return 0, 0
+        return close_depleted(
+            np.fromiter(expired.keys(), dtype=np.int64, count=len(expired)),
+            np.fromiter(expired.values(), dtype=np.float64, count=len(expired)),
+            chunk_size=500,
+        )
+
+    def serve_forever(self, poll_interval=POLL_INTERVAL, on_closed=None):
+        """常驻运行：睡到堆顶时刻、收到事件或到达检查间隔，每次醒来先检查数据库中的变化"""
+        while True:
+            self.refresh()
+            closed, orders = self.run_due()
+            if closed and on_closed:
+                on_closed(closed, orders)
+            next_due = self.next_due()
+            timeout = poll_interval
+            if next_due is not None:
+                timeout = min(max(next_due - time.time(), 0), poll_interval)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+
+scheduler = DepletionScheduler()
+_running = False
+
+
+def mark_changed():
+    """批量修改了多条使用记录（如批量上报电量）：提交后刷新实时推送，调度器按 updated_at 识别变化"""
+    transaction.on_commit(notify_live)
+
+
+def usage_changed(usage):
+    """使用记录的放电状态或基线变化后调用，提交后更新调度"""
+    def apply():
+        # 实时推送立即刷新
+        notify_live()
+        if not _running:
+            return
+        due = usage.depleted_at()
+        if due is None:
+            scheduler.cancel(usage.id)
+        else:
+            scheduler.schedule(usage.id, due.timestamp())
+    transaction.on_commit(apply)
+
+
+def serve_forever(poll_interval=POLL_INTERVAL, on_closed=None):
+    global _running
+    _running = True
+    try:
+        scheduler.serve_forever(poll_interval, on_closed)
+    finally:
+        _running = False
@@ -0,0 +1,140 @@
+"""
+放电模拟
+
+BatteryUsage 的电量由 基线电量、放电时长和电池功率按所属类型的放电曲线推算（见 battery.curves）。
+run_discharge_pass 一次取出所有放电中的使用记录，用 NumPy 整体计算电量，
+按电量分组批量写回并记录遥测样本；电量耗尽的记录分块在事务中结束，并完成对应订单、释放电池。
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from . import availability, order_summary
+from .bulk import lock_rows, update_rows
+from .curves import project_charges, hours_until_empty
+from .inventory import set_battery_status
+from .models import BatteryUsage, RentalOrder
+from .telemetry import record_samples
+
+def _load_discharging():
+    rows = list(
+        BatteryUsage.objects.filter(is_active=True, is_discharging=True)
+        .order_by()
+        .values_list('id', 'start_time', 'baseline_charge', 'current_charge', 'battery__power', 'battery__battery_type_id')
+        .iterator(chunk_size=10000)
+    )
+    count = len(rows)
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=count)
+    starts = np.fromiter((r[1].timestamp() for r in rows), dtype=np.float64, count=count)
+    baselines = np.fromiter((r[2] for r in rows), dtype=np.float64, count=count)
+    current = np.fromiter((r[3] for r in rows), dtype=np.int64, count=count)
+    powers = np.fromiter((float(r[4]) for r in rows), dtype=np.float64, count=count)
+    type_ids = np.fromiter((r[5] for r in rows), dtype=np.int64, count=count)
+    return ids, starts, baselines, current, powers, type_ids
+
+
+def _update_charges(ids, charges, chunk_size):
+    """电量只有 0-100 共 101 种取值，按电量分组用 UPDATE ... WHERE id IN (...) 写回"""
+    now = timezone.now()
+    updated = 0
+    for charge in np.unique(charges):
+        group = ids[charges == charge].tolist()
+        for start in range(0, len(group), chunk_size):
+            updated += BatteryUsage.objects.filter(
+                id__in=group[start:start + chunk_size], is_active=True, is_discharging=True
+            ).update(current_charge=int(charge), updated_at=now)
+    return updated
+
+
+def close_depleted(ids, depleted_at, chunk_size):
+    """结束电量耗尽的使用记录，完成对应订单并释放电池；每块一个事务"""
+    closed = orders_completed = 0
+    ends = dict(zip(ids.tolist(), depleted_at.tolist()))
+    id_list = list(ends)
+    for start in range(0, len(id_list), chunk_size):
+        chunk = id_list[start:start + chunk_size]
+        with transaction.atomic():
+            lock_rows(BatteryUsage.objects.filter(id__in=chunk))
+            usages = list(
+                BatteryUsage.objects.filter(id__in=chunk, is_active=True, is_discharging=True)
+                .values_list('id', 'battery_id', 'user_id', 'start_time')
+            )
+            if not usages:
+                continue
+            now = timezone.now()
+            rows = []
+            for usage_id, _, _, start_time in usages:
+                end_time = datetime.fromtimestamp(ends[usage_id], tz=dt_timezone.utc)
+                hours = Decimal(str(round((end_time - start_time).total_seconds() / 3600, 2)))
+                rows.append((usage_id, end_time, hours, 0, False, now))
+            # 每行的结束时间不同，bulk_update 在大批量时很慢
+            update_rows(BatteryUsage, ['end_time', 'total_usage_hours', 'current_charge', 'is_active', 'updated_at'], rows)
+            closed += len(usages)
+
+            pairs = {(user_id, battery_id) for _, battery_id, user_id, _ in usages}
+            order_ids = [
+                order_id for order_id, user_id, battery_id in
+                RentalOrder.objects.filter(status='active', battery_id__in={b for _, b in pairs})
+                .values_list('id', 'user_id', 'battery_id')
+                if (user_id, battery_id) in pairs
+            ]
+            if order_ids:
+                orders_completed += RentalOrder.objects.filter(id__in=order_ids, status='active').update(
+                    status='completed', updated_at=now
+                )
+                availability.invalidate([b for _, b in pairs])
+                order_summary.invalidate([u for u, _ in pairs])
+            set_battery_status([b for _, b in pairs], 'available', expected_status='rented')
+    return closed, orders_completed
+
+
+def close_depleted_usage(usage, now=None):
+    """单个放电中的使用记录电量已耗尽时结束它（结束时间取推算的 0% 时刻），返回是否结束"""
+    now = now or timezone.now()
+    depleted_at = usage.depleted_at()
+    if depleted_at is None or depleted_at > now:
+        return False
+    closed, _ = close_depleted(np.array([usage.id]), np.array([depleted_at.timestamp()]), 1)
+    return closed > 0
+
+
+def run_discharge_pass(now=None, chunk_size=500):
+    """
+    计算所有放电中使用记录的电量并写回，返回统计信息 dict
+    电量耗尽的记录 end_time 取推算出的 0% 时刻（不晚于 now）
+    """
+    now = now or timezone.now()
+    started = time.perf_counter()
+    ids, starts, baselines, current, powers, type_ids = _load_discharging()
+    loaded = time.perf_counter()
+
+    hours = np.maximum(now.timestamp() - starts, 0) / 3600
+    charges = project_charges(type_ids, baselines, hours, powers)
+
+    changed = (charges != current) & (charges > 0)
+    updated = _update_charges(ids[changed], charges[changed], chunk_size)
+
+    depleted = charges <= 0
+    empty_after = hours_until_empty(type_ids[depleted], baselines[depleted], powers[depleted])
+    depleted_at = np.minimum(starts[depleted] + empty_after * 3600, now.timestamp())
+    closed, orders_completed = close_depleted(ids[depleted], depleted_at, chunk_size)
+
+    # 电量有变化的记录写入遥测样本（耗尽的记录以 0% 结束）
+    sampled = charges != current
+    record_samples(
+        (usage_id, charge, charge > 0, now)
+        for usage_id, charge in zip(ids[sampled].tolist(), charges[sampled].tolist())
+    )
+
+    return {
+        'active': len(ids),
+        'updated': updated,
+        'depleted': closed,
+        'orders_completed': orders_completed,
+        'load_seconds': loaded - started,
+        'total_seconds': time.perf_counter() - started,
+    }
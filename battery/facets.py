@@ -0,0 +1,224 @@
+"""
+电池列表分面搜索
+
+一次分组查询同时得到 分类 / 类型 / 状态 / 价格区间 四个维度的计数，
+计数结果写入缓存。缓存键中的版本号取自数据库：三张表的最大 updated_at（电池表走 battery_updated_at_idx）
+识别新增和修改，删除则由 post_delete 在同一事务内递增 CacheVersion 中的删除版本号（不再 COUNT(*) 全表），
+任何进程修改、新增或删除电池 / 类型 / 分类后，所有进程下次读取时都会换用新键，不依赖进程内的失效通知。
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, Count, Q, Value, When, CharField
+
+from .forms import BatteryFilterForm
+from .models import Battery, BatteryCategory, BatteryType, CacheVersion
+from .search import keyword_filter, RANKED_ORDERING
+from . import versions
+
+# 价格区间：(键, 显示名称, 下限(含), 上限(不含))
+PRICE_BUCKETS = [
+    ('0-50', '¥50以下', None, 50),
+    ('50-100', '¥50-100', 50, 100),
+    ('100-200', '¥100-200', 100, 200),
+    ('200+', '¥200以上', 200, None),
+]
+
+# BatteryFilterForm.sort_by 对应的排序键（最后一项为 id，便于游标分页）
+SORT_ORDERINGS = {
+    '-created_at': ('-created_at', '-id'),
+    'daily_rental_price': ('daily_rental_price', 'id'),
+    '-daily_rental_price': ('-daily_rental_price', '-id'),
+    'name': ('name', 'id'),
+    '-name': ('-name', '-id'),
+    '-avg_rating': ('-avg_rating', '-review_count', '-id'),
+}
+
+# 规格范围：筛选条件键 -> 查询条件（依赖 (status, capacity) / (status, voltage) 复合索引）
+SPEC_RANGES = {
+    'min_capacity': 'capacity__gte',
+    'max_capacity': 'capacity__lte',
+    'min_voltage': 'voltage__gte',
+    'max_voltage': 'voltage__lte',
+}
+
+FACET_CACHE_TIMEOUT = 60 * 10
+DELETE_VERSION = 'battery:facets:deletes'
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_filters(params):
+    """从 GET 参数中解析筛选条件，返回 (filters, spec_form)"""
+    spec_form = BatteryFilterForm(params)
+    # 表单整体无效时（如最小值大于最大值）仍使用通过校验的字段，错误由模板显示
+    spec_form.is_valid()
+    spec = spec_form.cleaned_data
+    filters = {
+        'category': _to_int(params.get('category')),
+        'type': _to_int(params.get('type')),
+        'status': params.get('status', 'available') or None,
+        'search': (params.get('search') or '').strip(),
+        'min_price': params.get('min_price') or None,
+        'max_price': params.get('max_price') or None,
+        'sort_by': spec.get('sort_by') or None,
+    }
+    for key in SPEC_RANGES:
+        filters[key] = spec.get(key)
+    return filters, spec_form
+
+
+def get_ordering(filters):
+    """列表排序：指定排序方式 > 搜索相关度 > 发布时间"""
+    if filters['sort_by']:
+        return SORT_ORDERINGS[filters['sort_by']]
+    if filters['search']:
+        return RANKED_ORDERING
+    return ('-created_at', '-id')
+
+
+def apply_spec_filters(queryset, filters):
+    """容量、电压范围"""
+    conditions = {
+        lookup: filters[key] for key, lookup in SPEC_RANGES.items() if filters.get(key) is not None
+    }
+    return queryset.filter(**conditions) if conditions else queryset
+
+
+def _apply_base_filters(queryset, filters, ranked=False):
+    """关键词、价格与规格范围：所有分面共享的条件"""
+    queryset = keyword_filter(queryset, filters['search'], ranked=ranked)
+    if filters['min_price']:
+        queryset = queryset.filter(daily_rental_price__gte=filters['min_price'])
+    if filters['max_price']:
+        queryset = queryset.filter(daily_rental_price__lte=filters['max_price'])
+    return apply_spec_filters(queryset, filters)
+
+
+def filter_batteries(filters, queryset=None):
+    """按全部筛选条件过滤电池"""
+    if queryset is None:
+        queryset = Battery.objects.select_related('battery_type')
+    queryset = _apply_base_filters(queryset, filters, ranked=True)
+    if filters['status']:
+        queryset = queryset.filter(status=filters['status'])
+    if filters['category']:
+        queryset = queryset.filter(battery_type__category_id=filters['category'])
+    if filters['type']:
+        queryset = queryset.filter(battery_type_id=filters['type'])
+    return queryset
+
+
+def _price_bucket_expression():
+    whens = []
+    for key, _label, low, high in PRICE_BUCKETS:
+        condition = Q()
+        if low is not None:
+            condition &= Q(daily_rental_price__gte=low)
+        if high is not None:
+            condition &= Q(daily_rental_price__lt=high)
+        whens.append(When(condition, then=Value(key)))
+    return Case(*whens, output_field=CharField())
+
+
+def mark_deleted():
+    """电池 / 类型 / 分类删除：在调用方的事务内递增删除版本号"""
+    versions.bump(DELETE_VERSION)
+
+
+def _facet_version():
+    """数据版本：一条查询取三张表的最大 updated_at 和删除版本号"""
+    quote = connection.ops.quote_name
+    columns = [
+        f'(SELECT MAX(updated_at) FROM {quote(model._meta.db_table)})'
+        for model in (Battery, BatteryType, BatteryCategory)
+    ]
+    columns.append(f'(SELECT version FROM {quote(CacheVersion._meta.db_table)} WHERE name = %s)')
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(columns), [DELETE_VERSION])
+        return '|'.join(str(value) for value in cursor.fetchone())
+
+
+def _cache_key(filters):
+    keys = ('search', 'min_price', 'max_price') + tuple(SPEC_RANGES)
+    raw = '|'.join(str(filters[k] if filters[k] is not None else '') for k in keys)
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    version = hashlib.md5(_facet_version().encode('utf-8')).hexdigest()
+    return f'battery:facets:{version}:{digest}'
+
+
+def _compute_rows(filters):
+    """一次分组查询：(分类, 类型, 状态, 价格区间) -> 数量"""
+    queryset = _apply_base_filters(Battery.objects.all(), filters)
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=_price_bucket_expression())
+        .values('battery_type__category_id', 'battery_type_id', 'status', 'price_bucket')
+        .annotate(count=Count('id'))
+    )
+    return {
+        'rows': [
+            (row['battery_type__category_id'], row['battery_type_id'],
+             row['status'], row['price_bucket'], row['count'])
+            for row in rows
+        ],
+        'categories': list(BatteryCategory.objects.values_list('id', 'name')),
+        'types': list(BatteryType.objects.values_list('id', 'name', 'category_id')),
+    }
+
+
+def get_facet_counts(filters):
+    """
+    返回各维度的计数，每个维度的计数不受自身筛选条件影响
+    （例如选中某个分类后，其他分类仍显示各自的数量）
+    """
+    key = _cache_key(filters)
+    data = cache.get(key)
+    if data is None:
+        data = _compute_rows(filters)
+        cache.set(key, data, FACET_CACHE_TIMEOUT)
+
+    category_counts, type_counts, status_counts, price_counts = {}, {}, {}, {}
+    for category_id, type_id, status, bucket, count in data['rows']:
+        match_category = not filters['category'] or category_id == filters['category']
+        match_type = not filters['type'] or type_id == filters['type']
+        match_status = not filters['status'] or status == filters['status']
+
+        if match_type and match_status:
+            category_counts[category_id] = category_counts.get(category_id, 0) + count
+        if match_category and match_status:
+            type_counts[type_id] = type_counts.get(type_id, 0) + count
+        if match_category and match_type:
+            status_counts[status] = status_counts.get(status, 0) + count
+            if match_status:
+                price_counts[bucket] = price_counts.get(bucket, 0) + count
+
+    return {
+        'categories': [
+            {'id': pk, 'name': name, 'count': category_counts.get(pk, 0)}
+            for pk, name in data['categories']
+        ],
+        'types': [
+            {'id': pk, 'name': name, 'category_id': category_id, 'count': type_counts.get(pk, 0)}
+            for pk, name, category_id in data['types']
+        ],
+        'statuses': [
+            {'value': value, 'label': label, 'count': status_counts.get(value, 0)}
+            for value, label in Battery.STATUS_CHOICES
+        ],
+        'price_buckets': [
+            {'key': key, 'label': label, 'min': low, 'max': high, 'count': price_counts.get(key, 0)}
+            for key, label, low, high in PRICE_BUCKETS
+        ],
+    }
+
+
+def search_batteries(filters):
+    """返回 (过滤后的电池查询集, 分面计数)"""
+    return filter_batteries(filters), get_facet_counts(filters)
@@ -0,0 +1,110 @@
+"""
+车队电量分布
+
+一次查询取出所有使用中的记录（联 Battery 取功率、类型、分类），放电中的按放电曲线整体推算当前电量，
+再用 np.bincount 按 分类 × 电量区间 计数，得到全车队及各分类的电量分布、暂停数、低电量数。
+结果作为快照存入 FleetSnapshot 表（所有进程共享），管理后台的车队看板只读快照，渲染耗时与记录数无关；
+快照由 refresh_fleet_snapshot 命令定期刷新（也可以在看板上手动刷新），
+超过 SNAPSHOT_TTL 未刷新（如命令未运行）时看板现场重新计算。
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .curves import project_charges
+from .models import BatteryCategory, BatteryUsage, FleetSnapshot
+
+SNAPSHOT_ID = 1
+REFRESH_INTERVAL = 60
+# 快照的有效期，留出命令偶尔延迟的余量
+SNAPSHOT_TTL = timedelta(seconds=REFRESH_INTERVAL * 3)
+# 电量区间：0-9、10-19、……、90-100
+BAND_WIDTH = 10
+BAND_COUNT = 10
+BAND_LABELS = [
+    f'{low}-{low + BAND_WIDTH - 1 if low + BAND_WIDTH < 100 else 100}%'
+    for low in range(0, 100, BAND_WIDTH)
+]
+NEAR_EMPTY = 15
+
+
+def _summary(band_counts, paused, near_empty):
+    return {
+        'total': int(band_counts.sum()),
+        'paused': int(paused),
+        'near_empty': int(near_empty),
+        'bands': [int(count) for count in band_counts],
+    }
+
+
+def compute_snapshot(now=None):
+    """计算车队电量分布快照（dict）"""
+    now = now or timezone.now()
+    rows = list(
+        BatteryUsage.objects.filter(is_active=True)
+        .order_by()
+        .values_list(
+            'start_time', 'baseline_charge', 'current_charge', 'is_discharging',
+            'battery__power', 'battery__battery_type_id', 'battery__battery_type__category_id',
+        )
+        .iterator(chunk_size=10000)
+    )
+    count = len(rows)
+    charges = np.fromiter((r[2] for r in rows), dtype=np.int64, count=count)
+    discharging = np.fromiter((r[3] for r in rows), dtype=bool, count=count)
+    category_ids = np.fromiter((r[6] for r in rows), dtype=np.int64, count=count)
+
+    if discharging.any():
+        picked = [r for r, flag in zip(rows, discharging.tolist()) if flag]
+        starts = np.array([r[0].timestamp() for r in picked])
+        charges[discharging] = project_charges(
+            [r[5] for r in picked],
+            [r[1] for r in picked],
+            np.maximum(now.timestamp() - starts, 0) / 3600,
+            [float(r[4]) for r in picked],
+        )
+
+    bands = np.minimum(np.clip(charges, 0, 100) // BAND_WIDTH, BAND_COUNT - 1)
+    paused = ~discharging
+    near_empty = charges <= NEAR_EMPTY
+
+    categories = list(BatteryCategory.objects.order_by('name').values_list('id', 'name'))
+    position = {category_id: index for index, (category_id, _) in enumerate(categories)}
+    slots = np.array([position.get(category_id, -1) for category_id in category_ids.tolist()], dtype=np.int64)
+    known = slots >= 0
+    size = len(categories)
+    band_matrix = np.bincount(
+        slots[known] * BAND_COUNT + bands[known], minlength=size * BAND_COUNT
+    ).reshape(size, BAND_COUNT) if size else np.zeros((0, BAND_COUNT), dtype=np.int64)
+    paused_by = np.bincount(slots[known & paused], minlength=size)
+    near_by = np.bincount(slots[known & near_empty], minlength=size)
+
+    by_category = [
+        {'id': category_id, 'name': name, **_summary(band_matrix[index], paused_by[index], near_by[index])}
+        for index, (category_id, name) in enumerate(categories)
+    ]
+    return {
+        'generated_at': now,
+        'band_labels': BAND_LABELS,
+        'near_empty_threshold': NEAR_EMPTY,
+        'fleet': _summary(np.bincount(bands, minlength=BAND_COUNT), paused.sum(), near_empty.sum()),
+        'by_category': [row for row in by_category if row['total']],
+    }
+
+
+def refresh_snapshot(now=None):
+    snapshot = compute_snapshot(now)
+    data = {key: value for key, value in snapshot.items() if key != 'generated_at'}
+    FleetSnapshot.objects.update_or_create(
+        pk=SNAPSHOT_ID, defaults={'generated_at': snapshot['generated_at'], 'data': data}
+    )
+    return snapshot
+
+
+def get_snapshot():
+    """读取快照；从未生成过或已超过有效期时现场计算一次"""
+    row = FleetSnapshot.objects.filter(pk=SNAPSHOT_ID).values_list('generated_at', 'data').first()
+    if row is None or timezone.now() - row[0] > SNAPSHOT_TTL:
+        return refresh_snapshot()
+    return {'generated_at': row[0], **row[1]}
@@ -237,6 +237,7 @@ class BatteryFilterForm(forms.Form):
             ('-daily_rental_price', '价格从高到低'),
             ('name', '名称A-Z'),
             ('-name', '名称Z-A'),
+            ('-avg_rating', '评分最高'),
         ],
         required=False,
         widget=forms.Select(attrs={'class': 'form-control'}),
@@ -257,3 +258,69 @@ class BatteryFilterForm(forms.Form):
             raise ValidationError('最小电压不能大于最大电压')
         
         return cleaned_data
+
+
+class BatteryMatchForm(forms.Form):
+    """批量规格匹配接口参数"""
+    category = forms.IntegerField(required=False, label='分类')
+    battery_type = forms.IntegerField(required=False, label='类型')
+    min_capacity = forms.DecimalField(max_digits=8, decimal_places=2, required=False, label='最小容量(Ah)')
+    max_capacity = forms.DecimalField(max_digits=8, decimal_places=2, required=False, label='最大容量(Ah)')
+    min_voltage = forms.DecimalField(max_digits=6, decimal_places=2, required=False, label='最小电压(V)')
+    max_voltage = forms.DecimalField(max_digits=6, decimal_places=2, required=False, label='最大电压(V)')
+    min_power = forms.DecimalField(max_digits=8, decimal_places=2, required=False, label='最小功率(W)')
+    max_price = forms.DecimalField(max_digits=8, decimal_places=2, required=False, label='最高日租金')
+    lat = forms.FloatField(min_value=-90, max_value=90, required=False, label='纬度')
+    lng = forms.FloatField(min_value=-180, max_value=180, required=False, label='经度')
+    radius_km = forms.FloatField(min_value=0, required=False, label='半径(km)')
+    sort = forms.ChoiceField(
+        choices=[
+            ('score', '综合得分'),
+            ('price', '价格从低到高'),
+            ('distance', '距离从近到远'),
+            ('-capacity', '容量从大到小'),
+        ],
+        required=False,
+        label='排序方式'
+    )
+    limit = forms.IntegerField(min_value=1, max_value=1000, required=False, label='数量')
+    weight_price = forms.FloatField(min_value=0, required=False, label='价格权重')
+    weight_distance = forms.FloatField(min_value=0, required=False, label='距离权重')
+    weight_capacity = forms.FloatField(min_value=0, required=False, label='容量权重')
+    weight_rating = forms.FloatField(min_value=0, required=False, label='评分权重')
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        lat = cleaned_data.get('lat')
+        lng = cleaned_data.get('lng')
+        
+        if (lat is None) != (lng is None):
+            raise ValidationError('纬度和经度需要同时提供')
+        
+        if lat is None and (cleaned_data.get('sort') == 'distance' or cleaned_data.get('radius_km') is not None):
+            raise ValidationError('按距离排序或限定半径时需要提供坐标')
+        
+        for low, high, label in (('min_capacity', 'max_capacity', '容量'), ('min_voltage', 'max_voltage', '电压')):
+            if cleaned_data.get(low) is not None and cleaned_data.get(high) is not None \
+                    and cleaned_data[low] > cleaned_data[high]:
+                raise ValidationError(f'最小{label}不能大于最大{label}')
+        
+        return cleaned_data
+    
+    def match_kwargs(self):
+        """转换为 battery.matching.match_batteries 的参数"""
+        data = self.cleaned_data
+        kwargs = {
+            key: data.get(key)
+            for key in ('category', 'battery_type', 'min_capacity', 'max_capacity',
+                        'min_voltage', 'max_voltage', 'min_power', 'max_price', 'radius_km')
+        }
+        kwargs['near'] = (data['lat'], data['lng']) if data.get('lat') is not None else None
+        kwargs['sort'] = data.get('sort') or 'score'
+        kwargs['limit'] = data.get('limit') or 200
+        kwargs['weights'] = {
+            name: data[f'weight_{name}']
+            for name in ('price', 'distance', 'capacity', 'rating')
+            if data.get(f'weight_{name}') is not None
+        }
+        return kwargs
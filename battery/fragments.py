@@ -0,0 +1,49 @@
+"""
+电池卡片片段缓存
+
+每张卡片的 HTML 按 (卡片模板, 是否登录, 电池 id) 缓存，并记录渲染时电池和电池类型
+（卡片显示类型名称）的 updated_at，一页的卡片用一次 get_many 取回，只渲染缺失或已过期的卡片。
+过期判断只依赖数据库中的时间戳，任何进程的修改都会被识别，无需逐进程删除缓存；
+调用方需 select_related('battery_type')。
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+LIST_CARD = 'battery/cards/list_card.html'
+GRID_CARD = 'battery/cards/grid_card.html'
+CARD_TEMPLATES = (LIST_CARD, GRID_CARD)
+
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# 卡片中只有收藏按钮与登录状态有关
+_VARIANTS = ('anon', 'auth')
+
+
+def _card_key(template_name, variant, battery_id):
+    return f'battery:card:{template_name}:{variant}:{battery_id}'
+
+
+def attach_card_html(batteries, template_name, request):
+    """为每个电池设置 card_html，模板中直接输出 {{ battery.card_html }}"""
+    batteries = list(batteries)
+    variant = 'auth' if request.user.is_authenticated else 'anon'
+    keys = {battery.id: _card_key(template_name, variant, battery.id) for battery in batteries}
+    cached = cache.get_many(keys.values())
+
+    missing = {}
+    for battery in batteries:
+        key = keys[battery.id]
+        stamp = f'{battery.updated_at.isoformat()}|{battery.battery_type.updated_at.isoformat()}'
+        entry = cached.get(key)
+        if entry is not None and entry[0] == stamp:
+            html = entry[1]
+        else:
+            html = render_to_string(template_name, {'battery': battery, 'user': request.user})
+            missing[key] = (stamp, html)
+        battery.card_html = mark_safe(html)
+
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+    return batteries
+
@@ -0,0 +1,83 @@
+"""
+电池使用统计
+
+Battery 上的 lifetime_usage_hours / cycle_count / avg_end_charge / rental_count 由已结束的使用记录汇总：
+  累计使用时长、等效循环次数（每次使用的放电深度 (100 - 结束电量)% 之和）、平均结束电量、使用次数。
+update_battery_health 按 BatteryUsage.updated_at 水位线只找出有变化的电池，
+再按电池（battery 外键索引）重新汇总这些电池的使用记录写回，结果幂等，重复处理同一行不会重复计数。
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.utils import timezone
+
+from .bulk import update_rows
+from .models import AnalyticsWatermark, Battery, BatteryUsage
+
+WATERMARK_NAME = 'battery_health'
+# 水位线向前回退的时间，覆盖提交较晚的长事务
+WATERMARK_OVERLAP = timedelta(seconds=30)
+HEALTH_FIELDS = ['lifetime_usage_hours', 'cycle_count', 'avg_end_charge', 'rental_count']
+
+_DEPTH = ExpressionWrapper(
+    (Value(100) - F('current_charge')) / Value(100.0),
+    output_field=DecimalField(max_digits=8, decimal_places=4),
+)
+
+
+def _summaries(battery_ids):
+    rows = (
+        BatteryUsage.objects.filter(battery_id__in=battery_ids, is_active=False)
+        .order_by()
+        .values('battery_id')
+        .annotate(
+            hours=Sum('total_usage_hours'),
+            cycles=Sum(_DEPTH),
+            end_charge=Avg('current_charge'),
+            count=Count('id'),
+        )
+    )
+    return {row['battery_id']: row for row in rows}
+
+
+def _refresh(battery_ids):
+    summaries = _summaries(battery_ids)
+    rows = []
+    for battery_id in battery_ids:
+        row = summaries.get(battery_id)
+        if row is None:
+            rows.append((battery_id, 0, 0, None, 0))
+        else:
+            rows.append((
+                battery_id,
+                round(row['hours'] or 0, 2),
+                round(float(row['cycles'] or 0), 2),
+                round(row['end_charge'], 2),
+                row['count'],
+            ))
+    update_rows(Battery, HEALTH_FIELDS, rows)
+    return len(rows)
+
+
+def update_battery_health(full=False, chunk_size=500):
+    """
+    汇总自上次水位线以来有使用记录变化的电池，返回更新的电池数
+    full=True 时重新汇总全部电池
+    """
+    now = timezone.now()
+    state = AnalyticsWatermark.objects.filter(name=WATERMARK_NAME).first()
+    if full or state is None:
+        battery_ids = list(Battery.objects.order_by('id').values_list('id', flat=True))
+    else:
+        battery_ids = sorted(set(
+            BatteryUsage.objects.filter(updated_at__gte=state.processed_until - WATERMARK_OVERLAP, is_active=False)
+            .values_list('battery_id', flat=True)
+        ))
+
+    updated = 0
+    for start in range(0, len(battery_ids), chunk_size):
+        with transaction.atomic():
+            updated += _refresh(battery_ids[start:start + chunk_size])
+    AnalyticsWatermark.objects.update_or_create(name=WATERMARK_NAME, defaults={'processed_until': now})
+    return updated
@@ -0,0 +1,142 @@
+"""
+批量电量上报
+
+换电站网关一次上报多个电池的电量读数 [{usage_id, charge, ts}]：
+  一次查询校验所有使用记录的归属，同一使用记录取时间最新的读数，
+  以读数作为新的基线（baseline_charge / start_time）批量写回，全部读数写入遥测样本。
+每条读数返回处理结果，便于网关重试失败的部分。
+"""
+import json
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bulk import lock_rows, update_rows
+from .depletion import mark_changed
+from .models import BatteryUsage
+from .telemetry import record_samples
+
+MAX_READINGS = 10000
+# 允许网关时钟超前的范围
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+APPLIED = 'applied'
+SUPERSEDED = 'superseded'
+STALE = 'stale'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+
+class IngestError(ValueError):
+    """请求体整体无法解析"""
+
+
+def parse_readings(body, content_type=''):
+    """解析 JSON 数组或 NDJSON（每行一个对象），返回 list"""
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    try:
+        if 'ndjson' in content_type or not text.lstrip().startswith('['):
+            readings = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            readings = json.loads(text)
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise IngestError(f'无法解析请求体: {exc}')
+    if not isinstance(readings, list):
+        raise IngestError('请求体应为读数数组')
+    if len(readings) > MAX_READINGS:
+        raise IngestError(f'单次最多上报 {MAX_READINGS} 条读数')
+    return readings
+
+
+def _clean(reading, now):
+    """校验单条读数，返回 (usage_id, charge, ts) 或错误信息"""
+    if not isinstance(reading, dict):
+        return None, '读数应为对象'
+    try:
+        usage_id = int(reading['usage_id'])
+        charge = reading['charge']
+        if isinstance(charge, bool) or int(charge) != charge:
+            raise ValueError
+        charge = int(charge)
+    except (KeyError, TypeError, ValueError):
+        return None, 'usage_id 和 charge 必须为整数'
+    if not 0 <= charge <= 100:
+        return None, '电量必须在 0-100 之间'
+
+    ts = now
+    if reading.get('ts'):
+        try:
+            ts = parse_datetime(str(reading['ts']))
+        except ValueError:
+            ts = None
+        if ts is None:
+            return None, '无效的时间'
+        if timezone.is_naive(ts):
+            ts = timezone.make_aware(ts)
+        if ts > now + MAX_CLOCK_SKEW:
+            return None, '时间晚于服务器时间'
+    return (usage_id, charge, ts), None
+
+
+def ingest_readings(user, readings):
+    """
+    应用一批读数，返回 (每条读数的结果 list, 实际更新的使用记录数)
+    普通用户只能上报自己的使用记录，管理员可以上报任意使用记录
+    """
+    now = timezone.now()
+    results = [None] * len(readings)
+    cleaned = {}
+    for index, reading in enumerate(readings):
+        value, error = _clean(reading, now)
+        if error:
+            results[index] = {'index': index, 'status': INVALID, 'error': error}
+        else:
+            cleaned[index] = value
+
+    usages = BatteryUsage.objects.filter(id__in={usage_id for usage_id, _, _ in cleaned.values()}, is_active=True)
+    if not user.is_staff:
+        usages = usages.filter(user=user)
+
+    with transaction.atomic():
+        lock_rows(usages)
+        current = {
+            usage_id: (start_time, is_discharging)
+            for usage_id, start_time, is_discharging in
+            usages.values_list('id', 'start_time', 'is_discharging')
+        }
+
+        # 每个使用记录只应用时间最新的读数
+        latest = {}
+        for index, (usage_id, charge, ts) in cleaned.items():
+            if usage_id not in current:
+                results[index] = {'index': index, 'usage_id': usage_id, 'status': NOT_FOUND, 'error': '使用记录不存在或已结束'}
+            elif ts < current[usage_id][0]:
+                results[index] = {'index': index, 'usage_id': usage_id, 'status': STALE, 'error': '读数早于当前基线'}
+            else:
+                if usage_id in latest:
+                    previous = latest[usage_id]
+                    if cleaned[previous][2] > ts:
+                        results[index] = {'index': index, 'usage_id': usage_id, 'status': SUPERSEDED}
+                        continue
+                    results[previous] = {'index': previous, 'usage_id': usage_id, 'status': SUPERSEDED}
+                latest[usage_id] = index
+                results[index] = {'index': index, 'usage_id': usage_id, 'status': APPLIED}
+
+        rows = []
+        for usage_id, index in latest.items():
+            _, charge, ts = cleaned[index]
+            start_time, is_discharging = current[usage_id]
+            # 放电中的读数成为新的起算点；暂停中只更新电量，恢复放电时再重置起算点
+            rows.append((usage_id, charge, charge, ts if is_discharging else start_time, now))
+        update_rows(BatteryUsage, ['current_charge', 'baseline_charge', 'start_time', 'updated_at'], rows)
+        if rows:
+            mark_changed()
+
+        record_samples(
+            (usage_id, charge, current[usage_id][1], ts)
+            for index, (usage_id, charge, ts) in cleaned.items()
+            if results[index]['status'] in (APPLIED, SUPERSEDED)
+        )
+    return results, len(rows)
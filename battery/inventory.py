@@ -0,0 +1,36 @@
+"""
+电池状态批量变更
+
+queryset.update 不触发 signals，批量修改电池状态时统一经过这里：
+同步分类 / 类型计数，并刷新 updated_at（分面计数、卡片缓存、规格匹配快照据此识别变化）。
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters
+from .bulk import lock_rows
+from .models import Battery
+
+
+def set_battery_status(battery_ids, status, expected_status=None):
+    """
+    将一批电池改为 status，expected_status 不为空时只修改当前处于该状态的电池
+    返回实际修改的电池 id 列表
+    """
+    battery_ids = list(battery_ids)
+    if not battery_ids:
+        return []
+    with transaction.atomic():
+        lock_rows(Battery.objects.filter(id__in=battery_ids))
+        batteries = Battery.objects.filter(id__in=battery_ids).exclude(status=status)
+        if expected_status is not None:
+            batteries = batteries.filter(status=expected_status)
+        rows = list(batteries.values_list('id', 'battery_type_id', 'status'))
+        changed = [battery_id for battery_id, _, _ in rows]
+        if not changed:
+            return []
+        Battery.objects.filter(id__in=changed).update(status=status, updated_at=timezone.now())
+        counters.apply_bulk_changes(
+            ((type_id, old_status), (type_id, status)) for _, type_id, old_status in rows
+        )
+    return changed
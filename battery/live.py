@@ -0,0 +1,187 @@
+"""
+电量实时推送
+
+使用页通过 SSE（usage/stream/）订阅自己当前使用记录的电量、放电状态和耗尽事件，
+不支持 SSE 时退回长轮询（usage/poll/）。
+
+进程内只有一个广播任务：每 TICK 秒（或收到 notify 时立即）用一条查询取出所有订阅用户的
+使用中记录，按放电曲线整体推算电量，只向状态有变化的订阅者推送。
+无论同时打开多少个页面，每个周期都只有一次数据库查询，页面本身不读写数据库。
+广播任务运行在 ASGI 事件循环上（New_energy_battery/asgi.py），需要用 ASGI 服务器部署。
+"""
+import asyncio
+from datetime import datetime
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .curves import hours_until_empty, project_charges
+from .models import BatteryUsage
+
+TICK = 5
+# SSE 注释行保活间隔（秒），防止代理断开空闲连接
+KEEPALIVE = 15
+# 长轮询最长等待时间（秒）
+POLL_TIMEOUT = 25
+QUEUE_SIZE = 10
+ID_CHUNK = 500
+
+
+def _snapshot(row):
+    usage_id, _, _, _, current, discharging, _, _, name = row
+    return {
+        'usage_id': usage_id,
+        'battery': name,
+        'charge': current,
+        'is_discharging': discharging,
+        'depleted_at': None,
+    }
+
+
+def load_states(user_ids, now=None):
+    """一次取出这些用户的使用中记录并推算电量，返回 {用户 id: 状态 dict}，没有使用中记录的用户不在结果中"""
+    now = now or timezone.now()
+    rows = []
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), ID_CHUNK):
+        rows.extend(
+            BatteryUsage.objects.filter(user_id__in=user_ids[start:start + ID_CHUNK], is_active=True)
+            .order_by()
+            .values_list(
+                'id', 'user_id', 'start_time', 'baseline_charge', 'current_charge', 'is_discharging',
+                'battery__power', 'battery__battery_type_id', 'battery__name',
+            )
+        )
+    states = {row[1]: _snapshot(row) for row in rows}
+
+    discharging = [row for row in rows if row[5]]
+    if discharging:
+        type_ids = [row[7] for row in discharging]
+        baselines = [row[3] for row in discharging]
+        powers = [float(row[6]) for row in discharging]
+        starts = np.array([row[2].timestamp() for row in discharging])
+        hours = (now.timestamp() - starts) / 3600
+        charges = project_charges(type_ids, baselines, hours, powers)
+        empty_at = starts + hours_until_empty(type_ids, baselines, powers) * 3600
+        for row, charge, ts in zip(discharging, charges.tolist(), empty_at.tolist()):
+            state = states[row[1]]
+            state['charge'] = charge
+            state['depleted_at'] = datetime.fromtimestamp(ts, tz=timezone.get_current_timezone()).isoformat()
+    return states
+
+
+def _ended_states(usage_ids):
+    """已结束的使用记录的最终电量"""
+    return dict(BatteryUsage.objects.filter(id__in=usage_ids).values_list('id', 'current_charge'))
+
+
+def state_version(state):
+    """状态的简短标识，长轮询客户端回传以判断是否有变化"""
+    if state is None:
+        return 'none'
+    return f"{state['usage_id']}:{state['charge']}:{int(state['is_discharging'])}"
+
+
+def payload(event, data):
+    """推送给客户端的内容；使用记录已结束时 version 为 'none'"""
+    state = data if data is not None and 'is_discharging' in data else None
+    return {'event': event, 'data': data, 'version': state_version(state)}
+
+
+def make_event(previous, state, ended_charges):
+    """对比前后状态生成事件 (事件名, 数据)，没有变化时返回 None"""
+    if state is not None:
+        if previous is not None and previous['usage_id'] == state['usage_id'] \
+                and state_version(previous) == state_version(state):
+            return None
+        if state['charge'] <= 0 and state['is_discharging']:
+            return 'depleted', state
+        return 'charge', state
+    if previous is None:
+        return None
+    final = ended_charges.get(previous['usage_id'], previous['charge'])
+    data = {'usage_id': previous['usage_id'], 'charge': final}
+    return ('depleted' if final <= 0 else 'ended'), data
+
+
+class Broadcaster:
+    """订阅者为 asyncio.Queue，按用户分组；只在事件循环线程内修改"""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.states = {}
+        self._task = None
+        self._loop = None
+        self._wake = None
+
+    def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self.states = {}
+            self._task = loop.create_task(self._run())
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        self._wake.set()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[user_id]
+            self.states.pop(user_id, None)
+
+    def notify(self):
+        """其他线程（同步视图）中调用：立即刷新一次"""
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    @staticmethod
+    def _put(queue, event):
+        if queue.full():
+            # 客户端读取太慢时丢弃最旧的事件，只保证最新状态送达
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    async def _run(self):
+        while self.subscribers:
+            self._wake.clear()
+            user_ids = list(self.subscribers)
+            states = await sync_to_async(load_states)(user_ids)
+            vanished = [
+                self.states[user_id]['usage_id'] for user_id in user_ids
+                if user_id not in states and self.states.get(user_id) is not None
+            ]
+            ended = await sync_to_async(_ended_states)(vanished) if vanished else {}
+            for user_id in user_ids:
+                queues = self.subscribers.get(user_id)
+                if not queues:
+                    continue
+                previous, state = self.states.get(user_id), states.get(user_id)
+                self.states[user_id] = state
+                event = make_event(previous, state, ended)
+                # 新订阅者需要当前状态：每个队列第一次都收到 snapshot
+                for queue in queues:
+                    if not getattr(queue, 'primed', False):
+                        queue.primed = True
+                        self._put(queue, ('snapshot', state))
+                    elif event is not None:
+                        self._put(queue, event)
+            try:
+                await asyncio.wait_for(self._wake.wait(), TICK)
+            except asyncio.TimeoutError:
+                pass
+        self._task = None
+
+
+broadcaster = Broadcaster()
+
+
+def notify():
+    broadcaster.notify()
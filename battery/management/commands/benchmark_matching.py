@@ -0,0 +1,89 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from battery import matching
+from battery.models import Battery, BatteryCategory, BatteryType
+
+
+class Command(BaseCommand):
+    help = '规格匹配性能测试：生成临时电池数据，输出快照加载与匹配查询耗时（结束后回滚，不保留数据）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000, help='生成的电池数量')
+        parser.add_argument('--repeat', type=int, default=50, help='每个查询重复次数')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._populate(options['rows'])
+            start = time.perf_counter()
+            index = matching._load_full(matching._current_state())
+            self.stdout.write(f'快照加载 {len(index)} 个可租电池，用时 {time.perf_counter() - start:.2f}s')
+            self._run_scenarios(index, options['repeat'])
+            # 测试数据不保留
+            transaction.set_rollback(True)
+
+    def _populate(self, rows, batch_size=10000):
+        self.stdout.write(f'生成 {rows} 个电池...')
+        start = time.perf_counter()
+        category = BatteryCategory.objects.create(name='性能测试分类')
+        battery_types = [
+            BatteryType.objects.create(name=f'性能测试类型{i}', category=category) for i in range(5)
+        ]
+        statuses = ['available'] * 6 + ['rented'] * 2 + ['maintenance', 'retired']
+
+        batch = []
+        for i in range(rows):
+            capacity = random.uniform(20, 200)
+            voltage = random.choice([3.2, 3.7, 12, 24, 48, 72])
+            batch.append(Battery(
+                name=f'测试电池{i}',
+                battery_type=random.choice(battery_types),
+                serial_number=f'MATCH{i:08d}',
+                status=random.choice(statuses),
+                capacity=Decimal(f'{capacity:.2f}'),
+                voltage=Decimal(f'{voltage:.2f}'),
+                power=Decimal(f'{capacity * voltage:.2f}'),
+                weight=Decimal(f'{random.uniform(5, 50):.2f}'),
+                daily_rental_price=Decimal(f'{random.uniform(20, 300):.2f}'),
+                deposit=Decimal('1000.00'),
+                location='性能测试',
+                latitude=Decimal(f'{random.uniform(22, 42):.7f}'),
+                longitude=Decimal(f'{random.uniform(100, 122):.7f}'),
+            ))
+            if len(batch) >= batch_size:
+                Battery.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Battery.objects.bulk_create(batch)
+        self.stdout.write(f'数据生成完成，用时 {time.perf_counter() - start:.1f}s')
+
+    def _run_scenarios(self, index, repeat):
+        scenarios = [
+            ('容量 ≥ 100、电压 48V、价格最低前 200', {
+                'min_capacity': 100, 'min_voltage': 47, 'max_voltage': 49, 'sort': 'price',
+            }),
+            ('北京 50km 内综合得分前 200', {
+                'near': (39.9, 116.4), 'radius_km': 50,
+            }),
+            ('容量 ≥ 50、离上海最近前 200', {
+                'min_capacity': 50, 'near': (31.2, 121.5), 'sort': 'distance',
+            }),
+            ('无筛选条件综合得分前 1000', {'limit': 1000}),
+        ]
+        for title, kwargs in scenarios:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results = matching.match_batteries(index=index, **kwargs)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            median = timings[len(timings) // 2]
+            style = self.style.SUCCESS if median < 10 else self.style.WARNING
+            self.stdout.write(style(f'\n== {title}'))
+            self.stdout.write(
+                f'返回 {len(results)} 条  中位数 {median:.2f}ms  最大 {timings[-1]:.2f}ms'
+            )
@@ -0,0 +1,91 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from battery.facets import SORT_ORDERINGS, apply_spec_filters
+from battery.models import Battery, BatteryCategory, BatteryType
+
+
+class Command(BaseCommand):
+    help = '规格筛选性能测试：生成临时电池数据，输出查询计划与耗时（结束后回滚，不保留数据）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='生成的电池数量')
+        parser.add_argument('--repeat', type=int, default=20, help='每个查询重复次数')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            self._populate(rows)
+            self._run_scenarios(options['repeat'])
+            # 测试数据不保留
+            transaction.set_rollback(True)
+
+    def _populate(self, rows, batch_size=10000):
+        self.stdout.write(f'生成 {rows} 个电池...')
+        start = time.perf_counter()
+        category = BatteryCategory.objects.create(name='性能测试分类')
+        battery_type = BatteryType.objects.create(name='性能测试类型', category=category)
+        statuses = ['available'] * 6 + ['rented'] * 2 + ['maintenance', 'retired']
+
+        batch = []
+        for i in range(rows):
+            capacity = random.uniform(20, 200)
+            voltage = random.choice([3.2, 3.7, 12, 24, 48, 72])
+            batch.append(Battery(
+                name=f'测试电池{i}',
+                battery_type=battery_type,
+                serial_number=f'BENCH{i:08d}',
+                status=random.choice(statuses),
+                capacity=Decimal(f'{capacity:.2f}'),
+                voltage=Decimal(f'{voltage:.2f}'),
+                power=Decimal(f'{capacity * voltage:.2f}'),
+                weight=Decimal(f'{random.uniform(5, 50):.2f}'),
+                daily_rental_price=Decimal(f'{random.uniform(20, 300):.2f}'),
+                deposit=Decimal('1000.00'),
+                location='性能测试',
+            ))
+            if len(batch) >= batch_size:
+                Battery.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Battery.objects.bulk_create(batch)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(f'数据生成完成，用时 {time.perf_counter() - start:.1f}s')
+
+    def _run_scenarios(self, repeat):
+        available = Battery.objects.filter(status='available')
+        scenarios = [
+            ('容量范围 + 按价格排序', {'min_capacity': Decimal('100'), 'max_capacity': Decimal('105')},
+             'daily_rental_price'),
+            ('电压范围 + 最新发布', {'min_voltage': Decimal('47'), 'max_voltage': Decimal('49')},
+             '-created_at'),
+            ('价格从低到高（无规格条件）', {}, 'daily_rental_price'),
+            ('价格从高到低（无规格条件）', {}, '-daily_rental_price'),
+        ]
+        for title, spec, sort_by in scenarios:
+            filters = {'min_capacity': None, 'max_capacity': None, 'min_voltage': None, 'max_voltage': None}
+            filters.update(spec)
+            queryset = apply_spec_filters(available, filters).order_by(*SORT_ORDERINGS[sort_by])[:13]
+
+            plan = queryset.explain()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+
+            uses_index = 'USING INDEX battery_status_' in plan
+            style = self.style.SUCCESS if uses_index else self.style.WARNING
+            self.stdout.write(style(f'\n== {title}'))
+            self.stdout.write(plan)
+            self.stdout.write(
+                f'中位数 {timings[len(timings) // 2]:.2f}ms  最大 {timings[-1]:.2f}ms  '
+                f'使用复合索引: {"是" if uses_index else "否"}'
+            )
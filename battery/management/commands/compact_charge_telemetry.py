@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from battery.telemetry import compact_telemetry, flush
+
+
+class Command(BaseCommand):
+    help = '电量遥测降采样：原始样本压缩为 1分钟 / 1小时 / 1天 数据，并清理超过保留期的数据'
+
+    def handle(self, *args, **options):
+        flush()
+        stats = compact_telemetry()
+        written = '，'.join(f'{resolution} {count} 行' for resolution, count in stats['written'].items())
+        deleted = '，'.join(f'{level} {count} 行' for level, count in stats['deleted'].items()) or '无'
+        self.stdout.write(self.style.SUCCESS(f'降采样完成：{written}；清理过期数据：{deleted}'))
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from battery.models import BatteryCategory, BatteryType, Battery, BatteryUsage, RentalOrder, BatteryReview
+from battery.ratings import rebuild_rating_stats
 from decimal import Decimal
 from datetime import datetime, timedelta
 import random
@@ -200,6 +201,9 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(f'创建评价: {review.battery.name}')
         
+        # 评价是直接创建的，需要同步电池上的评分统计
+        rebuild_rating_stats()
+        
         self.stdout.write(
             self.style.SUCCESS('测试数据创建完成！')
         )
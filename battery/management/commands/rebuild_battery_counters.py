@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from battery.counters import rebuild_battery_counters
+
+
+class Command(BaseCommand):
+    help = '根据电池记录重建分类、类型的各状态电池数量'
+
+    def handle(self, *args, **options):
+        categories, types = rebuild_battery_counters()
+        self.stdout.write(self.style.SUCCESS(f'电池数量统计重建完成，共 {categories} 个分类、{types} 个类型'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from battery.ratings import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = '根据评价记录重建电池评分统计'
+
+    def handle(self, *args, **options):
+        total = rebuild_rating_stats()
+        self.stdout.write(self.style.SUCCESS(f'评分统计重建完成，共 {total} 个电池'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from battery.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = '重建电池全文检索索引'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('当前数据库不支持全文索引，请先执行 migrate')
+        total = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'索引重建完成，共 {total} 个电池'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from battery.fleet import REFRESH_INTERVAL, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = '刷新车队电量分布快照（管理后台看板读取该快照）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='作为常驻进程循环运行')
+        parser.add_argument('--interval', type=float, default=REFRESH_INTERVAL, help='循环间隔（秒）')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            snapshot = refresh_snapshot()
+            elapsed = time.perf_counter() - started
+            fleet = snapshot['fleet']
+            self.stdout.write(self.style.SUCCESS(
+                f"使用中 {fleet['total']} 条，已暂停 {fleet['paused']} 条，低电量 {fleet['near_empty']} 条，用时 {elapsed:.2f}s"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(max(options['interval'] - elapsed, 0))
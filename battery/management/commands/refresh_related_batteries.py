@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from battery.recommendations import DEFAULT_TOP_K, refresh_related_batteries
+
+
+class Command(BaseCommand):
+    help = '重新计算相关电池推荐'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='每个电池保留的推荐数量')
+
+    def handle(self, *args, **options):
+        total = refresh_related_batteries(top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'相关电池推荐已更新，共 {total} 条'))
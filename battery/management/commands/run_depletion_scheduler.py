@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from battery import depletion
+
+
+class Command(BaseCommand):
+    help = '电量耗尽调度：按预计耗尽时刻唤醒，结束电量耗尽的使用记录并完成订单'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float, default=depletion.POLL_INTERVAL, help='检查使用记录变化的间隔（秒）')
+
+    def handle(self, *args, **options):
+        def report(closed, orders):
+            self.stdout.write(self.style.SUCCESS(
+                f'{timezone.localtime():%Y-%m-%d %H:%M:%S} 电量耗尽 {closed} 条，完成订单 {orders} 个'
+            ))
+
+        self.stdout.write(f'调度中的放电记录 {depletion.scheduler.rebuild()} 条')
+        depletion.serve_forever(options['poll'], on_closed=report)
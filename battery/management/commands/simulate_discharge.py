@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from battery.discharge import run_discharge_pass
+
+
+class Command(BaseCommand):
+    help = '批量放电模拟：更新所有放电中电池的电量，电量耗尽时结束使用并完成订单'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='作为常驻进程循环运行')
+        parser.add_argument('--interval', type=float, default=60, help='循环间隔（秒）')
+        parser.add_argument('--chunk-size', type=int, default=500, help='每个事务处理的记录数')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = run_discharge_pass(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"放电中 {stats['active']} 条，更新电量 {stats['updated']} 条，"
+                f"电量耗尽 {stats['depleted']} 条，完成订单 {stats['orders_completed']} 个，"
+                f"用时 {stats['total_seconds']:.2f}s（加载 {stats['load_seconds']:.2f}s）"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(max(options['interval'] - stats['total_seconds'], 0))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from battery import sweeper
+from station.sweeper import rental_policies
+
+
+class Command(BaseCommand):
+    help = '订单清理：取消长期未确认 / 未开始的订单，处理超期未归还的租赁订单和网点租赁记录'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pending-hours', type=float, default=sweeper.PENDING_HOURS, help='待确认订单超过开始时间多少小时后取消')
+        parser.add_argument('--confirmed-hours', type=float, default=sweeper.CONFIRMED_HOURS, help='已确认订单超过结束时间多少小时仍未开始则取消')
+        parser.add_argument('--overdue-hours', type=float, default=sweeper.OVERDUE_HOURS, help='使用中订单超过结束时间多少小时视为超期')
+        parser.add_argument('--overdue-action', choices=sweeper.OVERDUE_ACTIONS, default='flag', help='超期订单的处理方式：flag 标记，complete 结算')
+        parser.add_argument('--chunk-size', type=int, default=500, help='每个事务处理的记录数')
+        parser.add_argument('--dry-run', action='store_true', help='只统计，不修改')
+        parser.add_argument('--loop', action='store_true', help='作为常驻进程循环运行')
+        parser.add_argument('--interval', type=float, default=300, help='循环间隔（秒）')
+
+    def handle(self, *args, **options):
+        while True:
+            now = timezone.now()
+            policies = sweeper.order_policies(
+                now,
+                pending_hours=options['pending_hours'],
+                confirmed_hours=options['confirmed_hours'],
+                overdue_hours=options['overdue_hours'],
+                overdue_action=options['overdue_action'],
+            ) + rental_policies(now, pending_hours=options['pending_hours'], overdue_hours=options['overdue_hours'])
+            reports = sweeper.sweep_all(policies, now, options['chunk_size'], options['dry_run'])
+
+            verb = '待处理' if options['dry_run'] else '已处理'
+            self.stdout.write(f'{timezone.localtime(now):%Y-%m-%d %H:%M:%S}')
+            for report in reports:
+                line = f"  {report['description']}：{verb} {report['count']} 条"
+                if report['sample']:
+                    line += f"（{', '.join(str(label) for label in report['sample'])}{' 等' if report['count'] > len(report['sample']) else ''}）"
+                self.stdout.write(line)
+            total = sum(report['count'] for report in reports)
+            self.stdout.write(self.style.SUCCESS(f'订单清理完成，{verb}共 {total} 条'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
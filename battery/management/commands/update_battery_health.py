@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from battery.health import update_battery_health
+
+
+class Command(BaseCommand):
+    help = '电池使用统计：按使用记录增量汇总累计使用时长、等效循环次数、平均结束电量和使用次数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='忽略水位线，重新汇总全部电池')
+
+    def handle(self, *args, **options):
+        updated = update_battery_health(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'使用统计更新完成，共 {updated} 个电池'))
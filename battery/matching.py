@@ -0,0 +1,280 @@
+"""
+批量规格匹配
+
+把可租电池的规格列常驻内存（NumPy 列数组，按 id 排序），筛选和加权打分都用向量运算完成，
+用于“容量 ≥ X、电压在 [a, b]、离某点最近、价格最低的前 200 个电池”这类批量选型查询。
+
+缓存刷新（状态取自数据库，各进程都能察觉其他进程的写入）：
+  每次查询读取电池表的最大 updated_at（走 battery_updated_at_idx），变化时按 updated_at 水位线
+  只拉取变化的行合并进数组；
+  电池删除、类型改挂分类无法按 updated_at 识别，在同一事务内递增 CacheVersion 中的重置版本号，
+  下次查询全量重新加载；
+  另外每 FULL_RELOAD_INTERVAL 秒全量重载一次，兜底绕过 signals 的批量写入。
+"""
+import math
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import FloatField, Max
+from django.db.models.functions import Cast
+
+from . import versions
+from .models import Battery
+
+RESET_VERSION = 'battery:matching:reset'
+FULL_RELOAD_INTERVAL = 60 * 10
+# 增量拉取时水位线向前回退的时间，覆盖提交较晚的长事务
+WATERMARK_OVERLAP = timedelta(seconds=30)
+
+SPEC_COLUMNS = ('capacity', 'voltage', 'power', 'weight', 'daily_rental_price', 'avg_rating')
+CAPACITY, VOLTAGE, POWER, WEIGHT, PRICE, RATING = range(len(SPEC_COLUMNS))
+# 数值列在数据库端转换为浮点数，省去逐行构造 Decimal
+_FLOAT_COLUMNS = {f'_{name}': Cast(name, FloatField()) for name in (*SPEC_COLUMNS, 'latitude', 'longitude')}
+_FIELDS = (
+    'id', 'status', 'battery_type_id', 'battery_type__category_id',
+    *_FLOAT_COLUMNS, 'updated_at',
+)
+
+SORT_CHOICES = ('score', 'price', 'distance', '-capacity')
+DEFAULT_WEIGHTS = {'price': 1.0, 'distance': 1.0, 'capacity': 0.5, 'rating': 0.5}
+MAX_LIMIT = 1000
+# 未限定半径时，距离得分在该距离处降为一半
+DISTANCE_SCALE_KM = 50.0
+# 候选数不超过总数的 1 / GATHER_RATIO 时先收集候选行
+GATHER_RATIO = 4
+EARTH_RADIUS_KM = 6371.0
+
+
+class SpecIndex:
+    """一份只读的规格快照，刷新时整体替换；每列连续存放，便于整列做向量运算"""
+
+    ARRAYS = ('ids', 'type_ids', 'category_ids', 'specs', 'units')
+    # 参与加权得分的列：(列, 越大越好)
+    SCORED = ((PRICE, False), (CAPACITY, True), (RATING, True))
+
+    def __init__(self, rows, state, loaded_at, watermark):
+        count = len(rows)
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=count)
+        self.type_ids = np.fromiter((r[2] for r in rows), dtype=np.int64, count=count)
+        self.category_ids = np.fromiter((r[3] for r in rows), dtype=np.int64, count=count)
+        # specs[列, 行]
+        self.specs = np.array([r[4:10] for r in rows], dtype=np.float32).reshape(count, len(SPEC_COLUMNS)).T
+        # 经纬度转换为单位球面坐标 units[xyz, 行]（float64，近距离也有足够精度），距离比较只需点积；
+        # 无坐标的行为 NaN
+        coords = np.array(
+            [(np.nan if r[10] is None else r[10], np.nan if r[11] is None else r[11]) for r in rows],
+            dtype=np.float64,
+        ).reshape(count, 2)
+        self.units = _unit_vectors(coords[:, 0], coords[:, 1])
+        self._finalize()
+        self.state = state
+        self.loaded_at = loaded_at
+        self.watermark = watermark
+
+    def _finalize(self):
+        """按 id 排序，并预先计算各得分项按全体可租电池归一化到 [0, 1] 的值 norms[项, 行]"""
+        order = np.argsort(self.ids, kind='stable')
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            setattr(self, name, np.ascontiguousarray(array[..., order]))
+        self.norms = np.ones((len(self.SCORED), len(self.ids)), dtype=np.float32)
+        for row, (column, higher_is_better) in enumerate(self.SCORED):
+            values = self.specs[column]
+            if not len(values) or values.max() <= values.min():
+                continue
+            scaled = (values - values.min()) / (values.max() - values.min())
+            self.norms[row] = scaled if higher_is_better else 1 - scaled
+
+    def __len__(self):
+        return len(self.ids)
+
+    def merged(self, rows, state, watermark):
+        """合并增量行：先删除这些 id 的旧数据，再追加其中仍可租的行"""
+        changed = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        keep = ~np.isin(self.ids, changed)
+        fresh = SpecIndex([r for r in rows if r[1] == 'available'], state, self.loaded_at, watermark)
+        for name in self.ARRAYS:
+            setattr(fresh, name, np.concatenate([getattr(self, name)[..., keep], getattr(fresh, name)], axis=-1))
+        fresh._finalize()
+        return fresh
+
+
+def _unit_vectors(lats, lngs):
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    cos_lat = np.cos(lats)
+    return np.stack([cos_lat * np.cos(lngs), cos_lat * np.sin(lngs), np.sin(lats)])
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def mark_reset():
+    """电池删除等增量无法表达的变化：在调用方的事务内递增重置版本号，下次查询全量重载"""
+    versions.bump(RESET_VERSION)
+
+
+def _current_state():
+    """(电池最大 updated_at, 重置版本号)"""
+    latest = Battery.objects.order_by().aggregate(latest=Max('updated_at'))['latest']
+    return latest, versions.current(RESET_VERSION)
+
+
+def _watermark(rows, default):
+    stamps = [r[12] for r in rows if r[12] is not None]
+    return max(stamps) - WATERMARK_OVERLAP if stamps else default
+
+
+def _load_full(state):
+    rows = list(
+        Battery.objects.filter(status='available').annotate(**_FLOAT_COLUMNS).order_by()
+        .values_list(*_FIELDS).iterator(chunk_size=10000)
+    )
+    return SpecIndex(rows, state, time.monotonic(), _watermark(rows, None))
+
+
+def _load_changes(index, state):
+    if index.watermark is None:
+        return _load_full(state)
+    rows = list(
+        Battery.objects.filter(updated_at__gte=index.watermark).annotate(**_FLOAT_COLUMNS).order_by()
+        .values_list(*_FIELDS)
+    )
+    if not rows:
+        index.state = state
+        return index
+    return index.merged(rows, state, max(index.watermark, _watermark(rows, index.watermark)))
+
+
+def get_index():
+    """返回最新的规格快照，必要时增量或全量刷新"""
+    global _index
+    state = _current_state()
+    index = _index
+    if index is not None and index.state == state and time.monotonic() - index.loaded_at < FULL_RELOAD_INTERVAL:
+        return index
+    with _lock:
+        index = _index
+        if index is None or index.state[1] != state[1] or time.monotonic() - index.loaded_at >= FULL_RELOAD_INTERVAL:
+            index = _load_full(state)
+        elif index.state != state:
+            index = _load_changes(index, state)
+        _index = index
+    return index
+
+
+def match_batteries(min_capacity=None, max_capacity=None, min_voltage=None, max_voltage=None,
+                    min_power=None, max_price=None, category=None, battery_type=None,
+                    near=None, radius_km=None, sort='score', limit=200, weights=None, index=None):
+    """
+    在可租电池中筛选并排序，返回 [{'id', 'score', 'distance_km', 规格...}]
+    near=(纬度, 经度) 时计算距离，radius_km 限定半径；
+    sort='score' 按 weights 加权得分（价格越低、距离越近、容量越大、评分越高越好），
+    价格、容量按全体可租电池的范围归一化，不同查询之间的得分可以直接比较
+    """
+    if sort not in SORT_CHOICES:
+        raise ValueError(f'不支持的排序方式: {sort}')
+    if sort == 'distance' and near is None:
+        raise ValueError('按距离排序需要提供坐标')
+    index = index or get_index()
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    specs = index.specs
+
+    # 全程使用整列数组和布尔掩码，避免按行号收集子集
+    mask = np.ones(len(index), dtype=bool)
+    for column, bound, is_min in (
+        (CAPACITY, min_capacity, True), (CAPACITY, max_capacity, False),
+        (VOLTAGE, min_voltage, True), (VOLTAGE, max_voltage, False),
+        (POWER, min_power, True), (PRICE, max_price, False),
+    ):
+        if bound is not None:
+            mask &= specs[column] >= float(bound) if is_min else specs[column] <= float(bound)
+    if category is not None:
+        mask &= index.category_ids == int(category)
+    if battery_type is not None:
+        mask &= index.type_ids == int(battery_type)
+
+    dots = None
+    if near is not None:
+        query = _unit_vectors(np.array([float(near[0])]), np.array([float(near[1])]))[:, 0]
+        # 点积为球心角余弦，越大越近；无坐标的行为 NaN，比较结果为 False
+        dots = query @ index.units
+        angle = min(radius_km / EARTH_RADIUS_KM, math.pi) if radius_km is not None else math.pi
+        mask &= dots >= math.cos(angle) - 1e-12
+    candidates = int(np.count_nonzero(mask))
+    if not candidates:
+        return []
+    # 候选较少时先按行号收集再计算，较多时直接在整列上计算，省去收集开销
+    rows = np.flatnonzero(mask) if candidates * GATHER_RATIO <= len(index) else None
+
+    def take(values):
+        return values if rows is None else values[..., rows]
+
+    # 加权得分：价格、容量、评分使用快照中预先归一化的值，距离项为 1 / (1 + 弦长 / 尺度)，
+    # 近距离时弦长与球面距离几乎相同，比 arccos 计算快
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    item_weights = np.array([weights['price'], weights['capacity'], weights['rating']], dtype=np.float32)
+    distance_weight = weights['distance'] if dots is not None else 0.0
+    total_weight = float(item_weights.sum()) + distance_weight
+    if total_weight > 0:
+        item_weights /= total_weight
+        distance_weight /= total_weight
+    distance_factor = EARTH_RADIUS_KM / (radius_km or DISTANCE_SCALE_KM)
+
+    def weighted_scores(norms, row_dots):
+        scores = item_weights @ norms
+        if distance_weight:
+            # 弦长 = sqrt(2 - 2 × 点积)；1 - 点积 需在 float64 下计算，之后转为 float32 即可
+            term = (1 - row_dots).astype(np.float32)
+            np.maximum(term, 0, out=term)
+            np.sqrt(term, out=term)
+            term *= np.float32(math.sqrt(2) * distance_factor)
+            term += 1
+            np.divide(np.float32(distance_weight), term, out=term)
+            scores += term
+        return scores
+
+    if sort == 'score':
+        key = weighted_scores(take(index.norms), take(dots) if dots is not None else None)
+        np.negative(key, out=key)
+    elif sort == 'price':
+        key = take(specs[PRICE])
+    elif sort == 'distance':
+        key = -take(dots)
+    else:
+        key = -take(specs[CAPACITY])
+    if rows is None:
+        key = np.where(mask, key, np.inf)
+
+    if candidates > limit:
+        top = np.argpartition(key, limit - 1)[:limit]
+    else:
+        top = np.arange(len(key)) if rows is not None else np.flatnonzero(mask)
+    positions = top if rows is None else rows[top]
+    top_ids = index.ids[positions]
+    order = np.lexsort((top_ids, key[top]))
+    top, top_ids = positions[order], top_ids[order]
+
+    top_specs = specs[:, top].astype(np.float64).round(2)
+    top_scores = weighted_scores(
+        index.norms[:, top], dots[top] if dots is not None else None
+    ).astype(np.float64).round(4)
+    top_distances = None
+    if near is not None:
+        # 只对返回的行计算精确球面距离
+        top_distances = (np.arccos(np.clip(dots[top], -1.0, 1.0)) * EARTH_RADIUS_KM).round(3)
+    results = []
+    for i in range(len(top)):
+        results.append({
+            'id': int(top_ids[i]),
+            'score': float(top_scores[i]),
+            'distance_km': None if top_distances is None else float(top_distances[i]),
+            'capacity': float(top_specs[CAPACITY, i]),
+            'voltage': float(top_specs[VOLTAGE, i]),
+            'power': float(top_specs[POWER, i]),
+            'daily_rental_price': float(top_specs[PRICE, i]),
+            'avg_rating': float(top_specs[RATING, i]),
+        })
+    return results
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from battery.search import CREATE_TABLE_SQL, rebuild_index
+
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE_SQL)
+    rebuild_index(apps.get_model('battery', 'Battery'), using=schema_editor.connection.alias)
+
+
+def drop_search_index(apps, schema_editor):
+    from battery.search import DROP_TABLE_SQL
+
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_TABLE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0004_alter_battery_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:06
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Battery = apps.get_model('battery', 'Battery')
+    BatteryReview = apps.get_model('battery', 'BatteryReview')
+
+    stats = {}
+    rows = BatteryReview.objects.order_by().values('battery_id', 'rating').annotate(count=Count('id'))
+    for row in rows:
+        stats.setdefault(row['battery_id'], {})[row['rating']] = row['count']
+
+    for battery_id, counts in stats.items():
+        total = sum(counts.values())
+        fields = {f'rating_{star}_count': counts.get(star, 0) for star in range(1, 6)}
+        Battery.objects.filter(pk=battery_id).update(
+            review_count=total,
+            avg_rating=round(sum(star * n for star, n in counts.items()) / total, 2),
+            **fields
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0005_battery_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battery',
+            name='avg_rating',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3, verbose_name='平均评分'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='rating_1_count',
+            field=models.IntegerField(default=0, verbose_name='1星数量'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='rating_2_count',
+            field=models.IntegerField(default=0, verbose_name='2星数量'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='rating_3_count',
+            field=models.IntegerField(default=0, verbose_name='3星数量'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='rating_4_count',
+            field=models.IntegerField(default=0, verbose_name='4星数量'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='rating_5_count',
+            field=models.IntegerField(default=0, verbose_name='5星数量'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='review_count',
+            field=models.IntegerField(default=0, verbose_name='评价数量'),
+        ),
+        migrations.AddIndex(
+            model_name='battery',
+            index=models.Index(fields=['status', 'avg_rating', 'review_count'], name='battery_status_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
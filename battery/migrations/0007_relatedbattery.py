@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0006_battery_rating_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBattery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='相似度')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='排名')),
+                ('battery', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='battery.battery', verbose_name='电池')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='battery.battery', verbose_name='推荐电池')),
+            ],
+            options={
+                'verbose_name': '相关电池推荐',
+                'verbose_name_plural': '相关电池推荐',
+                'ordering': ['battery', 'rank'],
+                'indexes': [models.Index(fields=['battery', 'rank'], name='related_battery_rank_idx')],
+                'unique_together': {('battery', 'related')},
+            },
+        ),
+    ]
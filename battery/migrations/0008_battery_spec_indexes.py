@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0007_relatedbattery'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='battery',
+            index=models.Index(fields=['status', 'capacity'], name='battery_status_capacity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='battery',
+            index=models.Index(fields=['status', 'voltage'], name='battery_status_voltage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='battery',
+            index=models.Index(fields=['status', 'daily_rental_price'], name='battery_status_price_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:17
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_status_counters(apps, schema_editor):
+    Battery = apps.get_model('battery', 'Battery')
+    BatteryType = apps.get_model('battery', 'BatteryType')
+    BatteryCategory = apps.get_model('battery', 'BatteryCategory')
+    statuses = ('available', 'rented', 'maintenance', 'retired')
+
+    for model, group_field in ((BatteryType, 'battery_type_id'), (BatteryCategory, 'battery_type__category_id')):
+        stats = {}
+        rows = Battery.objects.order_by().values(group_field, 'status').annotate(count=Count('id'))
+        for row in rows:
+            if row['status'] in statuses:
+                stats.setdefault(row[group_field], {})[f"{row['status']}_count"] = row['count']
+        for pk, counts in stats.items():
+            model.objects.filter(pk=pk).update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0008_battery_spec_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batterycategory',
+            name='available_count',
+            field=models.IntegerField(default=0, verbose_name='可用电池数'),
+        ),
+        migrations.AddField(
+            model_name='batterycategory',
+            name='maintenance_count',
+            field=models.IntegerField(default=0, verbose_name='维护中电池数'),
+        ),
+        migrations.AddField(
+            model_name='batterycategory',
+            name='rented_count',
+            field=models.IntegerField(default=0, verbose_name='已租出电池数'),
+        ),
+        migrations.AddField(
+            model_name='batterycategory',
+            name='retired_count',
+            field=models.IntegerField(default=0, verbose_name='已退役电池数'),
+        ),
+        migrations.AddField(
+            model_name='batterytype',
+            name='available_count',
+            field=models.IntegerField(default=0, verbose_name='可用电池数'),
+        ),
+        migrations.AddField(
+            model_name='batterytype',
+            name='maintenance_count',
+            field=models.IntegerField(default=0, verbose_name='维护中电池数'),
+        ),
+        migrations.AddField(
+            model_name='batterytype',
+            name='rented_count',
+            field=models.IntegerField(default=0, verbose_name='已租出电池数'),
+        ),
+        migrations.AddField(
+            model_name='batterytype',
+            name='retired_count',
+            field=models.IntegerField(default=0, verbose_name='已退役电池数'),
+        ),
+        migrations.RunPython(backfill_status_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0009_battery_status_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='battery',
+            index=models.Index(fields=['updated_at'], name='battery_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0010_battery_updated_at_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batteryusage',
+            index=models.Index(fields=['is_active', 'is_discharging'], name='usage_active_discharging_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0011_batteryusage_discharging_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelemetryCompaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(max_length=2, unique=True, verbose_name='粒度')),
+                ('compacted_until', models.DateTimeField(verbose_name='已压缩至')),
+            ],
+            options={
+                'verbose_name': '遥测压缩进度',
+                'verbose_name_plural': '遥测压缩进度',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChargeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1分钟'), ('1h', '1小时'), ('1d', '1天')], max_length=2, verbose_name='粒度')),
+                ('bucket_start', models.DateTimeField(verbose_name='区间开始')),
+                ('min_charge', models.PositiveSmallIntegerField(verbose_name='最低电量(%)')),
+                ('max_charge', models.PositiveSmallIntegerField(verbose_name='最高电量(%)')),
+                ('avg_charge', models.FloatField(verbose_name='平均电量(%)')),
+                ('sample_count', models.PositiveIntegerField(verbose_name='样本数')),
+                ('discharging_count', models.PositiveIntegerField(verbose_name='放电中样本数')),
+                ('usage', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='battery.batteryusage', verbose_name='使用记录')),
+            ],
+            options={
+                'verbose_name': '电量降采样',
+                'verbose_name_plural': '电量降采样',
+                'indexes': [models.Index(fields=['resolution', 'bucket_start'], name='charge_rollup_time_idx')],
+                'unique_together': {('usage', 'resolution', 'bucket_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ChargeSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField(verbose_name='采样时间')),
+                ('charge', models.PositiveSmallIntegerField(verbose_name='电量(%)')),
+                ('is_discharging', models.BooleanField(default=True, verbose_name='是否放电中')),
+                ('usage', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='battery.batteryusage', verbose_name='使用记录')),
+            ],
+            options={
+                'verbose_name': '电量样本',
+                'verbose_name_plural': '电量样本',
+                'indexes': [models.Index(fields=['usage', 'recorded_at'], name='charge_sample_usage_idx'), models.Index(fields=['recorded_at'], name='charge_sample_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0012_charge_telemetry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rentalorder',
+            index=models.Index(fields=['battery', 'status'], name='rental_battery_status_idx'),
+        ),
+    ]
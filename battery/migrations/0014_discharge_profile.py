@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0013_rentalorder_battery_status_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DischargeProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('linear', '线性'), ('piecewise', '分段线性'), ('peukert', 'Peukert')], default='linear', max_length=20, verbose_name='放电模型')),
+                ('base_rate', models.DecimalField(decimal_places=2, default=10, max_digits=6, verbose_name='基础消耗率(%/小时)')),
+                ('power_factor', models.DecimalField(decimal_places=3, default=0.1, max_digits=6, verbose_name='功率系数')),
+                ('segments', models.JSONField(blank=True, default=list, verbose_name='分段消耗率')),
+                ('rated_hours', models.DecimalField(decimal_places=2, default=10, max_digits=6, verbose_name='额定放电时长(小时)')),
+                ('rated_power', models.DecimalField(decimal_places=2, default=1000, max_digits=8, verbose_name='额定功率(W)')),
+                ('peukert_exponent', models.DecimalField(decimal_places=2, default=1.2, max_digits=4, verbose_name='Peukert 指数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('battery_type', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='discharge_profile', to='battery.batterytype', verbose_name='电池类型')),
+            ],
+            options={
+                'verbose_name': '放电曲线',
+                'verbose_name_plural': '放电曲线',
+            },
+        ),
+    ]
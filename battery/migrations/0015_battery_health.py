@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0014_discharge_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='任务')),
+                ('processed_until', models.DateTimeField(verbose_name='已处理至')),
+            ],
+            options={
+                'verbose_name': '统计任务进度',
+                'verbose_name_plural': '统计任务进度',
+            },
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='avg_end_charge',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='平均结束电量(%)'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='cycle_count',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8, verbose_name='等效循环次数'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='lifetime_usage_hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='累计使用时长(小时)'),
+        ),
+        migrations.AddField(
+            model_name='battery',
+            name='rental_count',
+            field=models.IntegerField(default=0, verbose_name='累计使用次数'),
+        ),
+        migrations.AddField(
+            model_name='batteryusage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新时间'),
+        ),
+        migrations.AddIndex(
+            model_name='batteryusage',
+            index=models.Index(fields=['updated_at'], name='usage_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0015_battery_health'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentalorder',
+            name='is_overdue',
+            field=models.BooleanField(default=False, verbose_name='是否超期'),
+        ),
+        migrations.AddIndex(
+            model_name='rentalorder',
+            index=models.Index(fields=['status', 'end_date'], name='rental_status_end_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0016_order_sweeper'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batterytype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新时间'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:19
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def backfill_last_sample_id(apps, schema_editor):
+    """已有的 1 分钟水位线换算为样本 id：水位线之后采集的第一个样本之前的都已压缩"""
+    ChargeSample = apps.get_model('battery', 'ChargeSample')
+    TelemetryCompaction = apps.get_model('battery', 'TelemetryCompaction')
+    state = TelemetryCompaction.objects.filter(resolution='1m').first()
+    if state is None:
+        return
+    first_pending = ChargeSample.objects.filter(recorded_at__gte=state.compacted_until).aggregate(id=Min('id'))['id']
+    if first_pending is None:
+        last_id = ChargeSample.objects.aggregate(id=Max('id'))['id'] or 0
+    else:
+        last_id = first_pending - 1
+    TelemetryCompaction.objects.filter(pk=state.pk).update(last_sample_id=last_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0017_batterytype_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telemetrycompaction',
+            name='last_sample_id',
+            field=models.BigIntegerField(default=0, verbose_name='已压缩样本 id'),
+        ),
+        migrations.RunPython(backfill_last_sample_id, migrations.RunPython.noop),
+    ]
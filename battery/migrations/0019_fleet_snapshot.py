@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0018_telemetrycompaction_last_sample_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generated_at', models.DateTimeField(verbose_name='生成时间')),
+                ('data', models.JSONField(verbose_name='分布数据')),
+            ],
+            options={
+                'verbose_name': '车队电量快照',
+                'verbose_name_plural': '车队电量快照',
+            },
+        ),
+    ]
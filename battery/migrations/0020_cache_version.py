@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0019_fleet_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='缓存')),
+                ('version', models.BigIntegerField(default=0, verbose_name='版本号')),
+            ],
+            options={
+                'verbose_name': '缓存版本',
+                'verbose_name_plural': '缓存版本',
+            },
+        ),
+    ]
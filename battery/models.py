@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from . import order_numbers
+
 User = get_user_model()
 
 
@@ -10,6 +12,11 @@ class BatteryCategory(models.Model):
     name = models.CharField(max_length=50, verbose_name="分类名称")
     description = models.TextField(max_length=200, blank=True, verbose_name="分类描述")
     icon = models.CharField(max_length=50, default="glyphicon-flash", verbose_name="图标")
+    # 各状态电池数量（冗余字段，由 battery.counters 在电池状态变更时增量维护）
+    available_count = models.IntegerField(default=0, verbose_name="可用电池数")
+    rented_count = models.IntegerField(default=0, verbose_name="已租出电池数")
+    maintenance_count = models.IntegerField(default=0, verbose_name="维护中电池数")
+    retired_count = models.IntegerField(default=0, verbose_name="已退役电池数")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     
@@ -20,6 +27,17 @@ class BatteryCategory(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @property
+    def battery_count(self):
+        """在役电池数量（不含已退役）"""
+        return self.available_count + self.rented_count + self.maintenance_count
+    
+    @property
+    def availability_rate(self):
+        """在役电池中可租的比例(%)"""
+        total = self.battery_count
+        return round(self.available_count * 100 / total) if total else 0
 
 
 class BatteryType(models.Model):
@@ -27,7 +45,13 @@ class BatteryType(models.Model):
     name = models.CharField(max_length=50, verbose_name="类型名称")
     category = models.ForeignKey(BatteryCategory, on_delete=models.CASCADE, verbose_name="所属分类")
     description = models.TextField(max_length=200, blank=True, verbose_name="类型描述")
+    # 各状态电池数量（冗余字段，由 battery.counters 在电池状态变更时增量维护）
+    available_count = models.IntegerField(default=0, verbose_name="可用电池数")
+    rented_count = models.IntegerField(default=0, verbose_name="已租出电池数")
+    maintenance_count = models.IntegerField(default=0, verbose_name="维护中电池数")
+    retired_count = models.IntegerField(default=0, verbose_name="已退役电池数")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     
     class Meta:
         verbose_name = "电池类型"
@@ -38,6 +62,60 @@ class BatteryType(models.Model):
         return f"{self.category.name} - {self.name}"
 
 
+class DischargeProfile(models.Model):
+    """
+    电池类型的放电曲线，由 battery.curves 编译成查表数据
+    没有配置放电曲线的类型按默认线性模型计算
+    """
+    MODEL_CHOICES = [
+        ('linear', '线性'),
+        ('piecewise', '分段线性'),
+        ('peukert', 'Peukert'),
+    ]
+    
+    battery_type = models.OneToOneField(
+        BatteryType, on_delete=models.CASCADE, related_name='discharge_profile', verbose_name="电池类型"
+    )
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES, default='linear', verbose_name="放电模型")
+    # 线性 / 分段线性：消耗率随功率增大，功率每 1000W 额外增加 power_factor 倍
+    base_rate = models.DecimalField(max_digits=6, decimal_places=2, default=10, verbose_name="基础消耗率(%/小时)")
+    power_factor = models.DecimalField(max_digits=6, decimal_places=3, default=0.1, verbose_name="功率系数")
+    # 分段线性：[[电量(%), 消耗率(%/小时)], ...]，点之间线性插值
+    segments = models.JSONField(default=list, blank=True, verbose_name="分段消耗率")
+    # Peukert：额定功率下从满电到耗尽的时长，功率越大放电时间按 (额定功率/功率)^指数 缩短
+    rated_hours = models.DecimalField(max_digits=6, decimal_places=2, default=10, verbose_name="额定放电时长(小时)")
+    rated_power = models.DecimalField(max_digits=8, decimal_places=2, default=1000, verbose_name="额定功率(W)")
+    peukert_exponent = models.DecimalField(max_digits=4, decimal_places=2, default=1.2, verbose_name="Peukert 指数")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    
+    class Meta:
+        verbose_name = "放电曲线"
+        verbose_name_plural = "放电曲线"
+    
+    def __str__(self):
+        return f"{self.battery_type.name} - {self.get_model_display()}"
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        
+        if self.model == 'linear' and self.base_rate <= 0:
+            raise ValidationError({'base_rate': '消耗率必须大于 0'})
+        if self.model == 'piecewise':
+            points = self.segments
+            if not isinstance(points, list) or len(points) < 2:
+                raise ValidationError({'segments': '至少需要两个点，格式为 [[电量, 消耗率], ...]'})
+            try:
+                points = [(float(charge), float(rate)) for charge, rate in points]
+            except (TypeError, ValueError):
+                raise ValidationError({'segments': '格式应为 [[电量, 消耗率], ...]'})
+            if any(not 0 <= charge <= 100 or rate <= 0 for charge, rate in points):
+                raise ValidationError({'segments': '电量必须在 0-100 之间，消耗率必须大于 0'})
+            if [charge for charge, _ in points] != sorted({charge for charge, _ in points}):
+                raise ValidationError({'segments': '电量必须严格递增'})
+        if self.model == 'peukert' and (self.rated_hours <= 0 or self.rated_power <= 0):
+            raise ValidationError('额定放电时长和额定功率必须大于 0')
+
+
 class Battery(models.Model):
     """电池信息模型"""
     STATUS_CHOICES = [
@@ -71,6 +149,21 @@ class Battery(models.Model):
     # 图片
     image = models.ImageField(upload_to='battery_images/', default='', blank=True, verbose_name="电池图片")
     
+    # 评价统计（冗余字段，由 battery.ratings 在评价变更时增量维护）
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0, verbose_name="平均评分")
+    review_count = models.IntegerField(default=0, verbose_name="评价数量")
+    rating_1_count = models.IntegerField(default=0, verbose_name="1星数量")
+    rating_2_count = models.IntegerField(default=0, verbose_name="2星数量")
+    rating_3_count = models.IntegerField(default=0, verbose_name="3星数量")
+    rating_4_count = models.IntegerField(default=0, verbose_name="4星数量")
+    rating_5_count = models.IntegerField(default=0, verbose_name="5星数量")
+    
+    # 使用统计（冗余字段，由 battery.health 按使用记录增量汇总，只统计已结束的使用记录）
+    lifetime_usage_hours = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="累计使用时长(小时)")
+    cycle_count = models.DecimalField(max_digits=8, decimal_places=2, default=0, verbose_name="等效循环次数")
+    avg_end_charge = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name="平均结束电量(%)")
+    rental_count = models.IntegerField(default=0, verbose_name="累计使用次数")
+    
     # 时间信息
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
@@ -79,10 +172,25 @@ class Battery(models.Model):
         verbose_name = "电池信息"
         verbose_name_plural = "电池信息"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'avg_rating', 'review_count'], name='battery_status_rating_idx'),
+            # 规格范围筛选 / 排序
+            models.Index(fields=['status', 'capacity'], name='battery_status_capacity_idx'),
+            models.Index(fields=['status', 'voltage'], name='battery_status_voltage_idx'),
+            models.Index(fields=['status', 'daily_rental_price'], name='battery_status_price_idx'),
+            # 规格匹配快照按 updated_at 增量刷新
+            models.Index(fields=['updated_at'], name='battery_updated_at_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.serial_number})"
     
+    def save(self, *args, **kwargs):
+        # 分类 / 类型计数在 pre_save 中锁定并读取原状态、在 post_save 中增量更新（见 battery.signals），
+        # 与行的写入放在同一事务内，保存失败时计数一并回滚
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     @property
     def is_available(self):
         return self.status == 'available'
@@ -91,6 +199,11 @@ class Battery(models.Model):
     def full_specs(self):
         return f"{self.capacity}Ah {self.voltage}V {self.power}W"
     
+    @property
+    def rating_histogram(self):
+        """1-5 星各自的评价数量，按星级从高到低排列"""
+        return [(star, getattr(self, f'rating_{star}_count')) for star in range(5, 0, -1)]
+    
     @property
     def image_number(self):
         """根据电池ID计算对应的图片编号（1-12循环）"""
@@ -119,19 +232,28 @@ class BatteryUsage(models.Model):
     total_usage_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0, verbose_name="总使用时长(小时)")
     is_active = models.BooleanField(default=True, verbose_name="是否正在使用")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    # 批量写入（battery.bulk / queryset.update）需要显式设置
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     
     class Meta:
         verbose_name = "电池使用记录"
         verbose_name_plural = "电池使用记录"
         ordering = ['-start_time']
+        indexes = [
+            # 放电模拟只扫描放电中的使用记录
+            models.Index(fields=['is_active', 'is_discharging'], name='usage_active_discharging_idx'),
+            # 使用统计按 updated_at 水位线增量汇总
+            models.Index(fields=['updated_at'], name='usage_updated_at_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.battery.name}"
     
-    def calculate_current_charge(self):
+    def calculate_current_charge(self, now=None):
         """
         根据使用时长自动计算当前电量（仅在放电中计算）
-        规则：每小时消耗10%的电量；功率越大，消耗越快
+        规则：按电池类型的放电曲线（默认每小时消耗10%）；功率越大，消耗越快
+        只做推算，不写数据库；数据库中的 current_charge 只在暂停、耗尽、完成等状态变更时写入
         """
         from django.utils import timezone
         
@@ -141,24 +263,37 @@ class BatteryUsage(models.Model):
             return self.current_charge
         
         # 计算已使用的小时数
-        now = timezone.now()
+        now = now or timezone.now()
         time_diff = now - self.start_time
-        hours_used = time_diff.total_seconds() / 3600
-        
-        # 根据电池功率计算消耗率（功率越大，消耗越快）
-        # 基础消耗率：10% / 小时
-        # 根据功率调整：功率每增加1000W，消耗率增加1%
-        base_consumption_rate = 10  # 基础消耗率 10%/小时
-        power_factor = float(self.battery.power) / 1000  # 功率因子
-        consumption_rate = base_consumption_rate * (1 + power_factor * 0.1)
+        hours_used = max(time_diff.total_seconds(), 0) / 3600
         
-        # 计算消耗的电量（基于基线电量）
-        consumed_charge = hours_used * consumption_rate
+        # 按电池类型的放电曲线计算（功率越大，消耗越快），与批量放电模拟使用同一组查表
+        from .curves import project_charges
+        charges = project_charges(
+            [self.battery.battery_type_id], [self.baseline_charge], [hours_used], [float(self.battery.power)]
+        )
+        return int(charges[0])
+    
+    def calculate_usage_hours(self, now=None):
+        """使用时长（小时），已结束的记录返回结算时保存的值"""
+        from django.utils import timezone
         
-        # 计算当前电量（不能低于0）
-        calculated_charge = max(0, float(self.baseline_charge) - consumed_charge)
+        if not self.is_active:
+            return self.total_usage_hours
+        end = now or timezone.now()
+        return round(max((end - self.start_time).total_seconds(), 0) / 3600, 2)
+    
+    def depleted_at(self):
+        """放电中的记录推算电量降到 0% 的时刻，未在放电时返回 None"""
+        from datetime import timedelta
+        from .curves import hours_until_empty
         
-        return int(calculated_charge)
+        if not (self.is_active and self.is_discharging):
+            return None
+        hours = hours_until_empty(
+            [self.battery.battery_type_id], [self.baseline_charge], [float(self.battery.power)]
+        )
+        return self.start_time + timedelta(hours=float(hours[0]))
 
 
 class RentalOrder(models.Model):
@@ -181,6 +316,7 @@ class RentalOrder(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="总金额")
     deposit_amount = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="押金")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="订单状态")
+    is_overdue = models.BooleanField(default=False, verbose_name="是否超期")
     notes = models.TextField(max_length=500, blank=True, verbose_name="备注")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
@@ -189,15 +325,23 @@ class RentalOrder(models.Model):
         verbose_name = "租赁订单"
         verbose_name_plural = "租赁订单"
         ordering = ['-created_at']
+        indexes = [
+            # 电量耗尽时按电池查找使用中的订单
+            models.Index(fields=['battery', 'status'], name='rental_battery_status_idx'),
+            # 订单清理按状态和结束时间做范围扫描
+            models.Index(fields=['status', 'end_date'], name='rental_status_end_idx'),
+        ]
     
     def __str__(self):
         return f"订单 {self.order_number} - {self.user.username}"
     
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            import uuid
-            self.order_number = f"RENT{str(uuid.uuid4())[:8].upper()}"
-        super().save(*args, **kwargs)
+        if self.order_number:
+            super().save(*args, **kwargs)
+        else:
+            # 订单号撞上唯一约束时换节点号重新生成
+            save = super().save
+            order_numbers.save_with_number(self, 'RENT', lambda: save(*args, **kwargs))
 
 
 class BatteryReview(models.Model):
@@ -248,4 +392,128 @@ class ReviewReply(models.Model):
     def __str__(self):
         if self.parent_reply:
             return f"{self.user.username} 回复了 {self.parent_reply.user.username}"
-        return f"{self.user.username} 回复了 {self.review.user.username} 的评价"
\ No newline at end of file
+        return f"{self.user.username} 回复了 {self.review.user.username} 的评价"
+
+
+class RelatedBattery(models.Model):
+    """相关电池推荐（离线计算，由 refresh_related_batteries 命令刷新）"""
+    battery = models.ForeignKey(Battery, on_delete=models.CASCADE, verbose_name="电池", related_name='related_entries')
+    related = models.ForeignKey(Battery, on_delete=models.CASCADE, verbose_name="推荐电池", related_name='+')
+    score = models.FloatField(verbose_name="相似度")
+    rank = models.PositiveSmallIntegerField(verbose_name="排名")
+    
+    class Meta:
+        verbose_name = "相关电池推荐"
+        verbose_name_plural = "相关电池推荐"
+        ordering = ['battery', 'rank']
+        unique_together = ['battery', 'related']
+        indexes = [
+            models.Index(fields=['battery', 'rank'], name='related_battery_rank_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.battery.name} -> {self.related.name} ({self.score:.3f})"
+
+
+class ChargeSample(models.Model):
+    """电量遥测原始样本（只追加，由 battery.telemetry 批量写入，超过保留期后删除）"""
+    usage = models.ForeignKey(BatteryUsage, on_delete=models.CASCADE, verbose_name="使用记录", related_name='+', db_index=False)
+    recorded_at = models.DateTimeField(verbose_name="采样时间")
+    charge = models.PositiveSmallIntegerField(verbose_name="电量(%)")
+    is_discharging = models.BooleanField(default=True, verbose_name="是否放电中")
+    
+    class Meta:
+        verbose_name = "电量样本"
+        verbose_name_plural = "电量样本"
+        indexes = [
+            models.Index(fields=['usage', 'recorded_at'], name='charge_sample_usage_idx'),
+            # 压缩任务按时间窗口扫描
+            models.Index(fields=['recorded_at'], name='charge_sample_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.usage_id} @ {self.recorded_at}: {self.charge}%"
+
+
+class ChargeRollup(models.Model):
+    """电量遥测降采样（1 分钟 / 1 小时 / 1 天），图表查询只读取该表"""
+    RESOLUTION_CHOICES = [
+        ('1m', '1分钟'),
+        ('1h', '1小时'),
+        ('1d', '1天'),
+    ]
+    
+    usage = models.ForeignKey(BatteryUsage, on_delete=models.CASCADE, verbose_name="使用记录", related_name='+', db_index=False)
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES, verbose_name="粒度")
+    bucket_start = models.DateTimeField(verbose_name="区间开始")
+    min_charge = models.PositiveSmallIntegerField(verbose_name="最低电量(%)")
+    max_charge = models.PositiveSmallIntegerField(verbose_name="最高电量(%)")
+    avg_charge = models.FloatField(verbose_name="平均电量(%)")
+    sample_count = models.PositiveIntegerField(verbose_name="样本数")
+    discharging_count = models.PositiveIntegerField(verbose_name="放电中样本数")
+    
+    class Meta:
+        verbose_name = "电量降采样"
+        verbose_name_plural = "电量降采样"
+        unique_together = ['usage', 'resolution', 'bucket_start']
+        indexes = [
+            # 保留期清理按粒度和时间删除
+            models.Index(fields=['resolution', 'bucket_start'], name='charge_rollup_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.usage_id} {self.resolution} {self.bucket_start}"
+
+
+class TelemetryCompaction(models.Model):
+    """各粒度降采样已完成到的时间点（水位线）"""
+    resolution = models.CharField(max_length=2, unique=True, verbose_name="粒度")
+    compacted_until = models.DateTimeField(verbose_name="已压缩至")
+    # 仅 1 分钟粒度使用：已合并的原始样本最大 id，迟到的样本按插入顺序也会被处理
+    last_sample_id = models.BigIntegerField(default=0, verbose_name="已压缩样本 id")
+    
+    class Meta:
+        verbose_name = "遥测压缩进度"
+        verbose_name_plural = "遥测压缩进度"
+    
+    def __str__(self):
+        return f"{self.resolution}: {self.compacted_until}"
+
+
+class FleetSnapshot(models.Model):
+    """车队电量分布快照（由 battery.fleet 生成，只保留一行），各进程共享"""
+    generated_at = models.DateTimeField(verbose_name="生成时间")
+    data = models.JSONField(verbose_name="分布数据")
+    
+    class Meta:
+        verbose_name = "车队电量快照"
+        verbose_name_plural = "车队电量快照"
+    
+    def __str__(self):
+        return f"车队电量快照 @ {self.generated_at}"
+
+
+class AnalyticsWatermark(models.Model):
+    """增量统计任务已处理到的时间点（水位线）"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="任务")
+    processed_until = models.DateTimeField(verbose_name="已处理至")
+    
+    class Meta:
+        verbose_name = "统计任务进度"
+        verbose_name_plural = "统计任务进度"
+    
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
+
+
+class CacheVersion(models.Model):
+    """各进程共享的缓存版本号（由 battery.versions 递增），用于识别按 updated_at 无法察觉的删除等变化"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="缓存")
+    version = models.BigIntegerField(default=0, verbose_name="版本号")
+    
+    class Meta:
+        verbose_name = "缓存版本"
+        verbose_name_plural = "缓存版本"
+    
+    def __str__(self):
+        return f"{self.name}: {self.version}"
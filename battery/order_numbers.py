@@ -0,0 +1,127 @@
+"""
+订单号生成
+
+租赁订单（RENT）和网点租赁记录（STN）共用：前缀 + 16 位 Crockford Base32（不含 I L O U，不区分大小写）。
+16 位共 80 bit，按位依次为：
+  毫秒时间戳（自 2024-01-01 起，42 bit，约 139 年）
+  节点号（24 bit，每个进程一个）
+  序列号（14 bit，同一毫秒内递增，每毫秒最多 16384 个）
+编码定长、字母表按 ASCII 升序，订单号的字符串顺序即生成顺序，新订单总是写在唯一索引的末尾。
+旧格式的租赁订单号（RENT + 8 位十六进制）保持不变，不参与排序；订单列表按 created_at 排序。
+同一进程内由锁保证不重复；不同进程靠节点号区分，默认每个进程（含 fork 出的子进程）随机取一个，
+部署多个进程时可以在 settings.ORDER_NUMBER_NODE 中为每个进程指定不同的节点号。
+随机节点号仍可能相同，因此模型保存时经 save_with_number 写入：订单号撞上唯一约束时
+本进程换一个随机节点号重新生成并重试（最多 MAX_ATTEMPTS 次），不依赖节点号碰巧不同。
+"""
+import os
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+LENGTH = 16
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+NODE_BITS = 24
+SEQUENCE_BITS = 14
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+MAX_ATTEMPTS = 3
+
+
+def encode(value):
+    """非负整数 -> 定长 Base32 字符串"""
+    chars = []
+    for _ in range(LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(text):
+    """Base32 字符串 -> 整数，兼容小写以及 I/L -> 1、O -> 0 的误输入"""
+    value = 0
+    for char in text.upper().translate(str.maketrans('ILO', '110')):
+        value = value * 32 + ALPHABET.index(char)
+    return value
+
+
+class OrderNumberGenerator:
+    """node 为空时在首次生成时取 settings.ORDER_NUMBER_NODE，未配置则随机选取"""
+
+    def __init__(self, node=None):
+        self._configured_node = node
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.node = self._configured_node
+        self._last_ms = 0
+        self._sequence = 0
+
+    def _pick_node(self):
+        node = getattr(settings, 'ORDER_NUMBER_NODE', None)
+        if node is None:
+            node = secrets.randbits(NODE_BITS)
+        return node & ((1 << NODE_BITS) - 1)
+
+    def repick_node(self):
+        """订单号冲突后换一个随机节点号（配置了固定节点号时不变）"""
+        with self._lock:
+            if self._configured_node is None and getattr(settings, 'ORDER_NUMBER_NODE', None) is None:
+                self.node = secrets.randbits(NODE_BITS)
+
+    def next_value(self, at=None):
+        """下一个 80 bit 整数；at（datetime）用于给历史数据补订单号"""
+        ms = int(at.timestamp() * 1000) if at is not None else int(time.time() * 1000)
+        ms = max(ms - EPOCH_MS, 0)
+        with self._lock:
+            if self.node is None:
+                self.node = self._pick_node()
+            if ms > self._last_ms:
+                self._last_ms = ms
+                self._sequence = 0
+            else:
+                # 时钟回拨或同一毫秒：沿用上一个时间戳继续递增，序列号用尽时借用下一毫秒
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            ms, sequence = self._last_ms, self._sequence
+        return (ms << (NODE_BITS + SEQUENCE_BITS)) | (self.node << SEQUENCE_BITS) | sequence
+
+    def generate(self, prefix, at=None):
+        return prefix + encode(self.next_value(at))
+
+
+generator = OrderNumberGenerator()
+
+
+def generate(prefix, at=None):
+    """生成订单号，如 RENT01JAB3XK9Q2M7T5W"""
+    return generator.generate(prefix, at)
+
+
+def save_with_number(instance, prefix, save):
+    """
+    生成订单号并调用 save() 保存；订单号撞上唯一约束时换节点号重新生成，
+    其他原因的 IntegrityError 以及重试用尽时照常抛出
+    """
+    model = type(instance)
+    for attempt in range(MAX_ATTEMPTS):
+        instance.order_number = generate(prefix)
+        try:
+            with transaction.atomic():
+                save()
+            return
+        except IntegrityError:
+            duplicate = model._default_manager.filter(order_number=instance.order_number).exists()
+            if not duplicate or attempt == MAX_ATTEMPTS - 1:
+                raise
+            generator.repick_node()
+
+
+if hasattr(os, 'register_at_fork'):
+    # fork 出的子进程（如 gunicorn worker）重新选取节点号，避免与父进程及兄弟进程重复
+    os.register_at_fork(after_in_child=generator.reset)
@@ -0,0 +1,44 @@
+"""
+用户订单统计
+
+“我的订单”页顶部的各状态订单数用一条条件聚合查询算出（COUNT(*) FILTER (WHERE status=...)），
+按用户缓存；订单新增、状态转换、自动完成或清理后删除对应用户的缓存。
+默认的 LocMemCache 是进程内缓存，删除只对当前进程生效，因此缓存时间很短：
+其他进程（多个 worker、sweep_orders 等命令）修改的订单最迟 CACHE_TIMEOUT 秒后反映到统计中。
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import RentalOrder
+
+CACHE_TIMEOUT = 30
+STATUSES = [status for status, _ in RentalOrder.STATUS_CHOICES]
+
+
+def _cache_key(user_id):
+    return f'battery:order_summary:{user_id}'
+
+
+def _compute(user_id):
+    return RentalOrder.objects.filter(user_id=user_id).order_by().aggregate(
+        total=Count('id'),
+        **{status: Count('id', filter=Q(status=status)) for status in STATUSES},
+    )
+
+
+def get_summary(user_id):
+    """{'total': 总数, '<状态>': 该状态的订单数, ...}"""
+    key = _cache_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = _compute(user_id)
+        cache.set(key, summary, CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate(user_ids):
+    """订单变更后删除这些用户的统计缓存（事务提交后执行）"""
+    keys = [_cache_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
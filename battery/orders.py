@@ -0,0 +1,96 @@
+"""
+租赁订单状态机
+
+订单的每个状态转换都是一条带条件的 UPDATE（WHERE status=<源状态>），
+与电池状态、使用记录的变更放在同一个事务里：
+  cancel    pending   -> cancelled
+  confirm   pending   -> confirmed
+  start     confirmed -> active     电池 available -> rented，创建使用记录
+  complete  active    -> completed  电池 rented -> available，结束使用记录
+并发请求同时转换同一订单时只有一个 UPDATE 命中，其余返回 False，不会重复修改电池和使用记录。
+前置条件不满足时抛出 TransitionError，整个事务回滚。
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from . import availability, order_summary
+from .depletion import usage_changed
+from .inventory import set_battery_status
+from .models import BatteryUsage, RentalOrder
+
+TRANSITIONS = {
+    'cancel': ('pending', 'cancelled'),
+    'confirm': ('pending', 'confirmed'),
+    'start': ('confirmed', 'active'),
+    'complete': ('active', 'completed'),
+}
+
+
+class TransitionError(Exception):
+    """转换的前置条件不满足"""
+
+
+def _start(order, now):
+    # 锁住用户行，同一用户并发开始不同订单时串行检查“是否已有使用中的电池”
+    get_user_model().objects.select_for_update().filter(pk=order.user_id).exists()
+    active = BatteryUsage.objects.filter(user_id=order.user_id, is_active=True).values_list('battery__name', flat=True).first()
+    if active is not None:
+        raise TransitionError(f'您当前正在使用 {active}，请先结束当前电池的使用后再开始新的租赁')
+    if not set_battery_status([order.battery_id], 'rented', expected_status='available'):
+        raise TransitionError('该电池当前不可用，无法开始使用')
+    usage = BatteryUsage.objects.create(
+        battery_id=order.battery_id,
+        user_id=order.user_id,
+        start_time=now,
+        current_charge=100,  # 假设初始电量为100%
+        is_active=True,
+    )
+    usage_changed(usage)
+
+
+def _complete(order, now):
+    set_battery_status([order.battery_id], 'available', expected_status='rented')
+    usage = (
+        BatteryUsage.objects.select_for_update()
+        .select_related('battery')
+        .filter(battery_id=order.battery_id, user_id=order.user_id, is_active=True)
+        .first()
+    )
+    if usage is None:
+        return
+    usage.end_time = now
+    # 写入结算时的电量，之后不再推算
+    usage.current_charge = usage.calculate_current_charge(now)
+    usage.is_active = False
+    usage.total_usage_hours = round((now - usage.start_time).total_seconds() / 3600, 2)
+    usage.save(update_fields=['end_time', 'current_charge', 'is_active', 'total_usage_hours', 'updated_at'])
+    usage_changed(usage)
+
+
+_EFFECTS = {
+    'start': _start,
+    'complete': _complete,
+}
+
+
+def transition(order, action, now=None):
+    """
+    按 action 转换订单状态，返回是否由本次调用完成了转换
+    订单已不在源状态（被其他请求抢先）时返回 False，order.status 刷新为当前状态
+    """
+    source, target = TRANSITIONS[action]
+    now = now or timezone.now()
+    with transaction.atomic():
+        won = RentalOrder.objects.filter(id=order.id, status=source).update(status=target, updated_at=now) == 1
+        if not won:
+            order.status = RentalOrder.objects.filter(id=order.id).values_list('status', flat=True).first()
+            return False
+        effect = _EFFECTS.get(action)
+        if effect is not None:
+            effect(order, now)
+        availability.invalidate([order.battery_id])
+        order_summary.invalidate([order.user_id])
+    order.status = target
+    order.updated_at = now
+    return True
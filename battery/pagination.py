@@ -0,0 +1,180 @@
+"""
+游标（keyset）分页
+
+按 (created_at, id) / (start_time, id) 等唯一排序键翻页，使用
+WHERE (排序键) < (上一页最后一行) 代替 OFFSET，也不需要 COUNT(*)，
+深页和首页的查询代价相同。游标是对排序键取值的 base64 编码，对前端不透明。
+"""
+import base64
+import datetime
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+
+APPROXIMATE_COUNT_TIMEOUT = 60
+
+
+def _json_default(value):
+    # 时间保留完整的微秒精度（DjangoJSONEncoder 会截断到毫秒，导致翻页时漏行）
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'无法编码游标取值: {value!r}')
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """解析游标，无效时返回 None（视为第一页）"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        values, direction = payload['v'], payload['d']
+    except (ValueError, TypeError, KeyError):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(values, list) or len(values) != size:
+        return None
+    return values, direction
+
+
+class CursorPage:
+    """一页数据，接口与 django Page 的迭代部分保持一致，模板可直接 for 循环"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous, total=None, params=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.total = total
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return encode_cursor(self.paginator.key_values(self.object_list[-1]), 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.paginator.key_values(self.object_list[0]), 'prev')
+
+    def _query(self, cursor):
+        """保留其他查询参数，只替换游标，供模板拼接翻页链接"""
+        query = self.params.copy() if self.params is not None else QueryDict(mutable=True)
+        query.pop(self.paginator.cursor_param, None)
+        query.pop('page', None)
+        if cursor:
+            query[self.paginator.cursor_param] = cursor
+        return query.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query(self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query(self.previous_cursor)
+
+    def as_json(self, serialize):
+        """JSON 接口使用：serialize 将单个对象转换为 dict"""
+        data = {
+            'results': [serialize(obj) for obj in self.object_list],
+            'next': self.next_cursor,
+            'previous': self.previous_cursor,
+        }
+        if self.total is not None:
+            data['total'] = self.total
+        return data
+
+
+class CursorPaginator:
+    """
+    ordering 必须能唯一确定一行（最后一项通常是 id），
+    例如 ('-created_at', '-id')；也可以包含 annotate 出来的字段。
+    approximate_total=True 时返回缓存的总数（可能有 1 分钟延迟）。
+    """
+    cursor_param = 'cursor'
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), approximate_total=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.approximate_total = approximate_total
+
+    def key_values(self, obj):
+        return [getattr(obj, field) for field, _desc in self.ordering]
+
+    def _keyset_filter(self, values, reverse):
+        condition = Q()
+        for i, (field, desc) in enumerate(self.ordering):
+            lookup = 'lt' if desc != reverse else 'gt'
+            branch = Q(**{f'{field}__{lookup}': values[i]})
+            for j, (prev_field, _desc) in enumerate(self.ordering[:i]):
+                branch &= Q(**{prev_field: values[j]})
+            condition |= branch
+        return condition
+
+    def _order_by(self, reverse):
+        return [('-' if desc != reverse else '') + field for field, desc in self.ordering]
+
+    def count(self):
+        queryset = self.queryset.order_by()
+        key = 'cursor_count:' + hashlib.md5(str(queryset.query).encode('utf-8')).hexdigest()
+        return cache.get_or_set(key, queryset.count, APPROXIMATE_COUNT_TIMEOUT)
+
+    def page(self, cursor=None, params=None):
+        decoded = decode_cursor(cursor, len(self.ordering))
+        reverse = decoded is not None and decoded[1] == 'prev'
+
+        queryset = self.queryset.order_by(*self._order_by(reverse))
+        if decoded is not None:
+            try:
+                queryset = queryset.filter(self._keyset_filter(decoded[0], reverse))
+            except (ValidationError, ValueError, TypeError):
+                # 游标被篡改，回到第一页
+                decoded, reverse = None, False
+                queryset = self.queryset.order_by(*self._order_by(False))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, decoded is not None
+
+        total = self.count() if self.approximate_total else None
+        return CursorPage(rows, self, has_next, has_previous, total, params)
+
+
+def paginate(request, queryset, per_page, ordering=('-created_at', '-id'), approximate_total=False):
+    """视图中使用：读取 request 中的游标并返回当前页"""
+    paginator = CursorPaginator(queryset, per_page, ordering, approximate_total)
+    return paginator.page(request.GET.get(paginator.cursor_param), request.GET)
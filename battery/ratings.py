@@ -0,0 +1,72 @@
+"""
+电池评分统计
+
+Battery 上的 avg_rating / review_count / rating_N_count 是 BatteryReview 的冗余汇总，
+评价新增、修改、删除时由 signals 中的 post_save / post_delete 用 F() 表达式原子地增量更新，
+bulk_create 等绕过信号的写入或数据不一致时运行 rebuild_rating_stats 命令全量重建。
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Value
+from django.db.models.functions import Cast, Greatest, Round
+from django.utils import timezone
+
+from .models import Battery, BatteryReview
+
+STARS = (1, 2, 3, 4, 5)
+
+
+def _avg_expression():
+    weighted = sum((F(f'rating_{star}_count') * star for star in STARS), Value(0))
+    return Round(Cast(weighted, FloatField()) / Greatest(F('review_count'), Value(1)), 2)
+
+
+def apply_rating_change(battery_id, old_rating=None, new_rating=None):
+    """
+    增量更新评分统计，同时刷新 updated_at，依赖它的卡片缓存和匹配快照随之失效
+    新增评价：old_rating=None；删除评价：new_rating=None；修改评价：两者都传
+    """
+    if old_rating == new_rating:
+        return
+    updates = {}
+    if old_rating is not None:
+        updates[f'rating_{old_rating}_count'] = F(f'rating_{old_rating}_count') - 1
+    if new_rating is not None:
+        updates[f'rating_{new_rating}_count'] = F(f'rating_{new_rating}_count') + 1
+    if old_rating is None:
+        updates['review_count'] = F('review_count') + 1
+    elif new_rating is None:
+        updates['review_count'] = F('review_count') - 1
+
+    with transaction.atomic():
+        batteries = Battery.objects.filter(pk=battery_id)
+        batteries.update(**updates)
+        batteries.update(avg_rating=_avg_expression(), updated_at=timezone.now())
+
+
+def rebuild_rating_stats(chunk_size=1000):
+    """根据 BatteryReview 全量重建评分统计，返回更新的电池数量"""
+    stats = {}
+    rows = BatteryReview.objects.order_by().values('battery_id', 'rating').annotate(count=Count('id'))
+    for row in rows:
+        stats.setdefault(row['battery_id'], {})[row['rating']] = row['count']
+
+    fields = ['avg_rating', 'review_count'] + [f'rating_{star}_count' for star in STARS]
+    batteries = Battery.objects.only('id', *fields).order_by('id')
+    updated = 0
+    batch = []
+    for battery in batteries.iterator(chunk_size=chunk_size):
+        counts = stats.get(battery.id, {})
+        total = sum(counts.values())
+        for star in STARS:
+            setattr(battery, f'rating_{star}_count', counts.get(star, 0))
+        battery.review_count = total
+        battery.avg_rating = round(sum(star * n for star, n in counts.items()) / total, 2) if total else 0
+        batch.append(battery)
+        if len(batch) >= chunk_size:
+            Battery.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            batch = []
+    if batch:
+        Battery.objects.bulk_update(batch, fields)
+        updated += len(batch)
+    return updated
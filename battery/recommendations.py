@@ -0,0 +1,144 @@
+"""
+相关电池推荐（离线计算）
+
+相似度由两部分组成：
+  规格相似度  容量 / 电压 / 功率 / 重量 / 日租金 标准化后的欧氏距离，同类型、同分类额外加分
+  共同租赁    租过 A 的用户也租过 B 的次数（余弦归一化）
+使用 NumPy 分块计算，每块只保留前 K 个，内存占用为 O(块大小 × 电池数)。
+结果写入 RelatedBattery，详情页只需按 rank 读取。
+"""
+import math
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+from django.db import transaction
+
+from .models import Battery, RelatedBattery, RentalOrder
+
+SPEC_FIELDS = ('capacity', 'voltage', 'power', 'weight', 'daily_rental_price')
+
+SPEC_WEIGHT = 0.7
+CO_RENTAL_WEIGHT = 0.3
+SAME_TYPE_BONUS = 0.2
+SAME_CATEGORY_BONUS = 0.1
+
+DEFAULT_TOP_K = 12
+BLOCK_SIZE = 1024
+
+
+def _load_specs():
+    rows = list(
+        Battery.objects.exclude(status='retired')
+        .order_by('id')
+        .values_list('id', 'battery_type_id', 'battery_type__category_id', *SPEC_FIELDS)
+    )
+    if not rows:
+        return None, None, None, None
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    types = np.array([row[1] for row in rows], dtype=np.int64)
+    categories = np.array([row[2] for row in rows], dtype=np.int64)
+    specs = np.array([[float(v) for v in row[3:]] for row in rows], dtype=np.float64)
+
+    # 功率、价格等跨度较大，先取对数再标准化
+    specs = np.log1p(np.maximum(specs, 0))
+    std = specs.std(axis=0)
+    std[std == 0] = 1.0
+    specs = (specs - specs.mean(axis=0)) / std
+    return ids, types, categories, specs.astype(np.float32)
+
+
+def _co_rental_scores(ids):
+    """返回 {(行号, 行号): 共同租赁相似度}"""
+    index = {int(pk): i for i, pk in enumerate(ids)}
+    rented_by_user = defaultdict(set)
+    orders = RentalOrder.objects.exclude(status='cancelled').values_list('user_id', 'battery_id')
+    for user_id, battery_id in orders.iterator(chunk_size=5000):
+        if battery_id in index:
+            rented_by_user[user_id].add(index[battery_id])
+
+    popularity = defaultdict(int)
+    pairs = defaultdict(int)
+    for batteries in rented_by_user.values():
+        for i in batteries:
+            popularity[i] += 1
+        for i, j in combinations(sorted(batteries), 2):
+            pairs[(i, j)] += 1
+
+    scores = {}
+    for (i, j), count in pairs.items():
+        score = count / math.sqrt(popularity[i] * popularity[j])
+        scores[(i, j)] = scores[(j, i)] = score
+    return scores
+
+
+def compute_related(top_k=DEFAULT_TOP_K, block_size=BLOCK_SIZE):
+    """计算每个电池的前 top_k 个相关电池，返回 [(battery_id, related_id, score, rank)]"""
+    ids, types, categories, specs = _load_specs()
+    if ids is None or len(ids) < 2:
+        return []
+    n = len(ids)
+    k = min(top_k, n - 1)
+
+    co_rental = _co_rental_scores(ids)
+    co_by_row = defaultdict(list)
+    for (i, j), score in co_rental.items():
+        co_by_row[i].append((j, score))
+
+    squared_norms = (specs ** 2).sum(axis=1)
+    results = []
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = specs[start:stop]
+
+        # 欧氏距离平方 = |a|^2 + |b|^2 - 2ab
+        dist2 = squared_norms[start:stop, None] + squared_norms[None, :] - 2.0 * block @ specs.T
+        np.maximum(dist2, 0, out=dist2)
+        scores = SPEC_WEIGHT / (1.0 + np.sqrt(dist2))
+        scores += SAME_TYPE_BONUS * (types[start:stop, None] == types[None, :])
+        scores += SAME_CATEGORY_BONUS * (categories[start:stop, None] == categories[None, :])
+        for row in range(start, stop):
+            for col, score in co_by_row.get(row, ()):
+                scores[row - start, col] += CO_RENTAL_WEIGHT * score
+        # 排除自身
+        scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for offset in range(stop - start):
+            battery_id = int(ids[start + offset])
+            for rank, (col, score) in enumerate(zip(top[offset], top_scores[offset]), start=1):
+                results.append((battery_id, int(ids[col]), float(score), rank))
+    return results
+
+
+def refresh_related_batteries(top_k=DEFAULT_TOP_K, batch_size=5000):
+    """重新计算并整体替换 RelatedBattery，返回写入的行数"""
+    rows = compute_related(top_k)
+    with transaction.atomic():
+        RelatedBattery.objects.all().delete()
+        RelatedBattery.objects.bulk_create(
+            (RelatedBattery(battery_id=b, related_id=r, score=s, rank=rank) for b, r, s, rank in rows),
+            batch_size=batch_size,
+        )
+    return len(rows)
+
+
+def get_related_batteries(battery, limit=4):
+    """详情页使用：读取预计算结果中当前可租的电池；尚未计算时退回同类型电池"""
+    entries = (
+        RelatedBattery.objects.filter(battery=battery, related__status='available')
+        .select_related('related')
+        .order_by('rank')[:limit]
+    )
+    related = [entry.related for entry in entries]
+    if related:
+        return related
+    return list(
+        Battery.objects.filter(battery_type_id=battery.battery_type_id, status='available')
+        .exclude(id=battery.id)[:limit]
+    )
@@ -0,0 +1,85 @@
+"""
+评价回复楼层加载
+
+一次查出若干条评价下的全部回复及作者，在内存中按 parent_reply 组装成树，
+模板和接口都不再逐条访问 review.replies / reply.user / reply.parent_reply，
+查询次数与回复数量、楼层深度无关。
+"""
+from .models import ReviewReply
+
+
+def load_review_threads(reviews):
+    """
+    为每条评价挂载：
+      thread_replies  按时间排列的全部回复（reply.parent_reply 已填充，不会再触发查询）
+      reply_tree      顶层回复列表，每条回复的 children 为其直接回复
+      reply_total     回复数量
+    reviews 应已 select_related('user')，返回 list
+    """
+    reviews = list(reviews)
+    by_review = {review.id: review for review in reviews}
+    for review in reviews:
+        review.thread_replies = []
+        review.reply_tree = []
+        review.reply_total = 0
+    if not reviews:
+        return reviews
+
+    replies = list(
+        ReviewReply.objects.filter(review_id__in=by_review)
+        .select_related('user')
+        .order_by('created_at', 'id')
+    )
+    by_id = {reply.id: reply for reply in replies}
+
+    # 父回复可能属于其他评价，缺失的一次补齐
+    missing = {r.parent_reply_id for r in replies if r.parent_reply_id and r.parent_reply_id not in by_id}
+    parents = dict(by_id)
+    if missing:
+        parents.update(
+            (reply.id, reply)
+            for reply in ReviewReply.objects.filter(id__in=missing).select_related('user')
+        )
+
+    for reply in replies:
+        reply.children = []
+    for reply in replies:
+        review = by_review[reply.review_id]
+        review.thread_replies.append(reply)
+        review.reply_total += 1
+        if reply.parent_reply_id:
+            parent = parents.get(reply.parent_reply_id)
+            reply.parent_reply = parent
+            if reply.parent_reply_id in by_id and parent.review_id == reply.review_id:
+                parent.children.append(reply)
+                continue
+        review.reply_tree.append(reply)
+    return reviews
+
+
+def _serialize_reply(reply):
+    return {
+        'id': reply.id,
+        'user': reply.user.username,
+        'reply_to': reply.parent_reply.user.username if reply.parent_reply_id else None,
+        'content': reply.content,
+        'created_at': reply.created_at.strftime('%Y-%m-%d %H:%M'),
+        'children': [],
+    }
+
+
+def serialize_review_thread(review):
+    """将 load_review_threads 处理过的评价转换为嵌套 dict（非递归，楼层再深也不会栈溢出）"""
+    nodes = {reply.id: _serialize_reply(reply) for reply in review.thread_replies}
+    for reply in review.thread_replies:
+        for child in reply.children:
+            nodes[reply.id]['children'].append(nodes[child.id])
+    return {
+        'id': review.id,
+        'user': review.user.username,
+        'rating': review.rating,
+        'comment': review.comment,
+        'created_at': review.created_at.strftime('%Y-%m-%d %H:%M'),
+        'reply_count': review.reply_total,
+        'replies': [nodes[reply.id] for reply in review.reply_tree],
+    }
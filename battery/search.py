@@ -0,0 +1,175 @@
+"""
+电池全文检索（SQLite FTS5）
+
+battery_search_index 以电池 id 作为 rowid，索引 名称 / 序列号 / 类型名称 三列。
+中文按单字切分后写入索引，查询时连续的中文组成短语，英文和数字按前缀匹配，
+因此 "磷酸铁" 和 "BAT00" 都能命中。索引由 signals 中的信号保持同步，
+批量导入等绕过信号的操作之后可运行 rebuild_search_index 命令重建。
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'battery_search_index'
+
+# 名称、序列号、类型名称的 bm25 权重
+RANK_WEIGHTS = (10.0, 5.0, 2.0)
+
+# keyword_filter(ranked=True) 之后的排序（也用作游标分页的排序键）
+RANKED_ORDERING = ('search_rank', '-created_at', '-id')
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "name, serial_number, type_name, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+DROP_TABLE_SQL = f"DROP TABLE IF EXISTS {SEARCH_TABLE}"
+
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_INDEX_TOKEN_RE = re.compile(rf'[{_CJK}]|[^\W{_CJK}]+')
+_QUERY_TOKEN_RE = re.compile(rf'([{_CJK}]+)|([^\W{_CJK}]+)')
+
+_fts_available = False
+
+
+def tokenize(text):
+    """切分索引文本：中文逐字，其余按单词"""
+    return ' '.join(_INDEX_TOKEN_RE.findall((text or '').lower()))
+
+
+def build_match_query(query):
+    """把用户输入转换为 FTS5 MATCH 表达式，无可用词时返回空字符串"""
+    terms = []
+    for cjk, word in _QUERY_TOKEN_RE.findall((query or '').lower()):
+        if cjk:
+            terms.append('"%s"' % ' '.join(cjk))
+        else:
+            terms.append('"%s"*' % word)
+    return ' '.join(terms)
+
+
+def fts_available():
+    """当前数据库是否可以使用全文索引；只缓存可用的结果，迁移完成前的检查不会一直返回 False"""
+    global _fts_available
+    if connection.vendor != 'sqlite':
+        return False
+    if not _fts_available:
+        _fts_available = SEARCH_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def _ranked_match(queryset, match):
+    """
+    把全文索引表直接联入查询（rowid = 电池 id），MATCH 只执行一次，
+    相关度由 bm25() 在同一查询中算出，不再把全部结果的分值表传给每一行
+    """
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    queryset = queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[f"{SEARCH_TABLE}.rowid = {table}.id", f"{SEARCH_TABLE} MATCH %s"],
+        params=[match],
+    )
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    return queryset, RawSQL(f"bm25({SEARCH_TABLE}, {weights})", (), output_field=FloatField())
+
+
+def _icontains_filter(queryset, query):
+    return queryset.filter(
+        Q(name__icontains=query) |
+        Q(serial_number__icontains=query) |
+        Q(battery_type__name__icontains=query)
+    )
+
+
+def keyword_filter(queryset, query, ranked=False):
+    """
+    按关键词过滤电池查询集
+    ranked=True 时附加 search_rank 并按 RANKED_ORDERING 排序（相关度相同时按发布时间）
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    match = build_match_query(query) if fts_available() else None
+    if match is None:
+        queryset = _icontains_filter(queryset, query)
+        rank = Value(0.0, output_field=FloatField())
+    elif not match:
+        queryset = queryset.none()
+        rank = Value(0.0, output_field=FloatField())
+    elif ranked:
+        queryset, rank = _ranked_match(queryset, match)
+    else:
+        # 非关联子查询，MATCH 只执行一次
+        queryset = queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", (match,)
+        ))
+
+    if ranked:
+        queryset = queryset.annotate(search_rank=rank).order_by(*RANKED_ORDERING)
+    return queryset
+
+
+def _index_rows(rows, conn=connection):
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, name, serial_number, type_name) "
+            "VALUES (%s, %s, %s, %s)",
+            [(pk, tokenize(name), tokenize(serial), tokenize(type_name))
+             for pk, name, serial, type_name in rows],
+        )
+
+
+def index_battery(battery):
+    """写入或更新单个电池的索引"""
+    if not fts_available():
+        return
+    _index_rows([(battery.pk, battery.name, battery.serial_number, battery.battery_type.name)])
+
+
+def remove_battery(battery_id):
+    """删除单个电池的索引"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [battery_id])
+
+
+def _battery_rows(battery_model, queryset_filter=None, using='default', chunk_size=2000):
+    queryset = battery_model.objects.using(using)
+    if queryset_filter:
+        queryset = queryset.filter(**queryset_filter)
+    rows = queryset.values_list('id', 'name', 'serial_number', 'battery_type__name').order_by('id')
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reindex_battery_type(battery_type):
+    """类型名称变更后，重建该类型下所有电池的索引"""
+    if not fts_available():
+        return
+    from .models import Battery
+    for batch in _battery_rows(Battery, {'battery_type': battery_type}):
+        _index_rows(batch)
+
+
+def rebuild_index(battery_model=None, using='default'):
+    """清空并重建全部索引，返回索引的电池数量"""
+    if battery_model is None:
+        from .models import Battery as battery_model
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    total = 0
+    for batch in _battery_rows(battery_model, using=using):
+        _index_rows(batch, conn)
+        total += len(batch)
+    return total
@@ -0,0 +1,132 @@
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Battery, BatteryCategory, BatteryType, BatteryReview, DischargeProfile, RentalOrder
+from .ratings import apply_rating_change
+from . import availability, counters, curves, depletion, facets, matching, order_summary, search
+
+
+@receiver(post_save, sender=Battery)
+def index_battery(sender, instance, **kwargs):
+    """同步全文索引"""
+    search.index_battery(instance)
+
+
+@receiver(post_delete, sender=Battery)
+def unindex_battery(sender, instance, **kwargs):
+    search.remove_battery(instance.pk)
+
+
+@receiver(post_save, sender=BatteryType)
+def reindex_battery_type(sender, instance, created, **kwargs):
+    if not created:
+        search.reindex_battery_type(instance)
+
+
+@receiver(post_init, sender=BatteryReview)
+def remember_review_rating(sender, instance, **kwargs):
+    """记录加载时的电池和评分，保存时据此增量更新评分统计"""
+    instance._rating_state = (instance.battery_id, instance.rating) if instance.pk else None
+
+
+@receiver(post_save, sender=BatteryReview)
+def review_saved(sender, instance, created, **kwargs):
+    old_state = None if created else instance._rating_state
+    if old_state is None:
+        apply_rating_change(instance.battery_id, new_rating=instance.rating)
+    elif old_state[0] != instance.battery_id:
+        apply_rating_change(old_state[0], old_rating=old_state[1])
+        apply_rating_change(instance.battery_id, new_rating=instance.rating)
+    else:
+        apply_rating_change(instance.battery_id, old_state[1], instance.rating)
+    instance._rating_state = (instance.battery_id, instance.rating)
+
+
+@receiver(post_delete, sender=BatteryReview)
+def review_deleted(sender, instance, **kwargs):
+    """评价删除时扣减评分统计"""
+    old_state = instance._rating_state or (instance.battery_id, instance.rating)
+    apply_rating_change(old_state[0], old_rating=old_state[1])
+
+
+@receiver(pre_save, sender=Battery)
+def remember_battery_saved_state(sender, instance, **kwargs):
+    """保存已有电池前（Battery.save 的事务内）锁定并读取数据库中的原状态"""
+    if not instance._state.adding:
+        instance._counter_state = counters.locked_battery_state(instance.pk)
+
+
+@receiver(post_save, sender=Battery)
+def battery_counter_saved(sender, instance, created, update_fields=None, **kwargs):
+    """写入成功后按原状态切换计数；未写入或被 defer 的字段沿用原值"""
+    old_state = None if created else getattr(instance, '_counter_state', None)
+    instance._counter_state = None
+    new_state = counters.battery_state(instance)
+    if old_state is not None:
+        written = (
+            update_fields is None or bool(set(update_fields) & {'battery_type', 'battery_type_id'}),
+            update_fields is None or 'status' in update_fields,
+        )
+        new_state = tuple(
+            new if new is not None and is_written else old
+            for old, new, is_written in zip(old_state, new_state, written)
+        )
+    elif not created:
+        return
+    counters.apply_battery_change(old_state, new_state)
+
+
+@receiver(pre_delete, sender=Battery)
+def remember_battery_state(sender, instance, **kwargs):
+    """删除前（删除的事务内）锁定并读取数据库中的类型和状态，删除后据此扣减计数"""
+    instance._counter_state = counters.locked_battery_state(instance.pk)
+
+
+@receiver(post_delete, sender=Battery)
+def battery_counter_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_counter_state', None) is not None:
+        counters.apply_battery_change(old_state=instance._counter_state)
+
+
+@receiver(post_init, sender=BatteryType)
+def remember_battery_type_category(sender, instance, **kwargs):
+    instance._counter_category_id = instance.__dict__.get('category_id')
+
+
+@receiver(post_save, sender=BatteryType)
+def battery_type_moved(sender, instance, created, **kwargs):
+    """类型改挂分类时转移计数"""
+    old_category_id = instance._counter_category_id
+    if not created and old_category_id is not None:
+        counters.move_battery_type(instance.pk, old_category_id, instance.category_id)
+    instance._counter_category_id = instance.category_id
+
+
+@receiver(post_delete, sender=Battery)
+@receiver(post_save, sender=BatteryType)
+@receiver(post_delete, sender=BatteryType)
+def battery_specs_reset(sender, **kwargs):
+    """删除或类型改挂分类无法按 updated_at 增量识别，下次查询全量重载"""
+    matching.mark_reset()
+
+
+@receiver(post_delete, sender=Battery)
+@receiver(post_delete, sender=BatteryType)
+@receiver(post_delete, sender=BatteryCategory)
+def facets_deleted(sender, **kwargs):
+    """删除无法按 updated_at 识别，递增分面计数的删除版本号"""
+    facets.mark_deleted()
+
+
+@receiver([post_save, post_delete], sender=DischargeProfile)
+def discharge_profile_changed(sender, **kwargs):
+    """放电曲线变更：重新编译查表，耗尽调度按新曲线重建"""
+    curves.mark_changed()
+    depletion.mark_changed()
+
+
+@receiver([post_save, post_delete], sender=RentalOrder)
+def rental_order_changed(sender, instance, **kwargs):
+    """订单新增、修改或删除后使该电池的预订索引和该用户的订单统计失效（状态转换在 orders.transition 中处理）"""
+    availability.invalidate([instance.battery_id])
+    order_summary.invalidate([instance.user_id])
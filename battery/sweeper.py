@@ -0,0 +1,171 @@
+"""
+订单生命周期清理
+
+长期停留在待确认 / 已确认 / 使用中的订单按规则批量处理：
+  expire_pending    待确认订单开始时间已过 pending_hours 小时仍未确认 -> 已取消
+  expire_confirmed  已确认订单结束时间已过 confirmed_hours 小时仍未开始使用 -> 已取消
+  overdue_active    使用中订单超过结束时间 overdue_hours 小时：
+                      complete 结算（结束使用记录、电池改回可用），flag 标记为超期
+网点租赁记录的规则见 station/sweeper.py。
+
+每条规则按 (status, 结束时间) 索引做范围扫描，分块处理，每块一个事务：
+重新筛选仍满足规则的行，批量 UPDATE，并在同一事务里修改电池状态和使用记录。
+dry_run 时只统计数量并列出部分记录。
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from . import availability, depletion, order_summary
+from .bulk import lock_rows, update_rows
+from .curves import project_charges
+from .inventory import set_battery_status
+from .models import BatteryUsage, RentalOrder
+
+PENDING_HOURS = 24
+CONFIRMED_HOURS = 24
+OVERDUE_HOURS = 2
+OVERDUE_ACTIONS = ('flag', 'complete')
+# 订单最长租赁天数（RentalOrderForm.rental_days），用于由开始时间推出结束时间的扫描上界
+MAX_RENTAL_DAYS = 30
+SAMPLE_SIZE = 10
+
+
+class Policy:
+    """
+    一条清理规则：model 中状态为 source、date_field 早于 cutoff、且满足 extra 的记录改为 values
+    effect(rows, now) 在同一事务中处理关联数据，rows 为 [(id, battery_id, user_id)]
+    """
+
+    def __init__(self, name, description, model, source, date_field, cutoff, values,
+                 extra=None, effect=None, label_field='id'):
+        self.name = name
+        self.description = description
+        self.model = model
+        self.source = source
+        self.date_field = date_field
+        self.cutoff = cutoff
+        self.values = values
+        self.extra = extra or {}
+        self.effect = effect
+        self.label_field = label_field
+
+    def queryset(self):
+        return self.model.objects.filter(
+            status=self.source, **{f'{self.date_field}__lt': self.cutoff}, **self.extra
+        ).order_by(self.date_field, 'id')
+
+
+def _expire_orders(rows, now):
+    availability.invalidate([battery_id for _, battery_id, _ in rows])
+    order_summary.invalidate([user_id for _, _, user_id in rows])
+
+
+def _complete_orders(rows, now):
+    """超期订单结算：结束对应的使用记录（写入推算电量），电池改回可用"""
+    pairs = {(user_id, battery_id) for _, battery_id, user_id in rows}
+    battery_ids = {battery_id for _, battery_id in pairs}
+    usages = [
+        row for row in
+        BatteryUsage.objects.select_for_update()
+        .filter(battery_id__in=battery_ids, is_active=True)
+        .values_list(
+            'id', 'user_id', 'battery_id', 'start_time', 'baseline_charge', 'current_charge',
+            'is_discharging', 'battery__power', 'battery__battery_type_id',
+        )
+        if (row[1], row[2]) in pairs
+    ]
+    if usages:
+        charges = np.array([row[5] for row in usages], dtype=np.int64)
+        discharging = np.array([row[6] for row in usages], dtype=bool)
+        if discharging.any():
+            picked = [row for row in usages if row[6]]
+            starts = np.array([row[3].timestamp() for row in picked])
+            charges[discharging] = project_charges(
+                [row[8] for row in picked],
+                [row[4] for row in picked],
+                (now.timestamp() - starts) / 3600,
+                [float(row[7]) for row in picked],
+            )
+        update_rows(
+            BatteryUsage,
+            ['end_time', 'total_usage_hours', 'current_charge', 'is_active', 'updated_at'],
+            [
+                (row[0], now, round((now - row[3]).total_seconds() / 3600, 2), charge, False, now)
+                for row, charge in zip(usages, charges.tolist())
+            ],
+        )
+        depletion.mark_changed()
+    set_battery_status(battery_ids, 'available', expected_status='rented')
+    availability.invalidate(battery_ids)
+    order_summary.invalidate([user_id for user_id, _ in pairs])
+
+
+def order_policies(now=None, pending_hours=PENDING_HOURS, confirmed_hours=CONFIRMED_HOURS,
+                   overdue_hours=OVERDUE_HOURS, overdue_action='flag'):
+    now = now or timezone.now()
+    pending_cutoff = now - timedelta(hours=pending_hours)
+    overdue_values = (
+        {'status': 'completed', 'updated_at': now} if overdue_action == 'complete'
+        else {'is_overdue': True, 'updated_at': now}
+    )
+    return [
+        # 结束时间 = 开始时间 + 租赁天数，先按结束时间走索引圈定范围，再按开始时间筛选
+        Policy(
+            'expire_pending', f'待确认超过 {pending_hours} 小时的订单取消',
+            RentalOrder, 'pending', 'end_date', pending_cutoff + timedelta(days=MAX_RENTAL_DAYS),
+            {'status': 'cancelled', 'updated_at': now},
+            extra={'start_date__lt': pending_cutoff}, effect=_expire_orders, label_field='order_number',
+        ),
+        Policy(
+            'expire_confirmed', f'已确认但结束时间已过 {confirmed_hours} 小时仍未开始的订单取消',
+            RentalOrder, 'confirmed', 'end_date', now - timedelta(hours=confirmed_hours),
+            {'status': 'cancelled', 'updated_at': now},
+            effect=_expire_orders, label_field='order_number',
+        ),
+        Policy(
+            'overdue_active',
+            f"超过结束时间 {overdue_hours} 小时的使用中订单{'结算' if overdue_action == 'complete' else '标记为超期'}",
+            RentalOrder, 'active', 'end_date', now - timedelta(hours=overdue_hours), overdue_values,
+            extra={} if overdue_action == 'complete' else {'is_overdue': False},
+            effect=_complete_orders if overdue_action == 'complete' else None, label_field='order_number',
+        ),
+    ]
+
+
+def sweep(policy, now=None, chunk_size=500, dry_run=False):
+    """执行一条规则，返回统计 dict：name、description、count（dry_run 时为匹配数，否则为处理数）、sample"""
+    now = now or timezone.now()
+    queryset = policy.queryset()
+    report = {'name': policy.name, 'description': policy.description, 'count': 0, 'sample': []}
+    if dry_run:
+        report['count'] = queryset.count()
+        report['sample'] = list(queryset.values_list(policy.label_field, flat=True)[:SAMPLE_SIZE])
+        return report
+
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            lock_rows(policy.model.objects.filter(id__in=ids))
+            rows = list(
+                queryset.filter(id__in=ids)
+                .values_list('id', 'battery_id', 'user_id', policy.label_field)
+            )
+            if not rows:
+                continue
+            policy.model.objects.filter(id__in=[row[0] for row in rows]).update(**policy.values)
+            if policy.effect is not None:
+                policy.effect([row[:3] for row in rows], now)
+        report['count'] += len(rows)
+        if len(report['sample']) < SAMPLE_SIZE:
+            report['sample'].extend(row[3] for row in rows[:SAMPLE_SIZE - len(report['sample'])])
+    return report
+
+
+def sweep_all(policies, now=None, chunk_size=500, dry_run=False):
+    now = now or timezone.now()
+    return [sweep(policy, now, chunk_size, dry_run) for policy in policies]
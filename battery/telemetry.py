@@ -0,0 +1,391 @@
+"""
+电量遥测
+
+ChargeSample 为只追加的原始样本，写入统一批量进行：
+  record_samples 直接批量插入一批样本（放电模拟、批量上报使用）；
+  record_sample 先放入进程内缓冲区，达到 BUFFER_SIZE 条时立即写入，否则由定时器在 FLUSH_INTERVAL 秒后写入。
+compact_telemetry 将原始样本逐级降采样为 1 分钟 → 1 小时 → 1 天的 ChargeRollup：
+  原始样本按插入 id 增量合并进 1 分钟数据，采样时间早于水位线的迟到样本同样会被合并，
+  其所在的小时 / 天已经压缩过时，增量也一并合并进 1h / 1d；
+  1h / 1d 按时间水位线（TelemetryCompaction）只处理已经结束的完整区间。
+随后按 RETENTION 删除过期数据，原始样本只删除已合并过的。
+图表查询（charge_series）只读取降采样表，不扫描原始样本。
+"""
+import atexit
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .bulk import insert_rows, update_rows
+from .models import ChargeRollup, ChargeSample, TelemetryCompaction
+
+# 粒度 -> (区间长度, Trunc 类型, 数据来源粒度（None 为原始样本）, 每个事务处理的时间跨度)
+RESOLUTIONS = {
+    '1m': (timedelta(minutes=1), 'minute', None, timedelta(minutes=10)),
+    '1h': (timedelta(hours=1), 'hour', '1m', timedelta(days=1)),
+    '1d': (timedelta(days=1), 'day', '1h', timedelta(days=30)),
+}
+# 保留期，None 为永久保留
+RETENTION = {
+    'raw': timedelta(days=2),
+    '1m': timedelta(days=14),
+    '1h': timedelta(days=400),
+    '1d': None,
+}
+# 区间结束后等待迟到样本的时间
+GRACE = timedelta(minutes=2)
+
+BUFFER_SIZE = 500
+FLUSH_INTERVAL = 5
+DELETE_CHUNK = 5000
+# 每个事务合并的原始样本 id 跨度
+SAMPLE_CHUNK = 20000
+
+ROLLUP_FIELDS = ['min_charge', 'max_charge', 'avg_charge', 'sample_count', 'discharging_count']
+
+_buffer = []
+_flush_timer = None
+_buffer_lock = threading.Lock()
+
+
+def record_samples(samples, batch_size=2000):
+    """批量写入样本，samples 为 [(usage_id, charge, is_discharging, recorded_at)]，返回写入数量"""
+    now = timezone.now()
+    rows = (
+        (usage_id, max(0, min(100, int(charge))), bool(is_discharging), recorded_at or now)
+        for usage_id, charge, is_discharging, recorded_at in samples
+    )
+    return insert_rows(ChargeSample, ['usage', 'charge', 'is_discharging', 'recorded_at'], rows, batch_size=batch_size)
+
+
+def record_sample(usage_id, charge, is_discharging=True, recorded_at=None):
+    """放入缓冲区，攒够一批立即写入，否则由定时器在 FLUSH_INTERVAL 秒内写入"""
+    global _flush_timer
+    with _buffer_lock:
+        _buffer.append((usage_id, charge, is_discharging, recorded_at or timezone.now()))
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(FLUSH_INTERVAL, _flush_in_background)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+        due = len(_buffer) >= BUFFER_SIZE
+    if due:
+        flush()
+
+
+def flush():
+    """立即写入缓冲区中的样本"""
+    global _flush_timer
+    with _buffer_lock:
+        samples = _buffer[:]
+        _buffer.clear()
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+    if samples:
+        record_samples(samples)
+    return len(samples)
+
+
+def _flush_in_background():
+    """定时器线程中写入，该线程的数据库连接用完即关闭"""
+    try:
+        flush()
+    finally:
+        connection.close()
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        # 进程退出时数据库可能已不可用，丢弃缓冲区
+        pass
+
+
+def _reset_buffer():
+    """fork 出的子进程不继承父进程缓冲区中的样本（由父进程写入），定时器线程也不会被复制"""
+    global _buffer_lock, _flush_timer
+    _buffer_lock = threading.Lock()
+    _buffer.clear()
+    _flush_timer = None
+
+
+atexit.register(_flush_at_exit)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_buffer)
+
+
+def floor_time(value, resolution):
+    """按本地时区将时间向下取整到粒度边界"""
+    value = timezone.localtime(value).replace(second=0, microsecond=0)
+    if resolution in ('1h', '1d'):
+        value = value.replace(minute=0)
+    if resolution == '1d':
+        value = value.replace(hour=0)
+    return value
+
+
+def _source_bounds(source):
+    """来源粒度最早的区间，以及可以压缩到的时间上限"""
+    earliest = ChargeRollup.objects.filter(resolution=source).aggregate(t=Min('bucket_start'))['t']
+    watermark = TelemetryCompaction.objects.filter(resolution=source).values_list('compacted_until', flat=True).first()
+    return earliest, watermark
+
+
+def _aggregate(source, kind, start, end):
+    rows = (
+        ChargeRollup.objects.filter(resolution=source, bucket_start__gte=start, bucket_start__lt=end)
+        .annotate(bucket=Trunc('bucket_start', kind))
+        .values('usage_id', 'bucket')
+        .annotate(
+            min_charge=Min('min_charge'),
+            max_charge=Max('max_charge'),
+            weighted=Sum(F('avg_charge') * F('sample_count'), output_field=FloatField()),
+            sample_count=Sum('sample_count'),
+            discharging_count=Sum('discharging_count'),
+        )
+    )
+    for row in rows.order_by():
+        row['avg_charge'] = row.pop('weighted') / row['sample_count'] if row['sample_count'] else 0
+        yield row
+
+
+def _sample_stats(after_id, until_id):
+    """id 在 (after_id, until_id] 内的原始样本按 (使用记录, 分钟) 汇总，返回 {(usage_id, 分钟): 统计}"""
+    rows = (
+        ChargeSample.objects.filter(id__gt=after_id, id__lte=until_id)
+        .annotate(bucket=Trunc('recorded_at', 'minute'))
+        .values('usage_id', 'bucket')
+        .annotate(
+            min_charge=Min('charge'),
+            max_charge=Max('charge'),
+            avg_charge=Avg('charge'),
+            sample_count=Count('id'),
+            discharging_count=Count('id', filter=Q(is_discharging=True)),
+        )
+        .order_by()
+    )
+    return {(row['usage_id'], row['bucket']): tuple(row[field] for field in ROLLUP_FIELDS) for row in rows}
+
+
+def _merge_stats(a, b):
+    """合并两组 (最低, 最高, 平均, 样本数, 放电中样本数)"""
+    count = a[3] + b[3]
+    avg = (a[2] * a[3] + b[2] * b[3]) / count if count else 0
+    return min(a[0], b[0]), max(a[1], b[1]), avg, count, a[4] + b[4]
+
+
+def _merge_rollups(resolution, deltas):
+    """把增量 {(usage_id, 区间开始): 统计} 合并进已有的降采样行，没有则新建，返回写入的行数"""
+    if not deltas:
+        return 0
+    existing = {}
+    buckets = sorted({bucket for _, bucket in deltas})
+    for i in range(0, len(buckets), 500):
+        rows = ChargeRollup.objects.filter(resolution=resolution, bucket_start__in=buckets[i:i + 500]).values_list(
+            'id', 'usage_id', 'bucket_start', *ROLLUP_FIELDS
+        )
+        for pk, usage_id, bucket, *stats in rows:
+            if (usage_id, bucket) in deltas:
+                existing[usage_id, bucket] = (pk, stats)
+
+    updates, inserts = [], []
+    for (usage_id, bucket), stats in deltas.items():
+        if (usage_id, bucket) in existing:
+            pk, current = existing[usage_id, bucket]
+            low, high, avg, count, discharging = _merge_stats(current, stats)
+            updates.append((pk, low, high, round(avg, 2), count, discharging))
+        else:
+            low, high, avg, count, discharging = stats
+            inserts.append((usage_id, resolution, bucket, low, high, round(avg, 2), count, discharging))
+    update_rows(ChargeRollup, ROLLUP_FIELDS, updates)
+    insert_rows(ChargeRollup, ['usage', 'resolution', 'bucket_start', *ROLLUP_FIELDS], inserts)
+    return len(updates) + len(inserts)
+
+
+def _compact_samples(now=None):
+    """
+    将新插入的原始样本合并进 1 分钟数据，返回写入的行数
+    样本按 id 处理（SQLite 单写者，id 顺序即提交顺序），采样时间早于水位线的迟到样本不会被跳过；
+    其所在的小时 / 天已经压缩时，同样把增量合并进 1h / 1d，否则留给之后的时间窗口压缩
+    """
+    watermarks = {
+        resolution: (until, last_id)
+        for resolution, until, last_id in TelemetryCompaction.objects.values_list(
+            'resolution', 'compacted_until', 'last_sample_id'
+        )
+    }
+    if '1m' in watermarks:
+        previous_until, last_id = watermarks['1m']
+    else:
+        previous_until, last_id = None, 0
+    max_id = ChargeSample.objects.aggregate(id=Max('id'))['id'] or 0
+    if previous_until is None and max_id:
+        previous_until = floor_time(ChargeSample.objects.aggregate(t=Min('recorded_at'))['t'], '1m')
+
+    written = 0
+    while last_id < max_id:
+        until_id = min(last_id + SAMPLE_CHUNK, max_id)
+        with transaction.atomic():
+            minutes = _sample_stats(last_id, until_id)
+            written += _merge_rollups('1m', minutes)
+            for resolution in ('1h', '1d'):
+                if resolution not in watermarks:
+                    continue
+                compacted_until = watermarks[resolution][0]
+                late = {}
+                for (usage_id, bucket), stats in minutes.items():
+                    key = (usage_id, floor_time(bucket, resolution))
+                    if key[1] < compacted_until:
+                        late[key] = _merge_stats(late[key], stats) if key in late else stats
+                _merge_rollups(resolution, late)
+            TelemetryCompaction.objects.update_or_create(
+                resolution='1m', defaults={'last_sample_id': until_id, 'compacted_until': previous_until}
+            )
+        last_id = until_id
+
+    # 1 分钟水位线（供 1h 判断哪些小时已经完整）：GRACE 之前采集的样本都已写入并合并
+    cutoff = floor_time(min(timezone.now() - GRACE, now or timezone.now()), '1m')
+    if previous_until is not None and previous_until > cutoff:
+        cutoff = previous_until
+    TelemetryCompaction.objects.update_or_create(
+        resolution='1m', defaults={'last_sample_id': last_id, 'compacted_until': cutoff}
+    )
+    return written
+
+
+def compact_resolution(resolution, now=None):
+    """将来源数据中已结束的完整区间降采样到 resolution，返回写入的行数"""
+    _, kind, source, window = RESOLUTIONS[resolution]
+    if source is None:
+        return _compact_samples(now)
+    earliest, available_until = _source_bounds(source)
+    if available_until is None:
+        return 0
+    cutoff = floor_time(min(available_until, now or timezone.now()), resolution)
+
+    state = TelemetryCompaction.objects.filter(resolution=resolution).first()
+    if state is not None:
+        start = state.compacted_until
+    elif earliest is not None:
+        start = floor_time(earliest, resolution)
+    else:
+        start = cutoff
+
+    written = 0
+    while start < cutoff:
+        end = min(floor_time(start + window, resolution), cutoff)
+        if end <= start:
+            end = cutoff
+        with transaction.atomic():
+            rollups = [
+                ChargeRollup(
+                    usage_id=row['usage_id'],
+                    resolution=resolution,
+                    bucket_start=row['bucket'],
+                    min_charge=row['min_charge'],
+                    max_charge=row['max_charge'],
+                    avg_charge=round(row['avg_charge'], 2),
+                    sample_count=row['sample_count'],
+                    discharging_count=row['discharging_count'],
+                )
+                for row in _aggregate(source, kind, start, end)
+            ]
+            ChargeRollup.objects.bulk_create(rollups, batch_size=2000)
+            TelemetryCompaction.objects.update_or_create(resolution=resolution, defaults={'compacted_until': end})
+        written += len(rollups)
+        start = end
+    return written
+
+
+def _delete_before(queryset, chunk_size=DELETE_CHUNK):
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(id__in=ids).delete()[0]
+
+
+def enforce_retention(now=None):
+    """删除超过保留期且已被上一级降采样的数据，返回 {粒度: 删除行数}"""
+    now = now or timezone.now()
+    watermarks = dict(TelemetryCompaction.objects.values_list('resolution', 'compacted_until'))
+    last_sample_id = TelemetryCompaction.objects.filter(resolution='1m').values_list('last_sample_id', flat=True).first()
+    deleted = {}
+
+    # 原始样本只删除已合并进 1 分钟数据的（按 id），1m 依赖 1h 的水位线，依此类推
+    levels = [('raw', '1m'), ('1m', '1h'), ('1h', '1d'), ('1d', None)]
+    for level, parent in levels:
+        retention = RETENTION[level]
+        if retention is None:
+            continue
+        cutoff = now - retention
+        if parent is not None:
+            if parent not in watermarks:
+                continue
+            if level != 'raw':
+                cutoff = min(cutoff, watermarks[parent])
+        if level == 'raw':
+            queryset = ChargeSample.objects.filter(recorded_at__lt=cutoff, id__lte=last_sample_id)
+        else:
+            queryset = ChargeRollup.objects.filter(resolution=level, bucket_start__lt=cutoff)
+        deleted[level] = _delete_before(queryset)
+    return deleted
+
+
+def compact_telemetry(now=None):
+    """逐级降采样并清理过期数据，返回统计信息 dict"""
+    written = {resolution: compact_resolution(resolution, now) for resolution in RESOLUTIONS}
+    return {'written': written, 'deleted': enforce_retention(now)}
+
+
+def choose_resolution(start, end):
+    """按时间跨度选择粒度，图表点数控制在数百个以内"""
+    span = end - start
+    if span <= timedelta(hours=6):
+        return '1m'
+    if span <= timedelta(days=14):
+        return '1h'
+    return '1d'
+
+
+def charge_series(usage_id, start=None, end=None, resolution=None):
+    """
+    读取一段时间的电量曲线，返回 (粒度, [{'t', 'min', 'max', 'avg', 'count', 'discharging'}])
+    默认最近 24 小时；指定粒度超出保留期时自动改用更粗的粒度
+    """
+    end = end or timezone.now()
+    start = start or end - timedelta(days=1)
+    resolution = resolution or choose_resolution(start, end)
+    order = list(RESOLUTIONS)
+    while RETENTION[resolution] is not None and start < timezone.now() - RETENTION[resolution] \
+            and resolution != order[-1]:
+        resolution = order[order.index(resolution) + 1]
+
+    rows = (
+        ChargeRollup.objects.filter(
+            usage_id=usage_id, resolution=resolution,
+            bucket_start__gte=floor_time(start, resolution), bucket_start__lt=end,
+        )
+        .order_by('bucket_start')
+        .values_list('bucket_start', 'min_charge', 'max_charge', 'avg_charge', 'sample_count', 'discharging_count')
+    )
+    points = [
+        {
+            't': timezone.localtime(bucket).isoformat(),
+            'min': low,
+            'max': high,
+            'avg': avg,
+            'count': count,
+            'discharging': round(discharging / count, 2) if count else 0,
+        }
+        for bucket, low, high, avg, count, discharging in rows
+    ]
+    return resolution, points
@@ -1,3 +1,657 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import availability, curves, depletion, facets, fleet, matching, order_numbers, orders, search, telemetry, views
+from .models import (
+    Battery, BatteryCategory, BatteryReview, BatteryType, BatteryUsage, ChargeRollup, ChargeSample, DischargeProfile,
+    FleetSnapshot, RentalOrder,
+)
+from .pagination import CursorPaginator, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+def create_batteries(count, category=None, battery_type=None, status='available'):
+    """创建 count 个电池，返回列表"""
+    if battery_type is None:
+        category = category or BatteryCategory.objects.create(name='锂电池')
+        battery_type = BatteryType.objects.create(name='磷酸铁锂', category=category)
+    return [
+        Battery.objects.create(
+            name=f'测试电池{i}', battery_type=battery_type, serial_number=f'T{battery_type.id}-{i:05d}',
+            status=status, capacity=Decimal(50 + i), voltage=Decimal('48'), power=Decimal(800),
+            weight=Decimal(20), daily_rental_price=Decimal(40 + i), deposit=Decimal(500), location='北京',
+        )
+        for i in range(count)
+    ]
+
+
+def create_user(username='tester'):
+    return User.objects.create_user(username=username, password='password', phone=f'138{abs(hash(username)) % 10 ** 8:08d}')
+
+
+def create_order(user, battery, status='pending', start=None, days=1):
+    start = start or timezone.now() + timedelta(days=1)
+    return RentalOrder.objects.create(
+        user=user, battery=battery, start_date=start, end_date=start + timedelta(days=days), rental_days=days,
+        daily_price=battery.daily_rental_price, total_amount=battery.daily_rental_price * days,
+        deposit_amount=battery.deposit, status=status,
+    )
+
+
+class CursorPaginationTests(TestCase):
+    """游标分页"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batteries = create_batteries(25)
+        # 部分电池价格相同，检验排序键并列时按 id 区分
+        Battery.objects.filter(id__in=[b.id for b in cls.batteries[:10]]).update(daily_rental_price=Decimal(60))
+
+    def _walk(self, ordering, per_page=7):
+        paginator = CursorPaginator(Battery.objects.all(), per_page, ordering)
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(b.id for b in page)
+            if not page.has_next:
+                return seen, page
+            cursor = page.next_cursor
+
+    def test_cursor_round_trip(self):
+        now = timezone.now()
+        values = [now, Decimal('12.50'), 7]
+        self.assertEqual(decode_cursor(encode_cursor(values, 'next'), 3), ([now.isoformat(), '12.50', 7], 'next'))
+
+    def test_invalid_cursor_is_first_page(self):
+        self.assertIsNone(decode_cursor('not-a-cursor', 2))
+        self.assertIsNone(decode_cursor(encode_cursor([1], 'next'), 2))
+        self.assertIsNone(decode_cursor(encode_cursor([1, 2], 'sideways'), 2))
+
+    def test_walk_matches_offset_order(self):
+        for ordering in (('-created_at', '-id'), ('daily_rental_price', 'id'), ('-daily_rental_price', '-id'), ('name', 'id')):
+            with self.subTest(ordering=ordering):
+                seen, _ = self._walk(ordering)
+                expected = list(Battery.objects.order_by(*ordering).values_list('id', flat=True))
+                self.assertEqual(seen, expected)
+
+    def test_previous_page(self):
+        paginator = CursorPaginator(Battery.objects.all(), 7, ('daily_rental_price', 'id'))
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        back = paginator.page(second.previous_cursor)
+        self.assertEqual([b.id for b in back], [b.id for b in first])
+        self.assertTrue(back.has_next)
+        self.assertFalse(back.has_previous)
+
+
+class ListQueryCountTests(TestCase):
+    """列表页每页的查询数不随行数增长"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.batteries = create_batteries(12)
+        now = timezone.now()
+        for i, battery in enumerate(cls.batteries):
+            BatteryUsage.objects.create(
+                user=cls.user, battery=battery, start_time=now - timedelta(hours=i + 1),
+                end_time=now - timedelta(hours=i), current_charge=50, is_active=False,
+            )
+
+    def test_usage_history_page(self):
+        self.client.force_login(self.user)
+        self.client.get('/battery/usage/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/battery/usage/')
+        usage_queries = [q for q in queries.captured_queries if 'battery_battery' in q['sql']]
+        self.assertLessEqual(len(usage_queries), 2)
+
+    def test_category_page(self):
+        category = self.batteries[0].battery_type.category
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/battery/category/{category.id}/')
+        self.assertEqual(response.status_code, 200)
+        type_queries = [q for q in queries.captured_queries if q['sql'].startswith('SELECT "battery_batterytype"')]
+        self.assertEqual(type_queries, [])
+
+
+class CardCacheTests(TestCase):
+    """卡片缓存按电池和类型的 updated_at 判断过期"""
+
+    def test_type_rename_refreshes_cards(self):
+        battery = create_batteries(1)[0]
+        category = battery.battery_type.category
+        self.assertContains(self.client.get(f'/battery/category/{category.id}/'), '磷酸铁锂')
+        # 绕过 signals 的修改（如另一进程），只要刷新了 updated_at 即可识别
+        BatteryType.objects.filter(pk=battery.battery_type_id).update(name='三元锂', updated_at=timezone.now())
+        response = self.client.get(f'/battery/category/{category.id}/')
+        self.assertContains(response, '三元锂')
+        self.assertNotContains(response, '磷酸铁锂')
+
+
+class RatingStatsTests(TestCase):
+    """评价新增、修改、删除时的评分统计"""
+
+    def setUp(self):
+        self.battery = create_batteries(1)[0]
+        self.user = create_user()
+
+    def _stats(self):
+        battery = Battery.objects.get(pk=self.battery.pk)
+        return battery.review_count, battery.rating_3_count, battery.rating_5_count, float(battery.avg_rating)
+
+    def test_create_edit_delete(self):
+        stamp = Battery.objects.get(pk=self.battery.pk).updated_at
+        review = BatteryReview.objects.create(battery=self.battery, user=self.user, rating=5, comment='好')
+        self.assertEqual(self._stats(), (1, 0, 1, 5.0))
+        self.assertGreater(Battery.objects.get(pk=self.battery.pk).updated_at, stamp)
+
+        # 重新加载后修改，旧评分取自加载时的值
+        review = BatteryReview.objects.get(pk=review.pk)
+        review.rating = 3
+        review.save()
+        self.assertEqual(self._stats(), (1, 1, 0, 3.0))
+
+        review.comment = '一般'
+        review.save()
+        self.assertEqual(self._stats(), (1, 1, 0, 3.0))
+
+        review.delete()
+        self.assertEqual(self._stats(), (0, 0, 0, 0.0))
+
+
+class BatteryCounterTests(TestCase):
+    """分类 / 类型按状态的计数"""
+
+    def setUp(self):
+        self.batteries = create_batteries(3)
+        self.battery_type = self.batteries[0].battery_type
+
+    def _counts(self):
+        battery_type = BatteryType.objects.get(pk=self.battery_type.pk)
+        category = BatteryCategory.objects.get(pk=battery_type.category_id)
+        self.assertEqual(
+            (category.available_count, category.rented_count),
+            (battery_type.available_count, battery_type.rented_count),
+        )
+        return battery_type.available_count, battery_type.rented_count
+
+    def test_create_and_delete(self):
+        self.assertEqual(self._counts(), (3, 0))
+        stale = Battery.objects.get(pk=self.batteries[0].pk)
+        other = Battery.objects.get(pk=self.batteries[0].pk)
+        other.status = 'rented'
+        other.save()
+        # 加载后被其他请求改为已租出，删除时按数据库中的状态扣减
+        stale.delete()
+        self.assertEqual(self._counts(), (2, 0))
+
+    def test_concurrent_saves_count_once(self):
+        first = Battery.objects.get(pk=self.batteries[0].pk)
+        second = Battery.objects.get(pk=self.batteries[0].pk)
+        first.status = second.status = 'rented'
+        first.save()
+        second.save()
+        self.assertEqual(self._counts(), (2, 1))
+
+        # 旧实例把状态写回可用，按数据库中的已租出扣减
+        stale = Battery.objects.get(pk=self.batteries[1].pk)
+        other = Battery.objects.get(pk=self.batteries[1].pk)
+        other.status = 'rented'
+        other.save()
+        self.assertEqual(self._counts(), (1, 2))
+        stale.save()
+        self.assertEqual(self._counts(), (2, 1))
+
+    def test_update_fields(self):
+        battery = Battery.objects.get(pk=self.batteries[0].pk)
+        battery.status = 'rented'
+        battery.save(update_fields=['name'])
+        self.assertEqual(self._counts(), (3, 0))
+        battery.save(update_fields=['status'])
+        self.assertEqual(self._counts(), (2, 1))
+
+    def test_failed_save_keeps_counts(self):
+        battery = Battery.objects.get(pk=self.batteries[0].pk)
+        battery.status = 'rented'
+        battery.serial_number = self.batteries[1].serial_number
+        with self.assertRaises(IntegrityError):
+            battery.save()
+        self.assertEqual(self._counts(), (3, 0))
+        self.assertEqual(Battery.objects.get(pk=battery.pk).status, 'available')
+
+
+class TelemetryCompactionTests(TestCase):
+    """遥测降采样：迟到样本与缓冲区"""
+
+    def setUp(self):
+        battery = create_batteries(1)[0]
+        self.now = timezone.now()
+        self.usage = BatteryUsage.objects.create(
+            user=create_user(), battery=battery, start_time=self.now - timedelta(hours=5), current_charge=100,
+        )
+        # 整点后 10 分钟，前后的样本都落在同一小时 / 同一分钟
+        self.at = telemetry.floor_time(self.now - timedelta(hours=3), '1h') + timedelta(minutes=10)
+
+    def _rollup(self, resolution):
+        return ChargeRollup.objects.get(
+            usage=self.usage, resolution=resolution, bucket_start=telemetry.floor_time(self.at, resolution)
+        )
+
+    def test_late_sample_is_merged(self):
+        telemetry.record_samples([(self.usage.id, 80, True, self.at), (self.usage.id, 60, True, self.at)])
+        telemetry.compact_telemetry(self.now)
+        self.assertEqual((self._rollup('1m').sample_count, self._rollup('1h').sample_count), (2, 2))
+
+        # 采样时间早于两级水位线的迟到样本
+        telemetry.record_samples([(self.usage.id, 40, False, self.at + timedelta(seconds=30))])
+        telemetry.compact_telemetry(self.now)
+        for resolution in ('1m', '1h'):
+            rollup = self._rollup(resolution)
+            self.assertEqual(
+                (rollup.sample_count, rollup.min_charge, rollup.max_charge, rollup.avg_charge, rollup.discharging_count),
+                (3, 40, 80, 60.0, 2),
+            )
+        self.assertEqual(ChargeRollup.objects.filter(resolution='1m').count(), 1)
+
+    def test_retention_keeps_unmerged_samples(self):
+        old = self.now - timedelta(days=3)
+        telemetry.record_samples([(self.usage.id, 50, True, old)])
+        telemetry.compact_telemetry(self.now)
+        telemetry.record_samples([(self.usage.id, 45, True, old)])
+        telemetry.enforce_retention(self.now)
+        self.assertEqual(ChargeSample.objects.count(), 1)
+        telemetry.compact_telemetry(self.now)
+        self.assertEqual(ChargeSample.objects.count(), 0)
+
+    def test_buffer_flush_cancels_timer(self):
+        telemetry.record_sample(self.usage.id, 70)
+        self.assertIsNotNone(telemetry._flush_timer)
+        self.assertEqual(telemetry.flush(), 1)
+        self.assertIsNone(telemetry._flush_timer)
+        self.assertEqual(ChargeSample.objects.filter(usage=self.usage).count(), 1)
+
+
+class BulkChargeIngestTests(TestCase):
+    """批量电量上报"""
+
+    def setUp(self):
+        self.owner = create_user('owner')
+        self.other = create_user('other')
+        batteries = create_batteries(2)
+        self.started = timezone.now() - timedelta(hours=2)
+        self.usage, self.other_usage = [
+            BatteryUsage.objects.create(
+                user=user, battery=battery, start_time=self.started, current_charge=100, baseline_charge=100,
+            )
+            for user, battery in ((self.owner, batteries[0]), (self.other, batteries[1]))
+        ]
+
+    def _post(self, readings, user=None, content_type='application/json'):
+        self.client.force_login(user or self.owner)
+        if content_type == 'application/x-ndjson':
+            body = '\n'.join(json.dumps(reading) for reading in readings)
+        else:
+            body = json.dumps(readings)
+        return self.client.post('/battery/usage/bulk-charge/', body, content_type=content_type)
+
+    def test_per_item_statuses(self):
+        now = timezone.now()
+        response = self._post([
+            {'usage_id': self.usage.id, 'charge': 90, 'ts': (now - timedelta(minutes=30)).isoformat()},
+            {'usage_id': self.usage.id, 'charge': 80, 'ts': (now - timedelta(minutes=10)).isoformat()},
+            {'usage_id': self.usage.id, 'charge': 95, 'ts': (self.started - timedelta(minutes=1)).isoformat()},
+            {'usage_id': self.usage.id, 'charge': 101},
+            {'usage_id': self.usage.id, 'charge': 70, 'ts': (now + timedelta(hours=1)).isoformat()},
+            {'usage_id': 999999, 'charge': 50},
+            'not-an-object',
+        ]).json()
+        self.assertTrue(response['success'])
+        self.assertEqual(response['applied'], 1)
+        self.assertEqual(
+            [result['status'] for result in response['results']],
+            ['superseded', 'applied', 'stale', 'invalid', 'invalid', 'not_found', 'invalid'],
+        )
+        self.assertEqual([result['index'] for result in response['results']], list(range(7)))
+
+        usage = BatteryUsage.objects.get(pk=self.usage.pk)
+        self.assertEqual((usage.current_charge, usage.baseline_charge), (80, 80))
+        self.assertGreater(usage.start_time, self.started)
+        telemetry.flush()
+        self.assertEqual(ChargeSample.objects.filter(usage=self.usage).count(), 2)
+
+    def test_ownership(self):
+        readings = [{'usage_id': self.other_usage.id, 'charge': 40}]
+        response = self._post(readings).json()
+        self.assertEqual(response['results'][0]['status'], 'not_found')
+        self.assertEqual(BatteryUsage.objects.get(pk=self.other_usage.pk).current_charge, 100)
+
+        staff = create_user('staff')
+        staff.is_staff = True
+        staff.save()
+        response = self._post(readings, user=staff, content_type='application/x-ndjson').json()
+        self.assertEqual(response['results'][0]['status'], 'applied')
+        self.assertEqual(BatteryUsage.objects.get(pk=self.other_usage.pk).current_charge, 40)
+
+    def test_malformed_body(self):
+        self.client.force_login(self.owner)
+        response = self.client.post('/battery/usage/bulk-charge/', '[{"usage_id":', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+class DepletionSchedulerTests(TestCase):
+    """耗尽调度从数据库识别其他进程的修改"""
+
+    def setUp(self):
+        self.battery = create_batteries(1)[0]
+        self.usage = BatteryUsage.objects.create(
+            user=create_user(), battery=self.battery, start_time=timezone.now(), current_charge=100, baseline_charge=100,
+        )
+        self.scheduler = depletion.DepletionScheduler()
+        self.assertIsNone(self.scheduler.refresh())
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_bulk_update_is_picked_up(self):
+        first_due = self.scheduler.next_due()
+        self.assertEqual(self.scheduler.refresh(), 0)
+        # 绕过 signals 的批量修改（如另一进程中的批量上报）
+        BatteryUsage.objects.filter(pk=self.usage.pk).update(baseline_charge=20, updated_at=timezone.now())
+        self.assertEqual(self.scheduler.refresh(), 1)
+        self.assertLess(self.scheduler.next_due(), first_due)
+
+        other = BatteryUsage.objects.create(
+            user=create_user('other'), battery=create_batteries(1)[0], start_time=timezone.now(), current_charge=100,
+        )
+        self.assertEqual(self.scheduler.refresh(), 1)
+        self.assertIn(other.id, self.scheduler._due)
+
+    def test_profile_change_rebuilds(self):
+        first_due = self.scheduler.next_due()
+        DischargeProfile.objects.create(battery_type=self.battery.battery_type, base_rate=Decimal(50))
+        self.assertIsNone(self.scheduler.refresh())
+        self.assertLess(self.scheduler.next_due(), first_due)
+
+
+class DischargeToggleTests(TestCase):
+    """开始 / 停止放电"""
+
+    def setUp(self):
+        # 丢弃其他用例（已回滚的放电曲线）编译出的查表，按默认曲线推算
+        curves.reset()
+        self.user = create_user()
+        self.started = timezone.now() - timedelta(hours=2)
+        self.usage = BatteryUsage.objects.create(
+            user=self.user, battery=create_batteries(1)[0], start_time=self.started,
+            current_charge=100, baseline_charge=100,
+        )
+        self.client.force_login(self.user)
+
+    def _toggle(self, action):
+        response = self.client.post(f'/battery/usage/{self.usage.id}/toggle/', {'action': action})
+        self.assertTrue(response.json()['success'])
+        return BatteryUsage.objects.get(pk=self.usage.pk)
+
+    def test_repeated_start_keeps_baseline(self):
+        # 放电中再次开始：不以过期的 current_charge 重置基线
+        usage = self._toggle('start')
+        self.assertEqual((usage.start_time, usage.baseline_charge), (self.started, 100))
+        self.assertLess(usage.calculate_current_charge(), 100)
+
+    def test_resume_uses_paused_charge(self):
+        paused = self._toggle('stop')
+        self.assertLess(paused.current_charge, 100)
+        resumed = self._toggle('start')
+        self.assertTrue(resumed.is_discharging)
+        self.assertEqual(resumed.baseline_charge, paused.current_charge)
+        self.assertGreater(resumed.start_time, self.started)
+
+
+class FleetSnapshotTests(TestCase):
+    """车队电量快照"""
+
+    def test_snapshot_is_shared_and_expires(self):
+        battery = create_batteries(1)[0]
+        BatteryUsage.objects.create(user=create_user(), battery=battery, start_time=timezone.now(), current_charge=100)
+        snapshot = fleet.get_snapshot()
+        self.assertEqual(snapshot['fleet']['total'], 1)
+        # 其他进程读取到同一份快照
+        with self.assertNumQueries(1):
+            self.assertEqual(fleet.get_snapshot(), snapshot)
+
+        FleetSnapshot.objects.update(generated_at=timezone.now() - fleet.SNAPSHOT_TTL - timedelta(seconds=1))
+        BatteryUsage.objects.create(user=create_user('other'), battery=battery, start_time=timezone.now(), current_charge=50)
+        self.assertEqual(fleet.get_snapshot()['fleet']['total'], 2)
+
+
+class OrderTransitionTests(TestCase):
+    """订单状态机"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.battery = create_batteries(1)[0]
+        self.order = create_order(self.user, self.battery, status='confirmed')
+
+    def test_lifecycle(self):
+        self.assertTrue(orders.transition(self.order, 'start'))
+        self.assertEqual(Battery.objects.get(pk=self.battery.pk).status, 'rented')
+        self.assertTrue(BatteryUsage.objects.filter(user=self.user, battery=self.battery, is_active=True).exists())
+
+        self.assertTrue(orders.transition(self.order, 'complete'))
+        self.assertEqual(RentalOrder.objects.get(pk=self.order.pk).status, 'completed')
+        self.assertEqual(Battery.objects.get(pk=self.battery.pk).status, 'available')
+        self.assertFalse(BatteryUsage.objects.filter(user=self.user, is_active=True).exists())
+
+    def test_lost_race_has_no_effects(self):
+        stale = RentalOrder.objects.get(pk=self.order.pk)
+        self.assertTrue(orders.transition(self.order, 'start'))
+        self.assertFalse(orders.transition(stale, 'start'))
+        self.assertEqual(stale.status, 'active')
+        self.assertEqual(BatteryUsage.objects.filter(user=self.user).count(), 1)
+
+    def test_failed_precondition_rolls_back(self):
+        BatteryUsage.objects.create(user=self.user, battery=create_batteries(1)[0], start_time=timezone.now(), current_charge=100)
+        with self.assertRaises(orders.TransitionError):
+            orders.transition(self.order, 'start')
+        self.assertEqual(RentalOrder.objects.get(pk=self.order.pk).status, 'confirmed')
+        self.assertEqual(Battery.objects.get(pk=self.battery.pk).status, 'available')
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        response = self.client.post(f'/battery/order/{self.order.id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['error'], '只能取消待确认的订单')
+
+        response = self.client.post(f'/battery/order/{self.order.id}/start/').json()
+        self.assertEqual((response['success'], response['status']), (True, 'active'))
+
+    def test_conflict_is_409(self):
+        # 视图加载订单之后、转换之前被其他请求抢先
+        stale = RentalOrder.objects.get(pk=self.order.pk)
+        RentalOrder.objects.filter(pk=self.order.pk).update(status='cancelled')
+        won, response = views._transition_order(stale, 'start', '只能开始已确认的订单')
+        self.assertFalse(won)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(response.content)['status'], 'cancelled')
+
+
+class AvailabilityIndexTests(TestCase):
+    """预订时段索引"""
+
+    def setUp(self):
+        self.base = timezone.now().replace(microsecond=0)
+
+    def _at(self, hours):
+        return self.base + timedelta(hours=hours)
+
+    def _index(self, windows):
+        return availability.AvailabilityIndex.from_windows(
+            [(self._at(start).timestamp(), self._at(end).timestamp()) for start, end in windows]
+        )
+
+    def test_windows_are_merged(self):
+        index = self._index([(10, 20), (0, 5), (5, 8), (15, 30), (40, 40)])
+        self.assertEqual(
+            [(start, end) for start, end in index.booked(self._at(-1), self._at(100))],
+            [(self._at(0), self._at(8)), (self._at(10), self._at(30))],
+        )
+
+    def test_is_free(self):
+        index = self._index([(0, 8), (10, 30)])
+        self.assertTrue(index.is_free(self._at(-5), self._at(0)))
+        self.assertTrue(index.is_free(self._at(8), self._at(10)))
+        self.assertTrue(index.is_free(self._at(30), self._at(50)))
+        self.assertFalse(index.is_free(self._at(7), self._at(9)))
+        self.assertFalse(index.is_free(self._at(9), self._at(11)))
+        self.assertFalse(index.is_free(self._at(-1), self._at(40)))
+
+    def test_next_free(self):
+        index = self._index([(0, 8), (10, 30)])
+        self.assertEqual(index.next_free(self._at(-5), timedelta(hours=5)), self._at(-5))
+        self.assertEqual(index.next_free(self._at(-5), timedelta(hours=6)), self._at(30))
+        self.assertEqual(index.next_free(self._at(1), timedelta(hours=2)), self._at(8))
+        self.assertEqual(index.next_free(self._at(1), timedelta(hours=3)), self._at(30))
+
+    def test_rent_rejects_overlap(self):
+        battery = create_batteries(1)[0]
+        start = timezone.localtime() + timedelta(days=2)
+        create_order(create_user('first'), battery, start=start, days=3)
+        self.client.force_login(create_user())
+
+        response = self.client.post(f'/battery/rent/{battery.id}/', {
+            'rental_days': 1, 'start_date': (start + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('该时段已被预订', str(response.context['form'].errors['start_date']))
+
+        response = self.client.post(f'/battery/rent/{battery.id}/', {
+            'rental_days': 1, 'start_date': (start + timedelta(days=3, minutes=1)).strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(RentalOrder.objects.filter(battery=battery).count(), 2)
+
+
+class FacetCountTests(TestCase):
+    """分面计数缓存按数据库版本换键"""
+
+    def _available(self):
+        filters, _ = facets.parse_filters({})
+        statuses = facets.get_facet_counts(filters)['statuses']
+        return next(item['count'] for item in statuses if item['value'] == 'available')
+
+    def test_delete_changes_cache_key(self):
+        batteries = create_batteries(3)
+        self.assertEqual(self._available(), 3)
+        # 删除的不是最新修改的电池，最大 updated_at 不变，靠删除版本号换键
+        batteries[0].delete()
+        self.assertEqual(self._available(), 2)
+        Battery.objects.filter(pk=batteries[1].pk).delete()
+        self.assertEqual(self._available(), 1)
+
+
+class SearchRankingTests(TestCase):
+    """相关度排序直接联入全文索引表"""
+
+    def test_name_match_ranks_first(self):
+        category = BatteryCategory.objects.create(name='锂电池')
+        by_type = create_batteries(2, battery_type=BatteryType.objects.create(name='钠电', category=category))
+        by_name = Battery.objects.get(pk=create_batteries(1, category=category)[0].pk)
+        by_name.name = '钠电池'
+        by_name.save()
+        results = list(search.keyword_filter(Battery.objects.all(), '钠电', ranked=True))
+        self.assertEqual({b.id for b in results}, {by_name.id, *(b.id for b in by_type)})
+        self.assertEqual(results[0].id, by_name.id)
+        self.assertLess(results[0].search_rank, results[1].search_rank)
+
+    def test_cursor_pages_cover_all_matches(self):
+        batteries = create_batteries(15)
+        seen, cursor = [], None
+        while True:
+            params = {'search': '测试', 'status': ''}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.client.get('/battery/', params).context['page_obj']
+            seen += [b.id for b in page]
+            cursor = page.next_cursor if page.has_next else None
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), sorted(b.id for b in batteries))
+
+
+class MatchingIndexTests(TestCase):
+    """规格匹配快照按数据库状态刷新，不依赖进程内缓存"""
+
+    def _ids(self):
+        return {row['id'] for row in matching.match_batteries(limit=100)}
+
+    def test_changes_and_deletes_are_picked_up(self):
+        batteries = create_batteries(3)
+        self.assertEqual(self._ids(), {b.id for b in batteries})
+
+        batteries[0].status = 'maintenance'
+        batteries[0].save()
+        self.assertEqual(self._ids(), {batteries[1].id, batteries[2].id})
+
+        batteries[1].delete()
+        self.assertEqual(self._ids(), {batteries[2].id})
+
+    def test_bulk_update_with_updated_at_is_picked_up(self):
+        batteries = create_batteries(2)
+        self.assertEqual(self._ids(), {b.id for b in batteries})
+        Battery.objects.filter(id=batteries[0].id).update(status='rented', updated_at=timezone.now())
+        self.assertEqual(self._ids(), {batteries[1].id})
+
+
+class OrderNumberTests(TestCase):
+    """订单号生成"""
+
+    def test_same_millisecond_is_monotonic(self):
+        generator = order_numbers.OrderNumberGenerator(node=5)
+        at = timezone.now()
+        numbers = [generator.generate('RENT', at) for _ in range(1000)]
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertTrue(all(len(number) == 4 + order_numbers.LENGTH for number in numbers))
+
+    def test_sequence_overflow_and_clock_rollback(self):
+        generator = order_numbers.OrderNumberGenerator(node=1)
+        at = timezone.now()
+        first = generator.next_value(at)
+        generator._sequence = order_numbers.MAX_SEQUENCE
+        # 序列号用尽时借用下一毫秒
+        borrowed = generator.next_value(at)
+        self.assertEqual(borrowed >> (order_numbers.NODE_BITS + order_numbers.SEQUENCE_BITS),
+                         (first >> (order_numbers.NODE_BITS + order_numbers.SEQUENCE_BITS)) + 1)
+        # 时钟回拨时仍然递增
+        self.assertGreater(generator.next_value(at - timedelta(seconds=5)), borrowed)
+
+    def test_nodes_do_not_collide(self):
+        at = timezone.now()
+        values = {order_numbers.OrderNumberGenerator(node=node).next_value(at) for node in range(50)}
+        self.assertEqual(len(values), 50)
+
+    def test_encode_decode(self):
+        value = order_numbers.OrderNumberGenerator(node=7).next_value()
+        text = order_numbers.encode(value)
+        self.assertEqual(order_numbers.decode(text), value)
+        self.assertEqual(order_numbers.decode(text.lower()), value)
+        self.assertEqual(order_numbers.decode('0I1LO'), order_numbers.decode('01110'))
+
+    def test_collision_is_retried(self):
+        user, battery = create_user(), create_batteries(1)[0]
+        existing = create_order(user, battery)
+        generated = iter([existing.order_number])
+        original = order_numbers.generate
+        with mock.patch.object(order_numbers, 'generate', lambda prefix, at=None: next(generated, None) or original(prefix, at)):
+            order = create_order(user, battery, start=timezone.now() + timedelta(days=5))
+        self.assertNotEqual(order.order_number, existing.order_number)
+        self.assertEqual(RentalOrder.objects.count(), 2)
@@ -7,15 +7,20 @@ urlpatterns = [
     # 电池列表和搜索
     path('', views.battery_list, name='list'),
     path('search/', views.battery_search, name='search'),
+    path('api/list/', views.battery_list_api, name='list_api'),
+    path('api/match/', views.battery_match_api, name='match_api'),
     path('categories/', views.battery_categories, name='categories'),
     path('category/<int:category_id>/', views.category_batteries, name='category_batteries'),
     
     # 电池详情
     path('detail/<int:battery_id>/', views.battery_detail, name='detail'),
+    path('detail/<int:battery_id>/reviews/', views.battery_reviews_api, name='reviews_api'),
     
     # 租赁相关
     path('rent/<int:battery_id>/', views.rent_battery, name='rent'),
+    path('rent/<int:battery_id>/availability/', views.battery_availability_api, name='availability_api'),
     path('orders/', views.my_orders, name='orders'),
+    path('orders/export/', views.export_orders, name='export_orders'),
     path('order/<int:order_id>/', views.order_detail, name='order_detail'),
     
     # 订单操作
@@ -26,8 +31,13 @@ urlpatterns = [
     
     # 使用情况
     path('usage/', views.my_battery_usage, name='usage'),
+    path('usage/export/', views.export_usage, name='export_usage'),
+    path('usage/stream/', views.usage_stream, name='usage_stream'),
+    path('usage/poll/', views.usage_poll, name='usage_poll'),
     path('usage/<int:usage_id>/update-charge/', views.update_battery_charge, name='update_charge'),
+    path('usage/bulk-charge/', views.bulk_update_charge, name='bulk_update_charge'),
     path('usage/<int:usage_id>/toggle/', views.toggle_discharge, name='toggle_discharge'),
+    path('usage/<int:usage_id>/charge-history/', views.charge_history_api, name='charge_history_api'),
     
     # 评价
     path('review/<int:battery_id>/', views.add_review, name='add_review'),
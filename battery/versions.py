@@ -0,0 +1,23 @@
+"""
+数据库中的缓存版本号
+
+进程内缓存（LocMemCache）里的计数器只对本进程可见，需要跨进程识别的变化（删除、类型改挂分类等）
+在 CacheVersion 表中递增版本号。bump() 在调用方的事务内执行，版本号与变更一同提交或回滚。
+"""
+from django.db.models import F
+
+from .models import CacheVersion
+
+
+def bump(name):
+    """递增版本号；先直接 UPDATE，不存在时再建行，避免先读后写"""
+    if CacheVersion.objects.filter(name=name).update(version=F('version') + 1):
+        return
+    _, created = CacheVersion.objects.get_or_create(name=name, defaults={'version': 1})
+    if not created:
+        CacheVersion.objects.filter(name=name).update(version=F('version') + 1)
+
+
+def current(name):
+    """当前版本号，从未递增过时为 0"""
+    return CacheVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
@@ -1,91 +1,136 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q, Avg, Count
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
 from datetime import datetime, timedelta
+from asgiref.sync import sync_to_async
+import asyncio
+import json
 from django.utils import timezone
 import uuid
 
 from .models import Battery, BatteryCategory, BatteryType, BatteryUsage, RentalOrder, BatteryReview, ReviewReply
-from .forms import BatterySearchForm, RentalOrderForm, BatteryReviewForm
+from .forms import BatterySearchForm, RentalOrderForm, BatteryReviewForm, BatteryMatchForm
+from .facets import (
+    parse_filters, filter_batteries, search_batteries, get_ordering, apply_spec_filters, SORT_ORDERINGS
+)
+from .search import keyword_filter, RANKED_ORDERING
+from .pagination import paginate
+from .reviews import load_review_threads, serialize_review_thread
+from .recommendations import get_related_batteries
+from .fragments import attach_card_html, LIST_CARD, GRID_CARD
+from .matching import match_batteries
+from .discharge import close_depleted_usage
+from .depletion import usage_changed
+from .live import (
+    broadcaster, load_states as load_live_states, payload as live_payload,
+    TICK as LIVE_TICK, KEEPALIVE as LIVE_KEEPALIVE, POLL_TIMEOUT as LIVE_POLL_TIMEOUT,
+)
+from .telemetry import record_sample, charge_series, RESOLUTIONS
+from .ingest import parse_readings, ingest_readings, IngestError
+from .availability import load_index as load_availability, get_index as get_availability
+from .bulk import lock_rows
+from .order_summary import get_summary as get_order_summary
+from .orders import transition as transition_order, TransitionError, TRANSITIONS as ORDER_TRANSITIONS
+from .exports import (
+    stream_export, FORMATS as EXPORT_FORMATS,
+    USAGE_COLUMNS, USAGE_RELATED, ORDER_COLUMNS, ORDER_RELATED,
+)
 from user.models import UserPoints
 
 
 def battery_list(request):
     """电池列表页面"""
-    # 获取筛选参数
-    category_id = request.GET.get('category')
-    battery_type_id = request.GET.get('type')
-    search_query = request.GET.get('search')
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    status = request.GET.get('status', 'available')
+    # 获取筛选参数（含规格筛选表单）
+    filters, spec_form = parse_filters(request.GET)
     
-    # 构建查询
-    batteries = Battery.objects.filter(status=status)
+    # 构建查询，同时获取筛选项计数（计数已缓存）
+    batteries, facets = search_batteries(filters)
     
-    if category_id:
-        batteries = batteries.filter(battery_type__category_id=category_id)
-    
-    if battery_type_id:
-        batteries = batteries.filter(battery_type_id=battery_type_id)
-    
-    if search_query:
-        batteries = batteries.filter(
-            Q(name__icontains=search_query) |
-            Q(serial_number__icontains=search_query) |
-            Q(battery_type__name__icontains=search_query)
-        )
-    
-    if min_price:
-        batteries = batteries.filter(daily_rental_price__gte=min_price)
-    
-    if max_price:
-        batteries = batteries.filter(daily_rental_price__lte=max_price)
-    
-    # 分页
-    paginator = Paginator(batteries, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # 获取筛选选项
-    categories = BatteryCategory.objects.all()
-    battery_types = BatteryType.objects.all()
+    # 游标分页
+    page_obj = paginate(request, batteries, 12, get_ordering(filters))
+    attach_card_html(page_obj, LIST_CARD, request)
     
     context = {
         'page_obj': page_obj,
-        'categories': categories,
-        'battery_types': battery_types,
-        'current_category': category_id,
-        'current_type': battery_type_id,
-        'search_query': search_query,
-        'min_price': min_price,
-        'max_price': max_price,
-        'status': status,
+        'categories': facets['categories'],
+        'battery_types': facets['types'],
+        'status_facets': facets['statuses'],
+        'price_facets': facets['price_buckets'],
+        'current_category': request.GET.get('category'),
+        'current_type': request.GET.get('type'),
+        'search_query': request.GET.get('search'),
+        'min_price': request.GET.get('min_price'),
+        'max_price': request.GET.get('max_price'),
+        'status': filters['status'],
+        'spec_form': spec_form,
     }
     
     return render(request, 'battery/battery_list.html', context)
 
 
+@require_http_methods(["GET"])
+def battery_list_api(request):
+    """电池列表 API（游标分页，参数与电池列表页面相同）"""
+    filters, _spec_form = parse_filters(request.GET)
+    batteries = filter_batteries(filters)
+    page = paginate(request, batteries, 12, get_ordering(filters), approximate_total=True)
+    
+    data = page.as_json(lambda battery: {
+        'id': battery.id,
+        'name': battery.name,
+        'serial_number': battery.serial_number,
+        'battery_type': battery.battery_type.name,
+        'status': battery.status,
+        'capacity': float(battery.capacity),
+        'voltage': float(battery.voltage),
+        'power': float(battery.power),
+        'daily_rental_price': float(battery.daily_rental_price),
+        'avg_rating': float(battery.avg_rating),
+        'review_count': battery.review_count,
+        'location': battery.location,
+        'image_url': battery.image_url,
+    })
+    data['success'] = True
+    return JsonResponse(data)
+
+
+@login_required
+@require_http_methods(["GET"])
+def battery_match_api(request):
+    """批量规格匹配 API：在内存规格快照上筛选、打分，返回前 limit 个可租电池"""
+    form = BatteryMatchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors.get_json_data()}, status=400)
+    
+    results = match_batteries(**form.match_kwargs())
+    # 名称等展示字段按主键一次取回
+    names = Battery.objects.only('name', 'serial_number', 'location').in_bulk([r['id'] for r in results])
+    for result in results:
+        battery = names.get(result['id'])
+        if battery is not None:
+            result.update(name=battery.name, serial_number=battery.serial_number, location=battery.location)
+    
+    return JsonResponse({'success': True, 'count': len(results), 'results': results})
+
+
 def battery_detail(request, battery_id):
     """电池详情页面"""
     battery = get_object_or_404(Battery, id=battery_id)
     
-    # 获取相关电池（同类型）
-    related_batteries = Battery.objects.filter(
-        battery_type=battery.battery_type,
-        status='available'
-    ).exclude(id=battery_id)[:4]
+    # 获取相关电池（离线预计算）
+    related_batteries = get_related_batteries(battery)
     
-    # 获取评价
-    reviews = BatteryReview.objects.filter(battery=battery).order_by('-created_at')[:10]
-    avg_rating = BatteryReview.objects.filter(battery=battery).aggregate(
-        avg_rating=Avg('rating')
-    )['avg_rating'] or 0
+    # 获取评价及全部回复（固定查询次数），平均分直接读取电池上的评分统计
+    reviews = load_review_threads(
+        BatteryReview.objects.filter(battery=battery).select_related('user').order_by('-created_at')[:10]
+    )
     
     # 获取使用统计
     usage_stats = BatteryUsage.objects.filter(battery=battery).aggregate(
@@ -97,13 +142,28 @@ def battery_detail(request, battery_id):
         'battery': battery,
         'related_batteries': related_batteries,
         'reviews': reviews,
-        'avg_rating': round(avg_rating, 1),
+        'avg_rating': round(battery.avg_rating, 1),
         'usage_stats': usage_stats,
     }
     
     return render(request, 'battery/battery_detail.html', context)
 
 
+@require_http_methods(["GET"])
+def battery_reviews_api(request, battery_id):
+    """电池评价及回复楼层 API（游标分页）"""
+    battery = get_object_or_404(Battery, id=battery_id)
+    reviews = BatteryReview.objects.filter(battery=battery).select_related('user')
+    page = paginate(request, reviews, 10, ('-created_at', '-id'))
+    load_review_threads(page.object_list)
+    
+    data = page.as_json(serialize_review_thread)
+    data['success'] = True
+    data['avg_rating'] = float(battery.avg_rating)
+    data['review_count'] = battery.review_count
+    return JsonResponse(data)
+
+
 @login_required
 def rent_battery(request, battery_id):
     """租赁电池"""
@@ -121,24 +181,34 @@ def rent_battery(request, battery_id):
             start_date = form.cleaned_data['start_date']
             end_date = start_date + timedelta(days=rental_days)
             
-            order = RentalOrder.objects.create(
-                user=request.user,
-                battery=battery,
-                start_date=start_date,
-                end_date=end_date,
-                rental_days=rental_days,
-                daily_price=battery.daily_rental_price,
-                total_amount=battery.daily_rental_price * rental_days,
-                deposit_amount=battery.deposit,
-                status='pending'
-            )
-            
-            # 租赁订单奖励积分
-            from user.views import add_points
-            add_points(request.user, 10, 'earn', '创建租赁订单', f'创建租赁订单 {order.order_number} 获得积分奖励')
+            # 锁住电池后从数据库重新加载预订索引，并发下单同一时段时只有一个成功
+            with transaction.atomic():
+                lock_rows(Battery.objects.filter(id=battery.id))
+                index = load_availability(battery.id)
+                if index.is_free(start_date, end_date):
+                    order = RentalOrder.objects.create(
+                        user=request.user,
+                        battery=battery,
+                        start_date=start_date,
+                        end_date=end_date,
+                        rental_days=rental_days,
+                        daily_price=battery.daily_rental_price,
+                        total_amount=battery.daily_rental_price * rental_days,
+                        deposit_amount=battery.deposit,
+                        status='pending'
+                    )
+                    # 租赁订单奖励积分（先读余额再写入，放在已持有锁的事务中）
+                    from user.views import add_points
+                    add_points(request.user, 10, 'earn', '创建租赁订单', f'创建租赁订单 {order.order_number} 获得积分奖励')
+                else:
+                    order = None
             
-            messages.success(request, f'租赁申请已提交，订单号：{order.order_number}')
-            return redirect('battery:order_detail', order_id=order.id)
+            if order is None:
+                next_start = timezone.localtime(index.next_free(start_date, end_date - start_date))
+                form.add_error('start_date', f'该时段已被预订，最早可租时间：{next_start:%Y-%m-%d %H:%M}')
+            else:
+                messages.success(request, f'租赁申请已提交，订单号：{order.order_number}')
+                return redirect('battery:order_detail', order_id=order.id)
     else:
         form = RentalOrderForm()
     
@@ -150,26 +220,99 @@ def rent_battery(request, battery_id):
     return render(request, 'battery/rent_battery.html', context)
 
 
+@require_http_methods(["GET"])
+def battery_availability_api(request, battery_id):
+    """
+    电池可租日历 API
+    参数 start / end（ISO 时间，默认今天起 30 天）返回其间的已预订时段；
+    传 days 时同时返回不早于 start、租赁 days 天的最早可租时间
+    """
+    battery = get_object_or_404(Battery, id=battery_id)
+    start = parse_datetime(request.GET.get('start', '')) or timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    end = parse_datetime(request.GET.get('end', '')) or start + timedelta(days=30)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if end <= start or end - start > timedelta(days=366):
+        return JsonResponse({'success': False, 'error': '时间范围无效'}, status=400)
+    
+    index = get_availability(battery.id)
+    data = {
+        'success': True,
+        'battery_id': battery.id,
+        'is_available': battery.is_available,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'booked': [
+            {'start': booked_start.isoformat(), 'end': booked_end.isoformat()}
+            for booked_start, booked_end in index.booked(start, end)
+        ],
+    }
+    days = request.GET.get('days')
+    if days:
+        try:
+            days = int(days)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': '租赁天数无效'}, status=400)
+        if not 1 <= days <= 30:
+            return JsonResponse({'success': False, 'error': '租赁天数无效'}, status=400)
+        data['next_free'] = index.next_free(max(start, timezone.now()), timedelta(days=days)).isoformat()
+    return JsonResponse(data)
+
+
+ORDER_CARD_FIELDS = (
+    'id', 'order_number', 'status', 'start_date', 'end_date', 'rental_days',
+    'total_amount', 'deposit_amount', 'notes', 'created_at',
+    'battery__id', 'battery__name', 'battery__serial_number',
+    'battery__capacity', 'battery__voltage', 'battery__power',
+    'battery__battery_type__id', 'battery__battery_type__name',
+)
+
+
 @login_required
 def my_orders(request):
     """我的订单"""
-    orders = RentalOrder.objects.filter(user=request.user).order_by('-created_at')
+    # 只取订单卡片用到的列
+    orders = (
+        RentalOrder.objects.filter(user=request.user)
+        .select_related('battery__battery_type')
+        .only(*ORDER_CARD_FIELDS)
+        .order_by('-created_at')
+    )
     
-    # 分页
-    paginator = Paginator(orders, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 游标分页
+    page_obj = paginate(request, orders, 10, ('-created_at', '-id'))
+    # 各状态订单数：一条条件聚合查询，按用户缓存
+    summary = get_order_summary(request.user.id)
     
     context = {
         'page_obj': page_obj,
-        'total_count': orders.count(),
-        'active_count': orders.filter(status='active').count(),
-        'completed_count': orders.filter(status='completed').count(),
+        'total_count': summary['total'],
+        'active_count': summary['active'],
+        'completed_count': summary['completed'],
+        'status_counts': summary,
     }
     
     return render(request, 'battery/my_orders.html', context)
 
 
+def _export_format(request):
+    fmt = request.GET.get('format', 'csv')
+    return fmt if fmt in EXPORT_FORMATS else None
+
+
+@login_required
+@require_http_methods(["GET"])
+def export_orders(request):
+    """导出我的订单（流式），format 为 csv 或 ndjson"""
+    fmt = _export_format(request)
+    if fmt is None:
+        return JsonResponse({'success': False, 'error': '无效的导出格式'}, status=400)
+    orders = RentalOrder.objects.filter(user=request.user).select_related(*ORDER_RELATED).order_by('-created_at', '-id')
+    return stream_export(orders, ORDER_COLUMNS, fmt, 'orders')
+
+
 @login_required
 def order_detail(request, order_id):
     """订单详情"""
@@ -189,37 +332,22 @@ def my_battery_usage(request):
     active_usage = BatteryUsage.objects.filter(
         user=request.user,
         is_active=True
-    ).first()
+    ).select_related('battery__battery_type').first()
     
-    # 如果有正在使用的电池，更新其电量和使用时长（仅放电时）
+    # 电量和使用时长只做推算用于展示，页面本身不写数据库；
+    # 电量耗尽由放电模拟（simulate_discharge）结算，暂停 / 完成时写入当时的电量
     if active_usage:
-        time_diff = timezone.now() - active_usage.start_time
-        active_usage.total_usage_hours = round(time_diff.total_seconds() / 3600, 2)
-        if active_usage.is_discharging:
-            calculated_charge = active_usage.calculate_current_charge()
-            active_usage.current_charge = calculated_charge
-            # 0% 自动结束
-            if active_usage.current_charge <= 0:
-                active_usage.is_active = False
-                active_usage.end_time = timezone.now()
-                active_usage.save()
-                # 完成对应订单
-                order = RentalOrder.objects.filter(user=request.user, battery=active_usage.battery, status='active').first()
-                if order:
-                    order.status = 'completed'
-                    order.save()
-            else:
-                active_usage.save()
+        now = timezone.now()
+        active_usage.current_charge = active_usage.calculate_current_charge(now)
+        active_usage.total_usage_hours = active_usage.calculate_usage_hours(now)
     
     # 获取历史使用记录
     usage_history = BatteryUsage.objects.filter(
         user=request.user
-    ).order_by('-start_time')
+    ).select_related('battery').order_by('-start_time')
     
-    # 分页
-    paginator = Paginator(usage_history, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 游标分页
+    page_obj = paginate(request, usage_history, 10, ('-start_time', '-id'))
     
     context = {
         'active_usage': active_usage,
@@ -229,6 +357,80 @@ def my_battery_usage(request):
     return render(request, 'battery/my_usage.html', context)
 
 
+@login_required
+@require_http_methods(["GET"])
+def export_usage(request):
+    """导出我的电池使用记录（流式），format 为 csv 或 ndjson"""
+    fmt = _export_format(request)
+    if fmt is None:
+        return JsonResponse({'success': False, 'error': '无效的导出格式'}, status=400)
+    usages = BatteryUsage.objects.filter(user=request.user).select_related(*USAGE_RELATED).order_by('-start_time', '-id')
+    return stream_export(usages, USAGE_COLUMNS, fmt, 'battery-usage')
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@login_required
+@require_http_methods(["GET"])
+async def usage_stream(request):
+    """电量实时推送（SSE）：snapshot / charge / depleted / ended 事件；需要 ASGI 部署"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'success': False, 'error': '实时推送需要 ASGI 部署，请使用长轮询'}, status=400)
+    user = await request.auser()
+    
+    async def events():
+        queue = broadcaster.subscribe(user.id)
+        try:
+            yield f'retry: {int(LIVE_TICK * 1000)}\n\n'
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), LIVE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                yield _sse(event, live_payload(event, data))
+        finally:
+            broadcaster.unsubscribe(user.id, queue)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@require_http_methods(["GET"])
+async def usage_poll(request):
+    """电量长轮询：since 为上次收到的 version，状态变化或超时后返回"""
+    user = await request.auser()
+    since = request.GET.get('since')
+    if not isinstance(request, ASGIRequest):
+        # WSGI 下没有常驻的广播任务，直接返回当前状态
+        state = (await sync_to_async(load_live_states)([user.id])).get(user.id)
+        return JsonResponse({'success': True, **live_payload('snapshot', state)})
+    
+    queue = broadcaster.subscribe(user.id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + LIVE_POLL_TIMEOUT
+    latest = None
+    try:
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                break
+            latest = live_payload(event, data)
+            if event != 'snapshot' or latest['version'] != since:
+                break
+    finally:
+        broadcaster.unsubscribe(user.id, queue)
+    if latest is None:
+        latest = live_payload('snapshot', broadcaster.states.get(user.id))
+    return JsonResponse({'success': True, **latest})
+
+
 @login_required
 @require_http_methods(["POST"])
 def toggle_discharge(request, usage_id):
@@ -238,15 +440,28 @@ def toggle_discharge(request, usage_id):
     now = timezone.now()
 
     if action == 'stop':
+        # 暂停时把推算的电量写入，恢复放电时以它为新的基线
+        if close_depleted_usage(usage, now):
+            return JsonResponse({'success': True, 'is_discharging': False, 'depleted': True})
+        usage.current_charge = usage.calculate_current_charge(now)
+        usage.total_usage_hours = usage.calculate_usage_hours(now)
         usage.is_discharging = False
         usage.save()
+        usage_changed(usage)
+        record_sample(usage.id, usage.current_charge, False, now)
         return JsonResponse({'success': True, 'is_discharging': usage.is_discharging})
     elif action == 'start':
-        # 重置起算点
+        # 已在放电中时重复开始不重置起算点，否则这段时间的消耗会丢失
+        if usage.is_discharging:
+            return JsonResponse({'success': True, 'is_discharging': True})
+        # 以当前电量为新的基线，重置起算点
+        usage.baseline_charge = usage.calculate_current_charge(now)
+        usage.current_charge = usage.baseline_charge
         usage.start_time = now
-        usage.baseline_charge = usage.current_charge
         usage.is_discharging = True
         usage.save()
+        usage_changed(usage)
+        record_sample(usage.id, usage.current_charge, True, now)
         return JsonResponse({'success': True, 'is_discharging': usage.is_discharging})
 
     return JsonResponse({'success': False, 'error': '无效操作'})
@@ -263,8 +478,15 @@ def update_battery_charge(request, usage_id):
         try:
             charge = int(new_charge)
             if 0 <= charge <= 100:
+                # 手动校准的电量作为新的基线，放电中时从此刻重新推算
+                now = timezone.now()
                 usage.current_charge = charge
+                usage.baseline_charge = charge
+                if usage.is_discharging:
+                    usage.start_time = now
                 usage.save()
+                usage_changed(usage)
+                record_sample(usage.id, charge, usage.is_discharging, now)
                 return JsonResponse({'success': True, 'charge': charge})
         except ValueError:
             pass
@@ -272,12 +494,55 @@ def update_battery_charge(request, usage_id):
     return JsonResponse({'success': False, 'error': '无效的电量值'})
 
 
+@login_required
+@require_http_methods(["POST"])
+def bulk_update_charge(request):
+    """批量上报电量，请求体为 JSON 数组或 NDJSON，每条读数 {usage_id, charge, ts}"""
+    try:
+        readings = parse_readings(request.body, request.content_type)
+    except IngestError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+    
+    results, applied = ingest_readings(request.user, readings)
+    return JsonResponse({'success': True, 'applied': applied, 'results': results})
+
+
+@login_required
+@require_http_methods(["GET"])
+def charge_history_api(request, usage_id):
+    """电量曲线 API（读取降采样数据），参数 start / end 为 ISO 时间，resolution 可选 1m / 1h / 1d"""
+    usages = BatteryUsage.objects.all() if request.user.is_staff else BatteryUsage.objects.filter(user=request.user)
+    usage = get_object_or_404(usages, id=usage_id)
+    
+    bounds = []
+    for key in ('start', 'end'):
+        value = None
+        if request.GET.get(key):
+            try:
+                value = parse_datetime(request.GET[key])
+            except ValueError:
+                value = None
+            if value is None:
+                return JsonResponse({'success': False, 'error': f'无效的时间: {key}'}, status=400)
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+        bounds.append(value)
+    start, end = bounds
+    resolution = request.GET.get('resolution') or None
+    if resolution is not None and resolution not in RESOLUTIONS:
+        return JsonResponse({'success': False, 'error': '无效的粒度'}, status=400)
+    if start and end and start >= end:
+        return JsonResponse({'success': False, 'error': '开始时间必须早于结束时间'}, status=400)
+    
+    resolution, points = charge_series(usage.id, start, end, resolution)
+    return JsonResponse({'success': True, 'usage_id': usage.id, 'resolution': resolution, 'points': points})
+
+
 @login_required
 def battery_categories(request):
     """电池分类页面"""
-    categories = BatteryCategory.objects.annotate(
-        battery_count=Count('batterytype__battery')
-    ).order_by('name')
+    # 各状态电池数量由 battery.counters 维护，直接读取分类表
+    categories = BatteryCategory.objects.order_by('name')
     
     context = {
         'categories': categories,
@@ -289,19 +554,21 @@ def battery_categories(request):
 def category_batteries(request, category_id):
     """分类下的电池列表"""
     category = get_object_or_404(BatteryCategory, id=category_id)
-    batteries = Battery.objects.filter(
-        battery_type__category=category,
-        status='available'
-    ).order_by('-created_at')
+    filters, spec_form = parse_filters(request.GET)
+    batteries = apply_spec_filters(
+        Battery.objects.filter(battery_type__category=category, status='available').select_related('battery_type'),
+        filters
+    )
     
-    # 分页
-    paginator = Paginator(batteries, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 游标分页，总数使用缓存的近似值
+    ordering = SORT_ORDERINGS[filters['sort_by']] if filters['sort_by'] else ('-created_at', '-id')
+    page_obj = paginate(request, batteries, 12, ordering, approximate_total=True)
+    attach_card_html(page_obj, GRID_CARD, request)
     
     context = {
         'category': category,
         'page_obj': page_obj,
+        'spec_form': spec_form,
     }
     
     return render(request, 'battery/category_batteries.html', context)
@@ -321,20 +588,23 @@ def add_review(request, battery_id):
     if request.method == 'POST':
         form = BatteryReviewForm(request.POST)
         if form.is_valid():
+            rating = int(form.cleaned_data['rating'])
             if existing_review:
-                # 更新现有评价
-                existing_review.rating = form.cleaned_data['rating']
-                existing_review.comment = form.cleaned_data['comment']
-                existing_review.save()
+                # 更新现有评价（评分统计由 signals 增量更新）
+                with transaction.atomic():
+                    existing_review.rating = rating
+                    existing_review.comment = form.cleaned_data['comment']
+                    existing_review.save()
                 messages.success(request, '评价已更新')
             else:
                 # 创建新评价
-                BatteryReview.objects.create(
-                    battery=battery,
-                    user=request.user,
-                    rating=form.cleaned_data['rating'],
-                    comment=form.cleaned_data['comment']
-                )
+                with transaction.atomic():
+                    BatteryReview.objects.create(
+                        battery=battery,
+                        user=request.user,
+                        rating=rating,
+                        comment=form.cleaned_data['comment']
+                    )
                 
                 # 评价奖励积分
                 from user.views import add_points
@@ -364,7 +634,8 @@ def add_review(request, battery_id):
 def battery_search(request):
     """电池搜索页面"""
     form = BatterySearchForm(request.GET)
-    batteries = []
+    batteries = Battery.objects.none()
+    ordering = ('-created_at', '-id')
     
     if form.is_valid():
         search_query = form.cleaned_data.get('search')
@@ -372,14 +643,12 @@ def battery_search(request):
         min_price = form.cleaned_data.get('min_price')
         max_price = form.cleaned_data.get('max_price')
         
-        batteries = Battery.objects.filter(status='available')
+        batteries = Battery.objects.filter(status='available').select_related('battery_type').order_by('-created_at')
         
         if search_query:
-            batteries = batteries.filter(
-                Q(name__icontains=search_query) |
-                Q(serial_number__icontains=search_query) |
-                Q(battery_type__name__icontains=search_query)
-            )
+            # 全文索引检索，按相关度排序
+            batteries = keyword_filter(batteries, search_query, ranked=True)
+            ordering = RANKED_ORDERING
         
         if category:
             batteries = batteries.filter(battery_type__category=category)
@@ -389,13 +658,10 @@ def battery_search(request):
         
         if max_price:
             batteries = batteries.filter(daily_rental_price__lte=max_price)
-        
-        batteries = batteries.order_by('-created_at')
     
-    # 分页
-    paginator = Paginator(batteries, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 游标分页，总数使用缓存的近似值
+    page_obj = paginate(request, batteries, 12, ordering, approximate_total=True)
+    attach_card_html(page_obj, GRID_CARD, request)
     
     context = {
         'form': form,
@@ -469,25 +735,42 @@ def add_review_reply(request, review_id):
     })
 
 
+def _transition_order(order, action, error):
+    """
+    执行订单状态转换，返回 (是否成功, 失败时的 JsonResponse)
+    订单在加载时已不在源状态直接返回 error；并发请求抢先转换时返回当前状态
+    """
+    if order.status != ORDER_TRANSITIONS[action][0]:
+        return False, JsonResponse({'success': False, 'transitioned': False, 'status': order.status, 'error': error})
+    try:
+        won = transition_order(order, action)
+    except TransitionError as exc:
+        return False, JsonResponse({'success': False, 'transitioned': False, 'status': order.status, 'error': str(exc)})
+    if not won:
+        return False, JsonResponse({
+            'success': False,
+            'transitioned': False,
+            'status': order.status,
+            'error': '订单状态已变更，请刷新页面后重试'
+        }, status=409)
+    return True, None
+
+
 @login_required
 @require_http_methods(["POST"])
 def cancel_order(request, order_id):
     """取消订单"""
     order = get_object_or_404(RentalOrder, id=order_id, user=request.user)
     
-    if order.status != 'pending':
-        return JsonResponse({
-            'success': False,
-            'error': '只能取消待确认的订单'
-        })
-    
-    # 更新订单状态
-    order.status = 'cancelled'
-    order.save()
+    won, response = _transition_order(order, 'cancel', '只能取消待确认的订单')
+    if not won:
+        return response
     
     messages.success(request, '订单已取消')
     return JsonResponse({
         'success': True,
+        'transitioned': True,
+        'status': order.status,
         'message': '订单已取消'
     })
 
@@ -498,45 +781,16 @@ def start_order(request, order_id):
     """开始使用订单（将订单状态从已确认改为使用中）"""
     order = get_object_or_404(RentalOrder, id=order_id, user=request.user)
     
-    if order.status != 'confirmed':
-        return JsonResponse({
-            'success': False,
-            'error': '只能开始已确认的订单'
-        })
-    
-    # 检查用户是否已经有正在使用的电池
-    active_usage = BatteryUsage.objects.filter(
-        user=request.user,
-        is_active=True
-    ).first()
-    
-    if active_usage:
-        return JsonResponse({
-            'success': False,
-            'error': f'您当前正在使用 {active_usage.battery.name}，请先结束当前电池的使用后再开始新的租赁'
-        })
-    
-    # 更新订单状态
-    order.status = 'active'
-    order.save()
-    
-    # 更新电池状态为已租出
-    battery = order.battery
-    battery.status = 'rented'
-    battery.save()
-    
-    # 创建电池使用记录
-    BatteryUsage.objects.create(
-        battery=battery,
-        user=request.user,
-        start_time=timezone.now(),
-        current_charge=100,  # 假设初始电量为100%
-        is_active=True
-    )
+    # 订单、电池状态和使用记录在同一个事务中修改，已有使用中的电池时整体回滚
+    won, response = _transition_order(order, 'start', '只能开始已确认的订单')
+    if not won:
+        return response
     
     messages.success(request, '已开始使用电池')
     return JsonResponse({
         'success': True,
+        'transitioned': True,
+        'status': order.status,
         'message': '已开始使用电池'
     })
 
@@ -547,43 +801,19 @@ def complete_order(request, order_id):
     """完成租赁（结算订单）"""
     order = get_object_or_404(RentalOrder, id=order_id, user=request.user)
     
-    if order.status != 'active':
-        return JsonResponse({
-            'success': False,
-            'error': '只能完成使用中的订单'
-        })
-    
-    # 更新订单状态
-    order.status = 'completed'
-    order.save()
+    won, response = _transition_order(order, 'complete', '只能完成使用中的订单')
+    if not won:
+        return response
     
-    # 完成订单奖励积分
+    # 完成订单奖励积分（只有完成转换的请求发放）
     from user.views import add_points
     add_points(request.user, 20, 'earn', '完成租赁订单', f'完成租赁订单 {order.order_number} 获得积分奖励')
     
-    # 更新电池状态为可用
-    battery = order.battery
-    battery.status = 'available'
-    battery.save()
-    
-    # 结束电池使用记录
-    active_usage = BatteryUsage.objects.filter(
-        battery=battery,
-        user=request.user,
-        is_active=True
-    ).first()
-    
-    if active_usage:
-        active_usage.end_time = timezone.now()
-        active_usage.is_active = False
-        # 计算总使用时长
-        time_diff = active_usage.end_time - active_usage.start_time
-        active_usage.total_usage_hours = time_diff.total_seconds() / 3600
-        active_usage.save()
-    
     messages.success(request, f'租赁已完成！押金 ¥{order.deposit_amount} 将在3-5个工作日内退还')
     return JsonResponse({
         'success': True,
+        'transitioned': True,
+        'status': order.status,
         'message': f'租赁已完成！押金 ¥{order.deposit_amount} 将在3-5个工作日内退还',
         'deposit': float(order.deposit_amount)
     })
@@ -595,18 +825,14 @@ def confirm_order(request, order_id):
     """确认订单（管理员操作，这里允许用户自己确认用于测试）"""
     order = get_object_or_404(RentalOrder, id=order_id, user=request.user)
     
-    if order.status != 'pending':
-        return JsonResponse({
-            'success': False,
-            'error': '只能确认待确认的订单'
-        })
-    
-    # 更新订单状态
-    order.status = 'confirmed'
-    order.save()
+    won, response = _transition_order(order, 'confirm', '只能确认待确认的订单')
+    if not won:
+        return response
     
     messages.success(request, '订单已确认')
     return JsonResponse({
         'success': True,
+        'transitioned': True,
+        'status': order.status,
         'message': '订单已确认'
-    })
\ No newline at end of file
+    })
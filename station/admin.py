@@ -1,5 +1,7 @@
 from django.contrib import admin
 from .models import BatteryStation, StationRental, StationReturn
+from .exports import RENTAL_COLUMNS, RENTAL_RELATED
+from battery.exports import export_actions
 
 
 @admin.register(BatteryStation)
@@ -31,20 +33,21 @@ class BatteryStationAdmin(admin.ModelAdmin):
 
 @admin.register(StationRental)
 class StationRentalAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'battery', 'station', 'rental_date', 'status', 'rental_amount')
-    list_filter = ('status', 'rental_date', 'station')
-    search_fields = ('user__username', 'battery__name', 'station__name')
-    readonly_fields = ('created_at',)
+    list_display = ('order_number', 'user', 'battery', 'station', 'rental_date', 'status', 'is_overdue', 'rental_amount')
+    list_filter = ('status', 'is_overdue', 'rental_date', 'station')
+    search_fields = ('order_number', 'user__username', 'battery__name', 'station__name')
+    readonly_fields = ('order_number', 'created_at')
+    actions = export_actions(RENTAL_COLUMNS, 'station-rentals', RENTAL_RELATED)
     
     fieldsets = (
         ('租赁信息', {
-            'fields': ('station', 'user', 'battery')
+            'fields': ('order_number', 'station', 'user', 'battery')
         }),
         ('时间信息', {
             'fields': ('rental_date', 'expected_return_date', 'actual_return_date')
         }),
         ('费用信息', {
-            'fields': ('rental_amount', 'status')
+            'fields': ('rental_amount', 'status', 'is_overdue')
         }),
         ('备注', {
             'fields': ('notes',)
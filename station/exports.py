@@ -0,0 +1,18 @@
+"""网点租赁记录导出列，导出方式见 battery.exports"""
+from battery.exports import Column
+
+RENTAL_COLUMNS = [
+    Column('id', '记录ID'),
+    Column('order_number', '订单号'),
+    Column('username', '用户', 'user.username'),
+    Column('station', '网点', 'station.name'),
+    Column('battery', '电池', 'battery.name'),
+    Column('serial_number', '序列号', 'battery.serial_number'),
+    Column('status', '状态', lambda rental: rental.get_status_display()),
+    Column('rental_date', '租赁时间'),
+    Column('expected_return_date', '预期归还时间'),
+    Column('actual_return_date', '实际归还时间'),
+    Column('rental_amount', '租赁金额'),
+    Column('notes', '备注'),
+]
+RENTAL_RELATED = ('user', 'station', 'battery')
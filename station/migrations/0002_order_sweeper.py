@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battery', '0016_order_sweeper'),
+        ('station', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stationrental',
+            name='is_overdue',
+            field=models.BooleanField(default=False, verbose_name='是否超期'),
+        ),
+        migrations.AddIndex(
+            model_name='stationrental',
+            index=models.Index(fields=['status', 'expected_return_date'], name='station_rental_status_due_idx'),
+        ),
+    ]
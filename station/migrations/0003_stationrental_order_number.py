@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+def backfill_order_numbers(apps, schema_editor):
+    from battery.order_numbers import OrderNumberGenerator
+
+    StationRental = apps.get_model('station', 'StationRental')
+    # 按创建时间依次生成，补出的订单号与创建顺序一致
+    generator = OrderNumberGenerator(node=0)
+    rentals = StationRental.objects.order_by('created_at', 'id').only('id', 'created_at')
+    for rental in rentals.iterator(chunk_size=2000):
+        StationRental.objects.filter(pk=rental.pk).update(order_number=generator.generate('STN', rental.created_at))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('station', '0002_order_sweeper'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stationrental',
+            name='order_number',
+            field=models.CharField(max_length=20, null=True, verbose_name='订单号'),
+        ),
+        migrations.RunPython(backfill_order_numbers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stationrental',
+            name='order_number',
+            field=models.CharField(max_length=20, unique=True, verbose_name='订单号'),
+        ),
+    ]
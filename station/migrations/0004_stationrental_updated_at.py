@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('station', '0003_stationrental_order_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stationrental',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='更新时间'),
+            preserve_default=False,
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from battery import order_numbers
 from battery.models import Battery
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -47,6 +48,7 @@ class StationRental(models.Model):
         ('cancelled', '已取消'),
     ]
     
+    order_number = models.CharField(max_length=20, unique=True, verbose_name="订单号")
     station = models.ForeignKey(BatteryStation, on_delete=models.CASCADE, verbose_name="网点", related_name='rentals')
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="用户", related_name='station_rentals')
     battery = models.ForeignKey(Battery, on_delete=models.CASCADE, verbose_name="电池")
@@ -59,18 +61,32 @@ class StationRental(models.Model):
     # 租赁金额
     rental_amount = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="租赁金额")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="状态")
+    is_overdue = models.BooleanField(default=False, verbose_name="是否超期")
     
     # 备注
     notes = models.TextField(max_length=500, blank=True, verbose_name="备注")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     
     class Meta:
         verbose_name = "网点租赁记录"
         verbose_name_plural = "网点租赁记录"
         ordering = ['-rental_date']
+        indexes = [
+            # 订单清理按状态和预期归还时间做范围扫描
+            models.Index(fields=['status', 'expected_return_date'], name='station_rental_status_due_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.battery.name} ({self.station.name})"
+    
+    def save(self, *args, **kwargs):
+        if self.order_number:
+            super().save(*args, **kwargs)
+        else:
+            # 订单号撞上唯一约束时换节点号重新生成
+            save = super().save
+            order_numbers.save_with_number(self, 'STN', lambda: save(*args, **kwargs))
 
 
 class StationReturn(models.Model):
@@ -0,0 +1,29 @@
+"""
+网点租赁记录清理规则（规则的执行见 battery/sweeper.py）
+
+  expire_pending   预期归还时间已过 pending_hours 小时仍待确认 -> 已取消（待确认的记录不占用电池）
+  overdue_rental   已确认且超过预期归还时间 overdue_hours 小时 -> 标记为超期
+网点租赁必须在网点办理归还（生成归还记录、计算超期费），超期记录只标记，不自动结算。
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from battery.sweeper import OVERDUE_HOURS, PENDING_HOURS, Policy
+from .models import StationRental
+
+
+def rental_policies(now=None, pending_hours=PENDING_HOURS, overdue_hours=OVERDUE_HOURS):
+    now = now or timezone.now()
+    return [
+        Policy(
+            'station_expire_pending', f'预期归还时间已过 {pending_hours} 小时仍待确认的网点租赁取消',
+            StationRental, 'pending', 'expected_return_date', now - timedelta(hours=pending_hours),
+            {'status': 'cancelled', 'updated_at': now}, label_field='order_number',
+        ),
+        Policy(
+            'station_overdue_rental', f'超过预期归还时间 {overdue_hours} 小时的网点租赁标记为超期',
+            StationRental, 'confirmed', 'expected_return_date', now - timedelta(hours=overdue_hours),
+            {'is_overdue': True, 'updated_at': now}, extra={'is_overdue': False}, label_field='order_number',
+        ),
+    ]
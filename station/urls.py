@@ -17,4 +17,5 @@ urlpatterns = [
     
     # 用户记录
     path('rentals/', views.my_station_rentals, name='my_rentals'),
+    path('rentals/export/', views.export_station_rentals, name='export_rentals'),
 ]
@@ -2,13 +2,17 @@ import json
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.db import transaction
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
 
 from .models import BatteryStation, StationRental, StationReturn
+from .exports import RENTAL_COLUMNS, RENTAL_RELATED
 from battery.models import Battery
+from battery.inventory import set_battery_status
+from battery.exports import stream_export, FORMATS as EXPORT_FORMATS
 
 
 def nearby_stations(request):
@@ -156,29 +160,34 @@ def rent_from_station(request, station_id):
         # 计算租赁金额
         rental_amount = battery.daily_rental_price * rental_days
         
-        # 创建租赁记录
-        rental = StationRental.objects.create(
-            station=station,
-            user=request.user,
-            battery=battery,
-            rental_date=timezone.now(),
-            expected_return_date=timezone.now() + timedelta(days=rental_days),
-            rental_amount=rental_amount,
-            status='confirmed'
-        )
-        
-        # 更新电池状态
-        battery.status = 'rented'
-        battery.save()
-        
-        # 更新网点电池数量
-        station.current_batteries += 1
-        station.save()
+        with transaction.atomic():
+            # 更新电池状态：带条件地改为已租出，并发请求中只有一个能成功
+            if not set_battery_status([battery.id], 'rented', expected_status='available'):
+                return JsonResponse({
+                    'success': False,
+                    'message': '租赁失败: 电池已被租出'
+                })
+            
+            # 创建租赁记录
+            rental = StationRental.objects.create(
+                station=station,
+                user=request.user,
+                battery=battery,
+                rental_date=timezone.now(),
+                expected_return_date=timezone.now() + timedelta(days=rental_days),
+                rental_amount=rental_amount,
+                status='confirmed'
+            )
+            
+            # 更新网点电池数量
+            station.current_batteries += 1
+            station.save()
         
         return JsonResponse({
             'success': True,
             'message': '租赁成功',
-            'rental_id': rental.id
+            'rental_id': rental.id,
+            'order_number': rental.order_number
         })
     
     except Exception as e:
@@ -235,9 +244,7 @@ def return_to_station(request, rental_id):
         rental.save()
         
         # 更新电池状态
-        battery = rental.battery
-        battery.status = 'available'
-        battery.save()
+        set_battery_status([rental.battery_id], 'available', expected_status='rented')
         
         # 更新网点电池数量
         station.current_batteries -= 1
@@ -266,3 +273,14 @@ def my_station_rentals(request):
     }
     
     return render(request, 'station/my_rentals.html', context)
+
+
+@login_required
+@require_http_methods(["GET"])
+def export_station_rentals(request):
+    """导出我的网点租赁记录（流式），format 为 csv 或 ndjson"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({'success': False, 'error': '无效的导出格式'}, status=400)
+    rentals = StationRental.objects.filter(user=request.user).select_related(*RENTAL_RELATED).order_by('-rental_date', '-id')
+    return stream_export(rentals, RENTAL_COLUMNS, fmt, 'station-rentals')